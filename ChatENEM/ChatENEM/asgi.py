@@ -3,6 +3,11 @@ ASGI config for ChatENEM project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+HTTP segue para o Django; WebSocket em /collector/ws/chat vai para o canal
+de chat (collector.ws_chat). Rodar com um servidor ASGI, por exemplo:
+
+    gunicorn ChatENEM.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +18,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ChatENEM.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from collector.ws_chat import WS_PATH, chat_socket, reject_socket  # noqa: E402 (requer Django configurado)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        if scope["path"].rstrip("/") == WS_PATH:
+            return await chat_socket(scope, receive, send)
+        return await reject_socket(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -39,6 +39,18 @@ DATABASES = {
     }
 }
 
+# Postgres + pgvector (Supabase ou instância local) para aplicar as migrações
+# do índice vetorial: defina POSTGRES_DB e demais variáveis
+if os.environ.get("POSTGRES_DB"):
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ["POSTGRES_DB"],
+        "USER": os.environ.get("POSTGRES_USER", "postgres"),
+        "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+        "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+        "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+    }
+
 
 # ============================
 # SUPABASE CONFIG
@@ -62,6 +74,22 @@ EMBEDDING_MODEL = os.environ.get(
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
+# Serviço local de embeddings (manage.py run_embedding_service), ex.:
+# http://127.0.0.1:8765. Vazio = cada processo chama o HF diretamente.
+EMBEDDING_SERVICE_URL = os.environ.get("EMBEDDING_SERVICE_URL", "").rstrip("/")
+
+# Servidor local compatível com a API da OpenAI (llama.cpp, vLLM, Ollama...),
+# tentado depois de todos os modelos do OpenRouter. Vazio = desativado.
+# LOCAL_LLM_MAX_CONCURRENCY limita as chamadas simultâneas por processo; em
+# picos, as demais esperam até LOCAL_LLM_QUEUE_TIMEOUT segundos por uma vaga.
+LOCAL_LLM_URL = os.environ.get("LOCAL_LLM_URL", "")
+LOCAL_LLM_MODEL = os.environ.get("LOCAL_LLM_MODEL", "")
+LOCAL_LLM_API_KEY = os.environ.get("LOCAL_LLM_API_KEY", "local")
+LOCAL_LLM_MAX_CONCURRENCY = int(os.environ.get("LOCAL_LLM_MAX_CONCURRENCY", "2"))
+LOCAL_LLM_QUEUE_TIMEOUT = float(os.environ.get("LOCAL_LLM_QUEUE_TIMEOUT", "60"))
+LOCAL_LLM_MAX_TOKENS = int(os.environ.get("LOCAL_LLM_MAX_TOKENS", "1024"))
+LOCAL_LLM_TIMEOUT = float(os.environ.get("LOCAL_LLM_TIMEOUT", "120"))
+
 
 # ============================
 # APPLICATIONS
@@ -173,3 +201,93 @@ CORS_ALLOW_METHODS = [
     'POST',
     'OPTIONS',
 ]
+
+
+# ============================
+# CONVERSAS (contexto de recuperação)
+# ============================
+
+CONVERSATION_MAX_SESSIONS = int(os.environ.get("CONVERSATION_MAX_SESSIONS", "1000"))
+CONVERSATION_TTL_SECONDS = int(os.environ.get("CONVERSATION_TTL_SECONDS", "1800"))
+
+
+# ============================
+# ÍNDICE LOCAL (memória mapeada)
+# ============================
+
+# Diretório do índice gerado por "manage.py build_vector_store".
+# Vazio = buscar sempre via RPC search_chunks do Supabase.
+LOCAL_INDEX_DIR = os.environ.get("LOCAL_INDEX_DIR", "")
+
+
+# ============================
+# BUSCA VETORIAL (RPC search_chunks)
+# ============================
+
+# hnsw.ef_search enviado ao search_chunks (migração 0002). 0 = usa o padrão
+# da função (40); filtro e include_embedding são sempre enviados.
+SEARCH_EF_SEARCH = int(os.environ.get("SEARCH_EF_SEARCH", "0"))
+
+# "postgrest" (padrão) ou "postgres": busca e ingestão de chunks por conexão
+# direta com pool (collector/pg_backend.py), sem passar pelo PostgREST
+DATABASE_BACKEND = os.environ.get("DATABASE_BACKEND", "postgrest")
+POSTGRES_DSN = os.environ.get("POSTGRES_DSN", "")
+POSTGRES_POOL_MAX = int(os.environ.get("POSTGRES_POOL_MAX", "10"))
+# Com o banco fora do ar, a busca desiste depois de POSTGRES_POOL_TIMEOUT
+# segundos e usa o PostgREST; novas tentativas só após um backoff
+POSTGRES_CONNECT_TIMEOUT = int(os.environ.get("POSTGRES_CONNECT_TIMEOUT", "3"))
+POSTGRES_POOL_TIMEOUT = float(os.environ.get("POSTGRES_POOL_TIMEOUT", "5"))
+
+
+# ============================
+# COMPRESSÃO DE CONTEXTO
+# ============================
+
+# Fração (alvo) de cada chunk longo enviada ao LLM: só as sentenças mais
+# relevantes para a pergunta + cabeçalho de seção. 1 = desativado.
+CONTEXT_COMPRESSION_RATIO = float(os.environ.get("CONTEXT_COMPRESSION_RATIO", "0.5"))
+CONTEXT_COMPRESSION_MIN_CHARS = int(os.environ.get("CONTEXT_COMPRESSION_MIN_CHARS", "400"))
+
+
+# ============================
+# CACHE DE RESPOSTAS / INVALIDAÇÃO
+# ============================
+
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+# Journal compartilhado pelo qual a ingestão avisa os workers web sobre
+# documentos/chunks alterados (invalidação seletiva dos caches)
+CHANGE_JOURNAL_PATH = os.environ.get(
+    "CHANGE_JOURNAL_PATH",
+    str(BASE_DIR / "data" / "change_events.jsonl")
+)
+
+
+# ============================
+# ÍNDICE DE ENTIDADES (respostas extrativas)
+# ============================
+
+ENTITY_INDEX_PATH = os.environ.get(
+    "ENTITY_INDEX_PATH",
+    str(BASE_DIR / "data" / "entity_index.json")
+)
+
+
+# ============================
+# LOG DE CONSULTAS
+# ============================
+
+# Pergunta, chunks, modelo e tempos por etapa de cada consulta, gravados em
+# segundo plano (JSONL gzip rotacionado). Vazio = desativado.
+QUERY_LOG_DIR = os.environ.get("QUERY_LOG_DIR", str(BASE_DIR / "data" / "query_log"))
+QUERY_LOG_MAX_BYTES = int(os.environ.get("QUERY_LOG_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+# ============================
+# MÉTRICAS
+# ============================
+
+# Diretório compartilhado onde cada processo grava seus contadores; o
+# endpoint /collector/metrics/ soma todos. Vazio = só o processo atual.
+METRICS_DIR = os.environ.get("METRICS_DIR", str(BASE_DIR / "data" / "metrics"))
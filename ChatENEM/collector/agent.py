@@ -1,21 +1,25 @@
-import os
-import requests
-from typing import List, Dict, Tuple
-from openai import OpenAI
+import json
+import re
+from typing import Callable, List, Dict, Tuple, Optional
+from django.conf import settings
 
 from .embedding import embed_batch
 from .supabase_client import SupabaseClient
-
-try:
-    OPENROUTER_API_KEY = os.environ["OPENROUTER_API_KEY"]
-except KeyError:
-    raise ValueError("Missing required environment variable: OPENROUTER_API_KEY")
-
-# Cliente OpenAI configurado para OpenRouter
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=OPENROUTER_API_KEY,
-)
+from .chunk_selector import select_chunks, parse_embedding, cosine
+from .conversation_store import conversation_store, condense_query
+from .vector_store import get_local_store
+from .pg_backend import get_postgres_backend
+from .answer_cache import answer_cache, normalize_question, tags_for_chunks, NO_CONTEXT_TTL_SECONDS
+from .signals import poll_changes
+from .document_cache import document_metadata
+from .entity_index import get_entity_index, render_answer
+from .query_router import route_question
+from .model_tiers import estimate_tokens, tier_plan
+from .llm_backends import LLMBackend, LLMBackendBusy, get_backend
+from .context_compressor import compress_chunks
+from .title_generator import validate_title
+from .query_log import QueryTrace, get_query_log, trace_stage, tracing
+from .metrics import ANSWER_CACHE, LLM_FALLBACKS, LLM_REQUESTS, ROUTES, STAGE_LATENCY, SUPABASE_REQUESTS
 
 NO_CONTEXT_ANSWER = (
     "Não tenho essa informação disponível com base nos documentos do ENEM."
@@ -33,6 +37,24 @@ SYSTEM_PROMPT = (
     f"• Se a resposta não estiver no contexto, responder exatamente: '{NO_CONTEXT_ANSWER}'"
 )
 
+# Na primeira pergunta, título e resposta saem da mesma chamada ao LLM
+TITLE_INSTRUCTIONS = (
+    "\n\nEsta é a primeira pergunta da conversa. Responda SOMENTE com um objeto JSON "
+    '{"title": "...", "answer": "..."}, sem nenhum texto fora dele:\n'
+    "• title: título curto e informativo para a conversa (máx. 8 palavras), com termos do ENEM "
+    "quando possível, sem pontuação final\n"
+    "• answer: a resposta à pergunta, seguindo as regras acima"
+)
+
+# A busca traz mais candidatos que k para que a seleção adaptativa
+# (cotovelo de scores + MMR) possa escolher trechos distintos.
+CANDIDATE_MULTIPLIER = 3
+MAX_CANDIDATES = 100
+
+# Em conversas, reaproveita os chunks da última busca enquanto a pergunta
+# condensada estiver próxima (1 - cosseno) do embedding daquela busca.
+CONVERSATION_MAX_DRIFT = 0.12
+
 
 
 def _get_similar_chunks(question: str, k: int = 5) -> Tuple[List[Dict], List[float]]:
@@ -42,20 +64,57 @@ def _get_similar_chunks(question: str, k: int = 5) -> Tuple[List[Dict], List[flo
     try:
         print(f"DEBUG: Buscando chunks para: {question}")
         # Gerar embedding da pergunta
-        question_embedding = embed_batch([question])[0]
+        with trace_stage("embedding"):
+            question_embedding = embed_batch([question])[0]
         print(f"DEBUG: Embedding gerado: {len(question_embedding)} dimensões")
-        
+    except Exception as e:
+        print(f"Erro na busca vetorial: {e}")
+        import traceback
+        traceback.print_exc()
+        return [], []
+
+    with trace_stage("search"):
+        return _search_by_embedding(question_embedding, k)
+
+def _search_by_embedding(question_embedding: List[float], k: int = 5) -> Tuple[List[Dict], List[float]]:
+    """
+    Retorna os k DocumentChunk mais similares a um embedding já calculado.
+    Usa o índice local em memória mapeada quando configurado; senão, o RPC
+    search_chunks do Supabase.
+    """
+    store = get_local_store()
+    if store is not None:
+        try:
+            results = store.search(question_embedding, k)
+            print(f"DEBUG: Índice local: {len(results)} resultados")
+            return results, [r["similarity"] for r in results]
+        except Exception as e:
+            print(f"Erro no índice local, usando Supabase: {e}")
+
+    try:
+        pg = get_postgres_backend()
+        if pg is not None:
+            results = pg.search_chunks(question_embedding, k, ef_search=settings.SEARCH_EF_SEARCH,
+                                       include_embedding=True)
+            print(f"DEBUG: Conexão direta: {len(results)} resultados")
+            return results, [r["similarity"] for r in results]
+    except Exception as e:
+        print(f"Erro na conexão direta, usando PostgREST: {e}")
+
+    try:
         supabase = SupabaseClient()
         
         # Busca usando pgvector
-        response = requests.post(
+        response = supabase.session.post(
             f"{supabase.url}/rest/v1/rpc/search_chunks",
             headers=supabase.headers,
-            json={"query_embedding": question_embedding, "match_count": k}
+            # Embeddings no resultado: usados pelo MMR e pela conversa
+            json=supabase.search_payload(question_embedding, k, include_embedding=True)
         )
         
         print(f"DEBUG: Status da busca: {response.status_code}")
         
+        SUPABASE_REQUESTS.inc(operation="search_chunks", outcome="ok" if response.status_code == 200 else "error")
         if response.status_code == 200:
             results = response.json()
             print(f"DEBUG: Resultados encontrados: {len(results)}")
@@ -75,17 +134,60 @@ def _get_similar_chunks(question: str, k: int = 5) -> Tuple[List[Dict], List[flo
             
     except Exception as e:
         print(f"Erro na busca vetorial: {e}")
+        SUPABASE_REQUESTS.inc(operation="search_chunks", outcome="error")
         import traceback
         traceback.print_exc()
         return [], []
 
+def _rescore_cached(chunks: List[Dict], scores: List[float], question_embedding: List[float]) -> List[float]:
+    """
+    Recalcula a similaridade dos chunks em cache contra a nova pergunta.
+    Sem embeddings no resultado da busca, mantém os scores originais.
+    """
+    new_scores = []
+    for c, s in zip(chunks, scores):
+        vec = parse_embedding(c.get("embedding"))
+        new_scores.append(cosine(question_embedding, vec) if vec else s)
+    return new_scores
+
+def _retrieve(question: str, candidates: int, conversation_id: Optional[str] = None) -> Tuple[List[Dict], List[float]]:
+    """
+    Recupera candidatos para a pergunta. Em uma conversa, a pergunta é
+    condensada com a anterior e, se não se afastar do contexto em cache,
+    reaproveita os chunks da última busca em vez de consultar o pgvector.
+    """
+    if not conversation_id:
+        return _get_similar_chunks(question, candidates)
+
+    state = conversation_store.get(conversation_id)
+    query = condense_query(question, state)
+    try:
+        with trace_stage("embedding"):
+            query_embedding = embed_batch([query])[0]
+    except Exception as e:
+        print(f"Erro na busca vetorial: {e}")
+        return [], []
+
+    if state and state.chunks and state.search_embedding and state.match_count >= candidates:
+        drift = 1.0 - cosine(query_embedding, state.search_embedding)
+        if drift <= CONVERSATION_MAX_DRIFT:
+            print(f"DEBUG: Reutilizando {len(state.chunks)} chunks da conversa (drift={drift:.3f})")
+            scores = _rescore_cached(state.chunks, state.scores, query_embedding)
+            conversation_store.record_turn(conversation_id, question)
+            return list(state.chunks), scores
+
+    with trace_stage("search"):
+        chunks, scores = _search_by_embedding(query_embedding, candidates)
+    conversation_store.record_turn(conversation_id, question, chunks, scores, query_embedding, candidates)
+    return chunks, scores
+
 def _build_prompt(question: str, chunks: List[Dict]) -> str:
     """
     Constrói o prompt do usuário incorporando os chunks como contexto.
     """
     parts = []
     for c in chunks:
-        doc = c.get("documents")
+        doc = document_metadata(c)
         src = (doc.get("title") or doc.get("source")) if doc else f"document_id={c.get('document_id')}"
         parts.append(f"Fonte: {src}\nTrecho:\n{c.get('chunk_text', '').strip()}")
     contexto = "\n\n---\n\n".join(parts) if parts else ""
@@ -98,78 +200,296 @@ def _build_prompt(question: str, chunks: List[Dict]) -> str:
     )
     return user_prompt
 
-def answer_question(question: str, k: int = 5) -> Dict:
+def _parse_title_answer(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Lê a saída {"title": ..., "answer": ...} do modo combinado.
+    Retorna (título válido ou None, resposta ou None se o JSON não for lido).
+    """
+    if not text:
+        return None, None
+    cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
+    try:
+        data = json.loads(cleaned)
+    except ValueError:
+        match = re.search(r"\{.*\}", cleaned, re.DOTALL)
+        if not match:
+            return None, None
+        try:
+            data = json.loads(match.group(0))
+        except ValueError:
+            return None, None
+    if not isinstance(data, dict):
+        return None, None
+    answer = data.get("answer")
+    if not isinstance(answer, str) or not answer.strip():
+        return None, None
+    return validate_title(data.get("title")), answer.strip()
+
+def _stream_completion(backend: LLMBackend, model: str, messages: List[Dict], tier,
+                       on_delta: Callable[[Optional[str]], None]) -> str:
+    """Chamada ao LLM em stream; repassa cada trecho a on_delta"""
+    parts = []
+    try:
+        stream = backend.create(
+            model=model,
+            messages=messages,
+            max_tokens=tier.max_tokens,
+            timeout=tier.timeout,
+            stream=True,
+        )
+        for event in stream:
+            delta = event.choices[0].delta.content if event.choices else None
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+    except Exception:
+        if parts:
+            on_delta(None)
+        raise
+    if not parts:
+        raise RuntimeError("Resposta vazia do modelo")
+    return "".join(parts)
+
+def _complete(plan, system: str, user: str, trace: QueryTrace,
+              on_delta: Optional[Callable[[Optional[str]], None]], extra: Dict) -> Tuple[Optional[str], int]:
+    """
+    Percorre os tiers do plano até um modelo responder.
+    Retorna (texto ou None, quantidade de modelos tentados).
+    """
+    answer_text = None
+    tried = set()
+    for tier in plan:
+        backend = get_backend(tier.backend)
+        if backend is None:
+            continue
+        for model in tier.models:
+            if (tier.backend, model) in tried:
+                continue
+            tried.add((tier.backend, model))
+            messages = [
+                {"role": "system", "content": system},
+                {"role": "user", "content": user}
+            ]
+            try:
+                with trace.stage("llm"):
+                    if on_delta is not None:
+                        answer_text = _stream_completion(backend, model, messages, tier, on_delta)
+                    else:
+                        completion = backend.create(
+                            model=model,
+                            messages=messages,
+                            max_tokens=tier.max_tokens,
+                            timeout=tier.timeout,
+                            **extra,
+                        )
+                        answer_text = completion.choices[0].message.content
+                trace.set(model=model, tier=tier.name, backend=tier.backend, models_tried=len(tried))
+                LLM_REQUESTS.inc(model=model, outcome="ok")
+                if len(tried) > 1:
+                    LLM_FALLBACKS.inc()
+                break  # Sucesso, sair do loop
+            except LLMBackendBusy as e:
+                print(f"Erro com modelo {model}: {e}")
+                LLM_REQUESTS.inc(model=model, outcome="busy")
+                continue
+            except Exception as e:
+                print(f"Erro com modelo {model}: {e}")
+                LLM_REQUESTS.inc(model=model, outcome="error")
+                continue
+        if answer_text:
+            break
+    return answer_text, len(tried)
+
+def _extractive_answer(question: str) -> Optional[Dict]:
+    """
+    Fast-path sem LLM: responde consultas factuais ("data da prova",
+    "competência 3") diretamente de uma entidade de tabela com alta confiança.
+    """
+    try:
+        match = get_entity_index().match(question)
+    except Exception as e:
+        print(f"Erro no índice de entidades: {e}")
+        return None
+    if not match:
+        return None
+
+    entity, score = match
+    print(f"DEBUG: Resposta extrativa ({entity['entity_type']}: {entity['key_value']}, score={score:.2f})")
+    doc = document_metadata({"document_id": entity.get("document_id")})
+    text = entity.get("text", "")
+    return {
+        "answer": render_answer(entity),
+        "citations": [{
+            "chunk_id": entity.get("chunk_id"),
+            "score": float(score),
+            "document_title": doc.get("title") if doc else None,
+            "document_source": doc.get("source") if doc else None,
+            "document_url": (doc.get("url") if doc else None) or entity.get("source_url"),
+            "excerpt": (text[:400] + "...") if len(text) > 400 else text,
+        }],
+        "found_context": True,
+    }
+
+def answer_question(question: str, k: int = 5, conversation_id: Optional[str] = None,
+                    with_title: bool = False,
+                    on_delta: Optional[Callable[[Optional[str]], None]] = None) -> Dict:
     """
     Fluxo principal:
-      - obter top-k chunks similares via pgvector,
+      - rotear a pergunta (resposta pronta, extrativa ou RAG com k por rota),
+      - obter candidatos similares via pgvector (ou do contexto da conversa),
+      - selecionar até k chunks relevantes e distintos (cotovelo + MMR),
       - montar prompt,
       - chamar LLM (OpenAI/OpenRouter) e retornar resposta + citações.
+
+    Respostas sem conversation_id ficam em cache, marcadas com os chunks e
+    documentos usados; a ingestão invalida apenas as entradas afetadas.
+
+    Com with_title, a chamada ao LLM pede JSON com título e resposta; o
+    resultado traz "title" só quando o título veio válido.
+
+    Com on_delta, a resposta do LLM é transmitida em partes (stream) e cada
+    trecho é passado a on_delta; on_delta(None) indica que o modelo falhou
+    no meio e o texto parcial deve ser descartado (o próximo modelo recomeça).
+    with_title é ignorado nesse modo (JSON não é legível em partes).
     """
-    chunks, scores = _get_similar_chunks(question, k)
+    trace = QueryTrace(question, k, conversation_id)
+    result = None
+    error = None
+    try:
+        with tracing(trace):
+            result = _answer_question(question, k, conversation_id, with_title, trace, on_delta)
+        return result
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        record = trace.finish(result, error)
+        ROUTES.inc(route=record.get("route", "error"))
+        for stage, ms in record["timings_ms"].items():
+            STAGE_LATENCY.observe(ms / 1000.0, stage=stage)
+        query_log = get_query_log()
+        if query_log is not None:
+            query_log.log(record)
+
+def _answer_question(question: str, k: int, conversation_id: Optional[str], with_title: bool,
+                     trace: QueryTrace, on_delta: Optional[Callable[[Optional[str]], None]] = None) -> Dict:
+    with trace.stage("route"):
+        route = route_question(question)
+    trace.set(route=route.name)
+    print(f"DEBUG: Rota: {route.name} (k={route.k}, confiança={route.confidence:.2f})")
+    if route.reply:
+        return {
+            "answer": route.reply,
+            "citations": [],
+            "found_context": False,
+        }
+
+    poll_changes()
+    normalized = normalize_question(question)
+    trace.set(normalized=normalized)
+    cache_key = None if conversation_id else f"{normalized}|k={k}"
+    if cache_key:
+        cached = answer_cache.get(cache_key)
+        ANSWER_CACHE.inc(result="hit" if cached is not None else "miss")
+        if cached is not None:
+            print("DEBUG: Resposta do cache")
+            trace.set(cache_hit=True, chunk_ids=[c.get("chunk_id") for c in cached.get("citations", [])])
+            return dict(cached)
+
+    if route.name == "extractive":
+        with trace.stage("extractive"):
+            extractive = _extractive_answer(question)
+        if extractive:
+            trace.set(chunk_ids=[c.get("chunk_id") for c in extractive["citations"]])
+            return extractive
+
+    k = min(k, route.k) if route.k else k
+    candidates = min(k * CANDIDATE_MULTIPLIER, MAX_CANDIDATES)
+    chunks, scores = _retrieve(question, candidates, conversation_id)
+    with trace.stage("select"):
+        chunks, scores = select_chunks(chunks, scores, max_k=k)
+    trace.set(k=k, chunk_ids=[c.get("id") for c in chunks], scores=[round(float(x), 4) for x in scores])
+    print(f"DEBUG: {len(chunks)} chunks selecionados de {candidates} candidatos")
     
     if not chunks:
-        return {
+        result = {
             "answer": NO_CONTEXT_ANSWER,
             "citations": [],
             "found_context": False,
         }
+        if cache_key:
+            answer_cache.set(cache_key, result, tags_for_chunks([]), ttl_seconds=NO_CONTEXT_TTL_SECONDS)
+        return dict(result)
     
-    system = SYSTEM_PROMPT
-    user = _build_prompt(question, chunks)
-
-    # Modelos gratuitos para fallback
-    free_models = [
-        "openai/gpt-oss-120b:free",
-        "openai/gpt-oss-20b:free",
-        "meta-llama/llama-3.2-3b-instruct:free",
-        "nousresearch/hermes-3-llama-3.1-405b:free",
-        "google/gemma-3-27b-it:free"
-    ]
-    
-    answer_text = None
-    for model in free_models:
-        try:
-            completion = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": user}
-                ],
-                max_tokens=2048,
-                
-            )
-            answer_text = completion.choices[0].message.content
-            break  # Sucesso, sair do loop
-        except Exception as e:
-            print(f"Erro com modelo {model}: {e}")
-            continue
+    with_title = with_title and on_delta is None
+    system = SYSTEM_PROMPT + TITLE_INSTRUCTIONS if with_title else SYSTEM_PROMPT
+    # Só as sentenças relevantes vão ao LLM; as citações usam os chunks inteiros
+    with trace.stage("compress"):
+        context_chunks = compress_chunks(
+            question, chunks,
+            ratio=settings.CONTEXT_COMPRESSION_RATIO,
+            min_chars=settings.CONTEXT_COMPRESSION_MIN_CHARS,
+        )
+    trace.set(
+        context_chars=sum(len(c.get("chunk_text") or "") for c in chunks),
+        compressed_chars=sum(len(c.get("chunk_text") or "") for c in context_chunks),
+    )
+    user = _build_prompt(question, context_chunks)
+    extra = {"response_format": {"type": "json_object"}} if with_title else {}
+
+    # Tier de modelo conforme tamanho do prompt e complexidade da pergunta;
+    # se todos os modelos do tier falharem, sobe para o próximo.
+    prompt_tokens = estimate_tokens(system, user)
+    plan = tier_plan(question, prompt_tokens)
+    print(f"DEBUG: Prompt ~{prompt_tokens} tokens, tier inicial: {plan[0].name}")
     
+    answer_text, tried = _complete(plan, system, user, trace, on_delta, extra)
+    title = None
+    if with_title and answer_text:
+        title, parsed = _parse_title_answer(answer_text)
+        if parsed:
+            answer_text = parsed
+        else:
+            # JSON inválido ou cortado por max_tokens: o texto bruto não é
+            # resposta. Refaz sem modo JSON; o título vai pelo caminho separado.
+            print("DEBUG: Saída combinada sem JSON válido; repetindo sem modo JSON")
+            answer_text, retried = _complete(plan, SYSTEM_PROMPT, user, trace, on_delta, {})
+            tried += retried
+
     if not answer_text:
+        trace.set(models_tried=tried)
         return {
             "answer": "Serviço temporariamente indisponível. Tente novamente mais tarde.",
             "citations": [],
             "found_context": False,
         }
-    
+
     # Sempre incluir citações quando há chunks encontrados
     citations = []
     if chunks:
         for c, s in zip(chunks, scores):
             try:
-                doc = c.get("documents")
+                doc = document_metadata(c)
                 chunk_text = c.get("chunk_text", "")
                 citations.append({
                     "chunk_id": c.get("id"),
                     "score": float(s),
                     "document_title": doc.get("title") if doc else None,
                     "document_source": doc.get("source") if doc else None,
+                    "document_url": doc.get("url") if doc else None,
                     "excerpt": (chunk_text[:400] + "...") if len(chunk_text) > 400 else chunk_text,
                 })
             except Exception:
                 continue
 
-    return {
+    result = {
         "answer": answer_text or NO_CONTEXT_ANSWER,
         "citations": citations,
         "found_context": bool(chunks),
-    }
\ No newline at end of file
+    }
+    if cache_key:
+        answer_cache.set(cache_key, result, tags_for_chunks(chunks))
+    response = dict(result)
+    if title:
+        response["title"] = title
+    return response
\ No newline at end of file
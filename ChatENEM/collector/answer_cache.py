@@ -0,0 +1,136 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from django.conf import settings
+from django.dispatch import receiver
+
+from .signals import corpus_changed
+
+# Tag de entradas que dependem do corpus inteiro (ex.: resposta "sem contexto",
+# que pode mudar com qualquer ingestão nova)
+CORPUS_TAG = "corpus"
+
+# Respostas sem contexto podem vir de falha transitória (HF/Supabase fora);
+# ficam pouco tempo no cache
+NO_CONTEXT_TTL_SECONDS = 60
+
+
+def document_tag(document_id) -> str:
+    return f"doc:{document_id}"
+
+
+def chunk_tag(chunk_id) -> str:
+    return f"chunk:{chunk_id}"
+
+
+def tags_for_chunks(chunks: List[Dict]) -> Set[str]:
+    """Tags de dependência de um resultado construído a partir destes chunks"""
+    tags = set()
+    for c in chunks:
+        if c.get("id") is not None:
+            tags.add(chunk_tag(c["id"]))
+        if c.get("document_id") is not None:
+            tags.add(document_tag(c["document_id"]))
+    return tags or {CORPUS_TAG}
+
+
+def normalize_question(question: str) -> str:
+    """Chave normalizada: minúsculas, sem acentos, pontuação e espaços extras"""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class TaggedCache:
+    """
+    Cache LRU com TTL em que cada entrada guarda as tags (chunks e documentos)
+    de que depende. Uma alteração no corpus invalida só as entradas afetadas.
+    """
+
+    def __init__(self, max_entries: int = 2000, ttl_seconds: int = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_tag: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() > entry["expires_at"]:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["value"]
+
+    def set(self, key: str, value: Any, tags: Iterable[str], ttl_seconds: Optional[int] = None):
+        tags = set(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "value": value,
+                "tags": tags,
+                "expires_at": time.time() + (ttl_seconds or self.ttl_seconds),
+            }
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Remove as entradas que dependem de qualquer uma das tags"""
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+                    removed += 1
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry["tags"]:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+answer_cache = TaggedCache(
+    max_entries=getattr(settings, "ANSWER_CACHE_MAX_ENTRIES", 2000),
+    ttl_seconds=getattr(settings, "ANSWER_CACHE_TTL_SECONDS", 3600),
+)
+
+
+@receiver(corpus_changed)
+def _invalidate_answers(sender, document_ids=(), chunk_ids=(), reason="", **kwargs):
+    if reason == "flush_all":
+        answer_cache.clear()
+        return
+    tags = {document_tag(d) for d in document_ids} | {chunk_tag(c) for c in chunk_ids}
+    tags.add(CORPUS_TAG)
+    removed = answer_cache.invalidate_tags(tags)
+    if removed:
+        print(f"Cache de respostas: {removed} entradas invalidadas ({reason})")
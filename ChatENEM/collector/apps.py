@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class CollectorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'collector'
+
+    def ready(self):
+        # Aquece o worker (imports, pools de conexão, modelo de embedding)
+        # antes da primeira pergunta; /collector/ready/ reflete o resultado.
+        # Começa no primeiro request e não aqui: ready() roda no master do
+        # gunicorn --preload, e a thread não sobreviveria ao fork dos workers.
+        from django.core.signals import request_started
+        from .warmup import start_warmup_on_request
+        request_started.connect(start_warmup_on_request, dispatch_uid="collector.warmup")
@@ -0,0 +1,166 @@
+import json
+import math
+import re
+from typing import List, Dict, Tuple, Optional, Any
+
+import numpy as np
+
+# Parâmetros padrão da seleção adaptativa
+DEFAULT_LAMBDA = 0.7          # peso relevância x diversidade no MMR
+DEFAULT_MIN_K = 1             # nunca devolver menos que isso (se houver candidatos)
+DEFAULT_MIN_DROP = 0.02       # queda mínima absoluta de score para considerar cotovelo
+DEFAULT_DROP_RATIO = 0.25     # queda mínima relativa à amplitude dos scores
+DEFAULT_DUPLICATE_SIM = 0.92  # acima disso o chunk é considerado quase duplicado
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def parse_embedding(value: Any) -> Optional[List[float]]:
+    """
+    Converte o embedding retornado pelo PostgREST (lista ou texto "[0.1,...]")
+    em lista de floats. Retorna None se não houver embedding utilizável.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    if not isinstance(value, (list, tuple)) or not value:
+        return None
+    try:
+        return [float(x) for x in value]
+    except (TypeError, ValueError):
+        return None
+
+
+def cosine(a: List[float], b: List[float]) -> float:
+    """Similaridade de cosseno entre dois vetores"""
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    if not na or not nb:
+        return 0.0
+    return dot / (na * nb)
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    """Conjunto de n-gramas de palavras para similaridade lexical"""
+    tokens = _TOKEN_RE.findall((text or "").lower())
+    if len(tokens) < size:
+        return set(tokens)
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def elbow_cutoff(
+    scores: List[float],
+    max_k: int,
+    min_k: int = DEFAULT_MIN_K,
+    min_drop: float = DEFAULT_MIN_DROP,
+    drop_ratio: float = DEFAULT_DROP_RATIO,
+) -> int:
+    """
+    Retorna quantos itens (em ordem decrescente de score) manter.
+
+    Procura a maior queda entre scores consecutivos dentro dos max_k primeiros;
+    se a queda for significativa (absoluta e relativa à amplitude), corta ali.
+    Caso contrário, mantém max_k.
+    """
+    n = min(len(scores), max_k)
+    if n <= min_k:
+        return n
+
+    spread = scores[0] - scores[len(scores) - 1]
+    best_i, best_drop = None, 0.0
+    for i in range(max(min_k, 1) - 1, n - 1):
+        drop = scores[i] - scores[i + 1]
+        if drop > best_drop:
+            best_i, best_drop = i, drop
+
+    if best_i is None:
+        return n
+    if best_drop >= min_drop and best_drop >= drop_ratio * spread:
+        return best_i + 1
+    return n
+
+
+def select_chunks(
+    chunks: List[Dict],
+    scores: List[float],
+    max_k: int,
+    min_k: int = DEFAULT_MIN_K,
+    lambda_mult: float = DEFAULT_LAMBDA,
+    duplicate_sim: float = DEFAULT_DUPLICATE_SIM,
+) -> Tuple[List[Dict], List[float]]:
+    """
+    Seleção adaptativa de contexto:
+      1. ordena candidatos por similaridade com a pergunta,
+      2. corta no cotovelo da distribuição de scores,
+      3. aplica MMR (maximal marginal relevance) para diversificar,
+         descartando chunks quase duplicados (trechos sobrepostos da mesma página).
+
+    A similaridade entre chunks usa o embedding retornado pela busca quando
+    disponível; caso contrário, cai para similaridade lexical (n-gramas).
+
+    Returns:
+        (chunks selecionados, scores correspondentes), em ordem de seleção
+    """
+    if not chunks:
+        return [], []
+
+    ranked = sorted(zip(chunks, scores), key=lambda cs: cs[1], reverse=True)
+    ranked_scores = [float(s) for _, s in ranked]
+    cutoff = elbow_cutoff(ranked_scores, max_k, min_k)
+
+    # O MMR trabalha sobre um pool um pouco maior que o corte, para poder
+    # trocar um quase-duplicado por um candidato logo abaixo do cotovelo.
+    pool = ranked[:min(len(ranked), max(cutoff * 2, cutoff + 2))]
+    target = cutoff
+
+    vectors = [parse_embedding(c.get("embedding")) for c, _ in pool]
+    use_vectors = all(v is not None for v in vectors)
+    if use_vectors:
+        # Matriz de similaridade calculada uma vez (pool pode ter ~200 itens com k alto)
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        sim_matrix = matrix @ matrix.T
+    else:
+        shingles = [_shingles(c.get("chunk_text", "")) for c, _ in pool]
+
+    def similarity(i: int, j: int) -> float:
+        if use_vectors:
+            return float(sim_matrix[i, j])
+        return _jaccard(shingles[i], shingles[j])
+
+    # Normaliza relevância para [0, 1] para ser comparável à similaridade
+    top = ranked_scores[0]
+    low = ranked_scores[len(pool) - 1]
+    span = (top - low) or 1.0
+    relevance = [(s - low) / span for _, s in pool]
+
+    selected: List[int] = []
+    remaining = list(range(len(pool)))
+    while remaining and len(selected) < target:
+        best_idx, best_value = None, None
+        for i in remaining:
+            max_sim = max((similarity(i, j) for j in selected), default=0.0)
+            if max_sim >= duplicate_sim:
+                continue
+            value = lambda_mult * relevance[i] - (1 - lambda_mult) * max_sim
+            if best_value is None or value > best_value:
+                best_idx, best_value = i, value
+        if best_idx is None:
+            break
+        selected.append(best_idx)
+        remaining.remove(best_idx)
+
+    return [pool[i][0] for i in selected], [pool[i][1] for i in selected]
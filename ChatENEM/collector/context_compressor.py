@@ -0,0 +1,150 @@
+import math
+import re
+import unicodedata
+from typing import Dict, List, Tuple
+
+# Parâmetros padrão da compressão
+DEFAULT_RATIO = 0.5       # fração de caracteres do chunk mantida (alvo)
+DEFAULT_MIN_CHARS = 400   # chunks menores que isso vão inteiros
+BM25_K1 = 1.2
+BM25_B = 0.75
+STEM_LENGTH = 5           # prefixo comparado para tolerar flexões ("inscrição" x "inscrições")
+GAP_MARKER = " [...] "
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+(?=[A-ZÁÉÍÓÚÂÊÔÃÕÇ0-9•\-–(\"“])|\n+")
+
+_STOPWORDS = {
+    "a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "no", "na", "nos", "nas",
+    "um", "uma", "uns", "umas", "para", "pra", "por", "com", "sem", "que", "qual", "quais",
+    "quando", "como", "onde", "se", "ao", "aos", "ou", "eh", "ser", "sao", "foi", "sera",
+    "me", "meu", "minha", "eu", "voce", "sobre", "mais", "tem", "ter", "posso", "pode",
+}
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _terms(text: str) -> List[str]:
+    """Termos de conteúdo, sem acentos, reduzidos a um prefixo fixo"""
+    return [t[:STEM_LENGTH] for t in re.findall(r"\w+", _normalize(text))
+            if t not in _STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_RE.split(text or "") if s and s.strip()]
+
+
+def _split_header(chunk: Dict) -> Tuple[str, str]:
+    """
+    Separa o cabeçalho de seção ("Seção > Subseção", primeira linha dos
+    chunks com metadata.context) do corpo do chunk.
+    """
+    text = chunk.get("chunk_text", "") or ""
+    meta = chunk.get("metadata") or {}
+    if meta.get("context") and "\n" in text:
+        header, body = text.split("\n", 1)
+        return header.strip(), body
+    return "", text
+
+
+class SentenceScorer:
+    """BM25 das sentenças contra a pergunta; IDF calculado sobre as sentenças candidatas"""
+
+    def __init__(self, question: str, sentences: List[List[str]]):
+        self.query = set(_terms(question))
+        self.avg_len = (sum(len(s) for s in sentences) / len(sentences)) if sentences else 1.0
+        df: Dict[str, int] = {}
+        for terms in sentences:
+            for t in set(terms) & self.query:
+                df[t] = df.get(t, 0) + 1
+        n = len(sentences)
+        self.idf = {t: math.log(1 + (n - df.get(t, 0) + 0.5) / (df.get(t, 0) + 0.5)) for t in self.query}
+
+    def score(self, terms: List[str]) -> float:
+        if not terms or not self.query:
+            return 0.0
+        counts: Dict[str, int] = {}
+        for t in terms:
+            if t in self.query:
+                counts[t] = counts.get(t, 0) + 1
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(terms) / (self.avg_len or 1.0))
+        return sum(self.idf[t] * c * (BM25_K1 + 1) / (c + norm) for t, c in counts.items())
+
+
+def compress_chunks(
+    question: str,
+    chunks: List[Dict],
+    ratio: float = DEFAULT_RATIO,
+    min_chars: int = DEFAULT_MIN_CHARS,
+) -> List[Dict]:
+    """
+    Compressão de contexto orientada à pergunta, entre a seleção de chunks e
+    o prompt.
+
+    Em cada chunk longo, mantém o cabeçalho de seção e as sentenças mais
+    relevantes para a pergunta (BM25 com IDF sobre todas as sentenças
+    candidatas) até cerca de ratio do tamanho original, na ordem original e
+    com [...] nas lacunas. Chunks curtos e entidades de tabela vão inteiros.
+
+    Retorna cópias dos chunks (mesmos id/document_id, para as citações);
+    a lista original não é alterada.
+    """
+    if not chunks or ratio <= 0 or ratio >= 1:
+        return list(chunks)
+
+    parsed = []
+    for chunk in chunks:
+        meta = chunk.get("metadata") or {}
+        text = chunk.get("chunk_text", "") or ""
+        if len(text) <= min_chars or meta.get("type") == "table_entity":
+            parsed.append(None)
+            continue
+        header, body = _split_header(chunk)
+        sentences = split_sentences(body)
+        if len(sentences) < 2:
+            parsed.append(None)
+            continue
+        parsed.append((header, body, sentences, [_terms(s) for s in sentences]))
+
+    scorer = SentenceScorer(question, [t for p in parsed if p for t in p[3]])
+
+    compressed = []
+    for chunk, item in zip(chunks, parsed):
+        if item is None:
+            compressed.append(dict(chunk))
+            continue
+        header, body, sentences, terms = item
+        scores = [scorer.score(t) for t in terms]
+        budget = max(int(len(body) * ratio), min_chars // 2)
+
+        # Sem termo em comum: o chunk veio pela similaridade semântica; mantém o início
+        order = sorted(range(len(sentences)), key=lambda i: (-scores[i], i)) if any(scores) else range(len(sentences))
+        keep, used = [], 0
+        for i in order:
+            if keep and any(scores) and scores[i] <= 0:
+                break
+            if keep and used + len(sentences[i]) > budget:
+                continue
+            keep.append(i)
+            used += len(sentences[i])
+            if used >= budget:
+                break
+        keep.sort()
+
+        parts = []
+        for position, i in enumerate(keep):
+            if position and i != keep[position - 1] + 1:
+                parts.append(GAP_MARKER.strip())
+            parts.append(sentences[i])
+        text = " ".join(parts)
+        if keep[0] > 0:
+            text = GAP_MARKER.lstrip() + text
+        if keep[-1] < len(sentences) - 1:
+            text = text + GAP_MARKER.rstrip()
+
+        new_chunk = dict(chunk)
+        new_chunk["chunk_text"] = f"{header}\n{text}" if header else text
+        compressed.append(new_chunk)
+    return compressed
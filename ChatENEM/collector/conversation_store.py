@@ -0,0 +1,159 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional
+
+from django.conf import settings
+from django.dispatch import receiver
+
+from .signals import corpus_changed
+
+# Perguntas curtas ou iniciadas por conectivos dependem da pergunta anterior
+_FOLLOW_UP_RE = re.compile(
+    r"^(e|mas|também|tambem|então|entao|e\s+quanto|e\s+para|e\s+sobre|e\s+a|e\s+o|e\s+os|e\s+as)\b",
+    re.IGNORECASE,
+)
+FOLLOW_UP_MAX_WORDS = 6
+
+
+@dataclass
+class ConversationState:
+    """Contexto de recuperação guardado no servidor para uma conversa"""
+    questions: List[str] = field(default_factory=list)
+    search_embedding: Optional[List[float]] = None  # embedding da última busca real
+    chunks: List[Dict] = field(default_factory=list)  # pool de candidatos da última busca
+    scores: List[float] = field(default_factory=list)
+    match_count: int = 0  # quantos candidatos a última busca pediu
+    updated_at: float = 0.0
+
+    @property
+    def chunk_ids(self) -> List:
+        return [c.get("id") for c in self.chunks]
+
+
+class ConversationStore:
+    """
+    Armazena, por conversation_id, os chunks recuperados na última busca,
+    para que perguntas de continuação reutilizem o contexto sem nova busca.
+
+    Limitado em número de conversas (LRU) e com expiração por inatividade.
+    O estado é local ao processo: com vários workers, uma continuação que cair
+    em outro worker apenas faz uma busca nova.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: int = 1800, max_turns: int = 6):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self._sessions: "OrderedDict[str, ConversationState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: str) -> Optional[ConversationState]:
+        """Retorna o estado da conversa ou None se inexistente/expirado"""
+        now = time.time()
+        with self._lock:
+            state = self._sessions.get(conversation_id)
+            if state is None:
+                return None
+            if now - state.updated_at > self.ttl_seconds:
+                del self._sessions[conversation_id]
+                return None
+            self._sessions.move_to_end(conversation_id)
+            return state
+
+    def record_turn(
+        self,
+        conversation_id: str,
+        question: str,
+        chunks: Optional[List[Dict]] = None,
+        scores: Optional[List[float]] = None,
+        search_embedding: Optional[List[float]] = None,
+        match_count: int = 0,
+    ) -> ConversationState:
+        """
+        Registra uma pergunta na conversa. Se chunks forem informados, a busca
+        foi refeita e o pool de candidatos em cache é substituído.
+        """
+        with self._lock:
+            state = self._sessions.get(conversation_id) or ConversationState()
+            state.questions = (state.questions + [question])[-self.max_turns:]
+            if chunks is not None:
+                state.chunks = list(chunks)
+                state.scores = list(scores or [])
+                state.search_embedding = search_embedding
+                state.match_count = match_count
+            state.updated_at = time.time()
+
+            self._sessions[conversation_id] = state
+            self._sessions.move_to_end(conversation_id)
+            self._evict()
+            return state
+
+    def invalidate(self, document_ids=(), chunk_ids=()) -> int:
+        """
+        Descarta o pool em cache das conversas que usaram algum dos
+        documentos/chunks alterados (a próxima pergunta refaz a busca).
+        """
+        document_ids, chunk_ids = set(document_ids), set(chunk_ids)
+        invalidated = 0
+        with self._lock:
+            for state in self._sessions.values():
+                if any(c.get("id") in chunk_ids or c.get("document_id") in document_ids for c in state.chunks):
+                    state.chunks, state.scores, state.search_embedding = [], [], None
+                    invalidated += 1
+        return invalidated
+
+    def discard(self, conversation_id: str):
+        with self._lock:
+            self._sessions.pop(conversation_id, None)
+
+    def _evict(self):
+        now = time.time()
+        expired = [cid for cid, s in self._sessions.items() if now - s.updated_at > self.ttl_seconds]
+        for cid in expired:
+            del self._sessions[cid]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def is_follow_up(question: str) -> bool:
+    """Pergunta curta ou iniciada por conectivo ("e para a redação?")"""
+    question = question.strip()
+    return len(question.split()) <= FOLLOW_UP_MAX_WORDS or bool(_FOLLOW_UP_RE.match(question))
+
+
+def condense_query(question: str, state: Optional[ConversationState]) -> str:
+    """
+    Monta a consulta de recuperação de uma pergunta de continuação.
+
+    "e para a redação?" depois de "qual a nota mínima do sisu?" vira
+    "qual a nota mínima do sisu? e para a redação?". A âncora é a última
+    pergunta autossuficiente da conversa, para que continuações encadeadas
+    não acumulem texto. Perguntas autossuficientes são usadas como estão.
+    """
+    question = question.strip()
+    if not state or not state.questions or not is_follow_up(question):
+        return question
+
+    anchor = next((q for q in reversed(state.questions) if not is_follow_up(q)), state.questions[-1])
+    return f"{anchor} {question}"
+
+
+conversation_store = ConversationStore(
+    max_sessions=getattr(settings, "CONVERSATION_MAX_SESSIONS", 1000),
+    ttl_seconds=getattr(settings, "CONVERSATION_TTL_SECONDS", 1800),
+)
+
+
+@receiver(corpus_changed)
+def _invalidate_conversations(sender, document_ids=(), chunk_ids=(), reason="", **kwargs):
+    if reason == "flush_all":
+        with conversation_store._lock:
+            conversation_store._sessions.clear()
+        return
+    conversation_store.invalidate(document_ids, chunk_ids)
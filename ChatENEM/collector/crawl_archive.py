@@ -0,0 +1,108 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+MODES = ("record", "replay")
+
+
+class CrawlArchive:
+    """
+    Arquivo local das respostas da coleta, no espírito do WARC.
+
+    Layout do diretório:
+        index.jsonl            um registro por resposta (url, url final,
+                               status, headers, encoding, sha256, tamanho)
+        bodies/ab/abcd...gz    corpo comprimido, endereçado pelo sha256
+
+    Corpos iguais (a mesma página ou PDF em várias coletas) são gravados uma
+    vez só. No modo "record" o HTTPClient grava cada resposta recebida; no
+    modo "replay" ele responde a partir do arquivo, sem rede, e a última
+    gravação de cada URL vale. Assim o pipeline inteiro (extração, chunking,
+    embeddings) roda offline e de forma reprodutível.
+    """
+
+    def __init__(self, directory: str, mode: str = "record"):
+        if mode not in MODES:
+            raise ValueError(f"Modo de arquivo inválido: {mode} (use {', '.join(MODES)})")
+        self.directory = directory
+        self.mode = mode
+        self.index_path = os.path.join(directory, "index.jsonl")
+        self._lock = threading.Lock()
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        os.makedirs(os.path.join(directory, "bodies"), exist_ok=True)
+        if mode == "replay":
+            for record in self.iter_records():
+                self._latest[record["url"]] = record
+            print(f"Arquivo de coleta carregado: {len(self._latest)} URLs")
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _body_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "bodies", digest[:2], f"{digest}.gz")
+
+    # -----------------------------
+    # Gravação
+    # -----------------------------
+
+    def record(self, url: str, final_url: str, status_code: int, headers: Dict[str, str],
+               body: bytes, encoding: Optional[str] = None):
+        digest = hashlib.sha256(body or b"").hexdigest()
+        path = self._body_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp, "wb") as f:
+                f.write(body or b"")
+            os.replace(tmp, path)
+
+        record = {
+            "url": url,
+            "final_url": final_url,
+            "status_code": status_code,
+            "headers": headers,
+            "encoding": encoding,
+            "sha256": digest,
+            "size": len(body or b""),
+            "fetched_at": time.time(),
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._latest[url] = record
+
+    # -----------------------------
+    # Leitura
+    # -----------------------------
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """Última gravação da URL com o corpo (bytes) em "body"; None se ausente"""
+        record = self._latest.get(url)
+        if record is None:
+            return None
+        try:
+            with gzip.open(self._body_path(record["sha256"]), "rb") as f:
+                body = f.read()
+        except OSError as e:
+            print(f"Corpo ausente no arquivo para {url}: {e}")
+            return None
+        return {**record, "body": body}
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Última linha truncada por uma coleta interrompida
+                    continue
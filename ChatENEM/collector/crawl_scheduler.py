@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from .metrics import CRAWL_FETCH_LATENCY
+
+DEFAULT_FETCH_WORKERS = 4
+DEFAULT_CONNECTIONS_PER_HOST = 2
+
+
+class HostLimiter:
+    """
+    Cortesia por host: no máximo max_connections requisições simultâneas e
+    um intervalo mínimo entre o início de duas requisições ao mesmo host.
+
+    O intervalo é o maior entre min_interval e o Crawl-delay/Request-rate do
+    robots.txt do host (interval_for). Hosts diferentes não esperam uns
+    pelos outros.
+    """
+
+    def __init__(self, min_interval: float = 1.5,
+                 max_connections: int = DEFAULT_CONNECTIONS_PER_HOST,
+                 interval_for: Optional[Callable[[str], Optional[float]]] = None):
+        self.min_interval = min_interval
+        self.max_connections = max_connections
+        self.interval_for = interval_for
+        self._lock = threading.Lock()
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._next_start: Dict[str, float] = {}
+        self._intervals: Dict[str, float] = {}
+
+    def _host(self, url: str) -> str:
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc.lower()}"
+
+    def interval(self, url: str) -> float:
+        host = self._host(url)
+        if host not in self._intervals:
+            robots_delay = None
+            if self.interval_for is not None:
+                try:
+                    robots_delay = self.interval_for(url)
+                except Exception as e:
+                    print(f"Erro lendo crawl-delay de {host}: {e}")
+            self._intervals[host] = max(self.min_interval, robots_delay or 0.0)
+        return self._intervals[host]
+
+    @contextmanager
+    def slot(self, url: str):
+        """Ocupa uma conexão do host e espera a vez dele antes de liberar a requisição"""
+        host = self._host(url)
+        interval = self.interval(url)
+        with self._lock:
+            slots = self._slots.setdefault(host, threading.BoundedSemaphore(self.max_connections))
+
+        slots.acquire()
+        try:
+            # Reserva o próximo horário livre do host; quem chega depois fica
+            # com o horário seguinte, então as esperas não se sobrepõem.
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start.get(host, now))
+                self._next_start[host] = start + interval
+            if start > now:
+                time.sleep(start - now)
+            yield
+        finally:
+            slots.release()
+
+
+class ConcurrentFetcher:
+    """
+    Busca páginas em um pool de threads, respeitando o HostLimiter.
+
+    submit() devolve um Future com a resposta de HTTPClient.fetch; quem
+    consome (o pipeline) processa as páginas já baixadas enquanto as
+    próximas ainda estão na rede.
+    """
+
+    def __init__(self, http_client, limiter: HostLimiter, workers: int = DEFAULT_FETCH_WORKERS):
+        self.http_client = http_client
+        self.limiter = limiter
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crawl-fetch")
+
+    def _fetch(self, url: str):
+        with self.limiter.slot(url):
+            started = time.perf_counter()
+            try:
+                return self.http_client.fetch(url)
+            except Exception as e:
+                # Mesmo formato de falha de HTTPClient.fetch
+                return {'status_code': 0, 'content': '', 'headers': {}, 'url': url, 'error': str(e)}
+            finally:
+                CRAWL_FETCH_LATENCY.observe(time.perf_counter() - started)
+
+    def submit(self, url: str) -> "Future":
+        return self.executor.submit(self._fetch, url)
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -2,7 +2,12 @@ from typing import List, Dict, Any, Optional
 import os
 import requests
 import hashlib
+import time
 from .embedding import embed_batch
+from .vector_codecs import format_vector
+from .signals import publish_change
+from .pg_backend import PostgresBackend, get_postgres_backend
+from .metrics import SUPABASE_REQUESTS
 
 class DatabaseLayer:
     """
@@ -10,8 +15,11 @@ class DatabaseLayer:
     Inserção idempotente e geração de embeddings
     """
 
-    def __init__(self, supabase_url: str, supabase_key: str, embedding_model: str = "all-MiniLM-L6-v2"):
+    def __init__(self, supabase_url: str, supabase_key: str, embedding_model: str = "all-MiniLM-L6-v2",
+                 pg: Optional[PostgresBackend] = None):
         self.url = supabase_url
+        # Conexão direta (settings.DATABASE_BACKEND="postgres"); None = PostgREST
+        self.pg = pg or get_postgres_backend()
         self.headers = {
             'apikey': supabase_key,
             'Authorization': f'Bearer {supabase_key}',
@@ -34,6 +42,16 @@ class DatabaseLayer:
             if parsed.query:
                 url_norm += f"?{parsed.query}"
 
+            if self.pg is not None:
+                doc_id = self.pg.insert_document(url, url_norm, title, source_type)
+                if doc_id is not None:
+                    publish_change(
+                        document_ids=[doc_id],
+                        reason="insert_document",
+                        documents=[{'id': doc_id, 'title': title, 'source': source_type, 'url': url}]
+                    )
+                return doc_id
+
             doc_data = {
                 'url': url,
                 'url_norm': url_norm,  # URL normalizada para deduplicação
@@ -48,6 +66,7 @@ class DatabaseLayer:
                 json=doc_data
             )
 
+            SUPABASE_REQUESTS.inc(operation="insert_document", outcome="ok" if response.status_code in [200, 201] else "error")
             if response.status_code in [200, 201]:
                 # Buscar ID do documento inserido
                 search_response = requests.get(
@@ -58,6 +77,11 @@ class DatabaseLayer:
                 if search_response.status_code == 200:
                     docs = search_response.json()
                     if docs:
+                        publish_change(
+                            document_ids=[docs[0]['id']],
+                            reason="insert_document",
+                            documents=[{'id': docs[0]['id'], 'title': title, 'source': source_type, 'url': url}]
+                        )
                         return docs[0]['id']
 
             print(f"Erro inserindo documento: {response.status_code} - {response.text}")
@@ -79,12 +103,17 @@ class DatabaseLayer:
             {
                 'inserted': int,
                 'skipped': int,
-                'errors': int
+                'errors': int,
+                'ids': {hash: id} dos chunks inseridos
             }
         """
+        if self.pg is not None:
+            return self._insert_chunks_direct(chunks, document_id)
+
         inserted = 0
         skipped = 0
         errors = 0
+        inserted_ids = {}  # hash → id no banco
 
         for chunk in chunks:
             try:
@@ -116,26 +145,25 @@ class DatabaseLayer:
                     'document_id': document_id,  # FK para documents
                     'chunk_hash': chunk_hash,  # Hash do conteúdo para verificação
                     'chunk_text': text,
-                    'embedding': embedding,
+                    'embedding': format_vector(embedding) if embedding else None,  # texto pgvector compacto
                     'embedding_model': self.embedding_model,  # Modelo usado para embedding
-                    'metadata': {
-                        **chunk.get('metadata', {}),
-                        "domain": "ENEM",
-                        "institution": "INEP/MEC",
-                        "language": "pt-BR",
-                    },
+                    'metadata': self._chunk_metadata(chunk),
                     'created_at': 'now()'
                 }
 
-                # Inserir
+                # Inserir (retornando só o id, para invalidar caches dependentes)
                 response = requests.post(
-                    f"{self.url}/rest/v1/document_chunks",
-                    headers=self.headers,
+                    f"{self.url}/rest/v1/document_chunks?select=id",
+                    headers={**self.headers, 'Prefer': 'return=representation'},
                     json=chunk_data
                 )
 
                 if response.status_code in [200, 201]:
                     inserted += 1
+                    try:
+                        inserted_ids[chunk_hash] = response.json()[0]['id']
+                    except (ValueError, IndexError, KeyError, TypeError):
+                        pass
                 else:
                     print(f"Erro inserindo chunk {chunk_hash}: {response.status_code} - {response.text}")
                     errors += 1
@@ -144,12 +172,126 @@ class DatabaseLayer:
                 print(f"Erro processando chunk: {e}")
                 errors += 1
 
+        if inserted:
+            publish_change(document_ids=[document_id], chunk_ids=list(inserted_ids.values()), reason="insert_chunks")
+
         return {
             'inserted': inserted,
             'skipped': skipped,
-            'errors': errors
+            'errors': errors,
+            'ids': inserted_ids
+        }
+
+    def _chunk_metadata(self, chunk: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **chunk.get('metadata', {}),
+            "domain": "ENEM",
+            "institution": "INEP/MEC",
+            "language": "pt-BR",
+        }
+
+    def _insert_chunks_direct(self, chunks: List[Dict[str, Any]], document_id: Optional[str] = None) -> Dict[str, int]:
+        """insert_chunks pela conexão direta: uma consulta de hashes e um COPY"""
+        try:
+            existing = self.pg.existing_hashes(c.get('hash') for c in chunks)
+        except Exception as e:
+            print(f"Erro consultando chunks existentes: {e}")
+            return {'inserted': 0, 'skipped': 0, 'errors': len(chunks), 'ids': {}}
+
+        skipped = 0
+        rows = []
+        seen = set()
+        for chunk in chunks:
+            chunk_hash = chunk.get('hash')
+            if chunk_hash in existing or chunk_hash in seen:
+                skipped += 1
+                continue
+            seen.add(chunk_hash)
+
+            text = chunk.get('text', '')
+            embedding = None
+            if text:
+                try:
+                    embedding = embed_batch([text])[0]
+                except Exception as e:
+                    print(f"Erro gerando embedding para chunk {chunk_hash}: {e}")
+
+            rows.append({
+                'document_id': document_id,
+                'chunk_hash': chunk_hash,
+                'chunk_text': text,
+                'embedding': embedding,
+                'embedding_model': self.embedding_model,
+                'metadata': self._chunk_metadata(chunk),
+            })
+
+        try:
+            inserted_ids = self.pg.copy_chunks(rows)
+        except Exception as e:
+            print(f"Erro no COPY de chunks: {e}")
+            return {'inserted': 0, 'skipped': skipped, 'errors': len(rows), 'ids': {}}
+
+        # Corrida com outro processo: conflito no chunk_hash conta como ignorado
+        skipped += len(rows) - len(inserted_ids)
+        if inserted_ids:
+            publish_change(document_ids=[document_id], chunk_ids=list(inserted_ids.values()), reason="insert_chunks")
+
+        return {
+            'inserted': len(inserted_ids),
+            'skipped': skipped,
+            'errors': 0,
+            'ids': inserted_ids
         }
 
+    def bulk_upsert(
+        self,
+        table: str,
+        rows: List[Dict[str, Any]],
+        on_conflict: Optional[str] = None,
+        ignore_duplicates: bool = False,
+        session: Optional[requests.Session] = None,
+        max_retries: int = 3
+    ) -> Dict[str, int]:
+        """
+        Grava um lote de linhas em um único POST (upsert do PostgREST)
+
+        Args:
+            table: Tabela de destino
+            rows: Linhas já no formato da tabela (todas com as mesmas colunas)
+            on_conflict: Coluna(s) da restrição única usada no upsert
+            ignore_duplicates: True = mantém a linha existente; False = sobrescreve
+            session: Sessão HTTP (reutilizada entre lotes/threads)
+
+        Returns:
+            {'written': int, 'errors': int}
+        """
+        if not rows:
+            return {'written': 0, 'errors': 0}
+
+        session = session or requests
+        resolution = 'ignore-duplicates' if ignore_duplicates else 'merge-duplicates'
+        url = f"{self.url}/rest/v1/{table}"
+        if on_conflict:
+            url += f"?on_conflict={on_conflict}"
+        headers = {**self.headers, 'Prefer': f'resolution={resolution},return=minimal'}
+
+        for attempt in range(max_retries + 1):
+            try:
+                response = session.post(url, headers=headers, json=rows, timeout=120)
+                if response.status_code in [200, 201, 204]:
+                    return {'written': len(rows), 'errors': 0}
+                # Erros 4xx não melhoram com nova tentativa
+                if 400 <= response.status_code < 500 and response.status_code != 429:
+                    print(f"Erro no upsert em {table}: {response.status_code} - {response.text[:500]}")
+                    break
+                print(f"Upsert em {table} falhou ({response.status_code}), tentativa {attempt + 1}")
+            except requests.exceptions.RequestException as e:
+                print(f"Erro de rede no upsert em {table}: {e}, tentativa {attempt + 1}")
+            if attempt < max_retries:
+                time.sleep(2 ** attempt)
+
+        return {'written': 0, 'errors': len(rows)}
+
     def search_similar_chunks(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """
         Busca chunks similares usando embeddings
@@ -165,6 +307,9 @@ class DatabaseLayer:
             # Gerar embedding da query
             query_embedding = embed_batch([query])[0]
 
+            if self.pg is not None:
+                return self.pg.search_chunks(query_embedding, limit)
+
             # Buscar via RPC do Supabase
             response = requests.post(
                 f"{self.url}/rest/v1/rpc/search_chunks",
@@ -0,0 +1,152 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.dispatch import receiver
+
+from .signals import corpus_changed
+
+
+class DocumentMetadataCache:
+    """
+    Cache em memória id → {title, source, url} dos documentos.
+
+    Carregado no warm-up ou, sem ele, no primeiro uso, e mantido pela
+    ingestão (sinal corpus_changed). Um id ausente (documento inserido por
+    outro processo sem passar pelo journal) é buscado sozinho no banco;
+    ids inexistentes ficam marcados por MISS_TTL_SECONDS para não repetir a
+    consulta a cada pergunta.
+    """
+
+    FIELDS = ("title", "source", "url")
+    RETRY_SECONDS = 30.0
+    MISS_TTL_SECONDS = 60.0
+
+    def __init__(self):
+        self._docs: Dict[str, Dict[str, Optional[str]]] = {}
+        self._misses: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._load_failed_at = 0.0
+        self.loaded = False
+
+    def load_all(self, page_size: int = 1000) -> int:
+        """Carrega todos os documentos do Supabase (paginação por id)"""
+        from .supabase_client import SupabaseClient
+        supabase = SupabaseClient()
+        docs = {}
+        last_id = 0
+        while True:
+            response = supabase.session.get(
+                f"{supabase.url}/rest/v1/documents?select=id,title,source,url"
+                f"&id=gt.{last_id}&order=id.asc&limit={page_size}",
+                headers=supabase.headers,
+                timeout=30
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"Erro carregando documentos: {response.status_code} - {response.text}")
+            rows = response.json()
+            if not rows:
+                break
+            for row in rows:
+                docs[str(row["id"])] = {f: row.get(f) for f in self.FIELDS}
+            last_id = rows[-1]["id"]
+
+        with self._lock:
+            self._docs = docs
+            self._misses = {}
+            self.loaded = True
+        print(f"Cache de documentos: {len(docs)} documentos carregados")
+        return len(docs)
+
+    def ensure_loaded(self) -> bool:
+        """Carrega o cache se o warm-up não carregou; falhas esperam RETRY_SECONDS"""
+        if self.loaded:
+            return True
+        with self._load_lock:
+            if self.loaded or time.monotonic() - self._load_failed_at < self.RETRY_SECONDS:
+                return self.loaded
+            try:
+                self.load_all()
+            except Exception as e:
+                self._load_failed_at = time.monotonic()
+                print(f"Erro carregando cache de documentos: {e}")
+        return self.loaded
+
+    def _fetch_one(self, key: str) -> Optional[Dict[str, Optional[str]]]:
+        from .supabase_client import SupabaseClient
+        supabase = SupabaseClient()
+        response = supabase.session.get(
+            f"{supabase.url}/rest/v1/documents?select=id,title,source,url&id=eq.{key}",
+            headers=supabase.headers,
+            timeout=10
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Erro buscando documento {key}: {response.status_code} - {response.text}")
+        rows = response.json()
+        return {f: rows[0].get(f) for f in self.FIELDS} if rows else None
+
+    def get(self, document_id) -> Optional[Dict[str, Optional[str]]]:
+        if document_id is None:
+            return None
+        key = str(document_id)
+        doc = self._docs.get(key)
+        if doc is not None or not self.ensure_loaded():
+            return doc
+        doc = self._docs.get(key)
+        if doc is not None or time.monotonic() - self._misses.get(key, float("-inf")) < self.MISS_TTL_SECONDS:
+            return doc
+
+        try:
+            doc = self._fetch_one(key)
+        except Exception as e:
+            print(f"Erro no cache de documentos: {e}")
+            return None
+        with self._lock:
+            if doc is None:
+                self._misses[key] = time.monotonic()
+            else:
+                self._misses.pop(key, None)
+                self._docs[key] = doc
+        return doc
+
+    def update(self, document_id, **fields):
+        if document_id is None:
+            return
+        with self._lock:
+            doc = dict(self._docs.get(str(document_id), {}))
+            doc.update({f: fields[f] for f in self.FIELDS if f in fields})
+            self._docs[str(document_id)] = doc
+            self._misses.pop(str(document_id), None)
+
+    def remove(self, document_ids: List):
+        with self._lock:
+            for d in document_ids:
+                self._docs.pop(str(d), None)
+
+    def __len__(self):
+        return len(self._docs)
+
+
+document_cache = DocumentMetadataCache()
+
+
+def document_metadata(chunk: Dict) -> Optional[Dict]:
+    """
+    Metadados do documento de um chunk: usa o join "documents" do resultado
+    da busca quando presente, senão o cache (que só vai ao banco na carga
+    inicial ou para um id que ainda não conhece).
+    """
+    doc = chunk.get("documents")
+    if doc:
+        return doc
+    return document_cache.get(chunk.get("document_id"))
+
+
+@receiver(corpus_changed)
+def _update_documents(sender, document_ids=(), reason="", documents=(), **kwargs):
+    if reason == "delete_documents":
+        document_cache.remove(document_ids)
+        return
+    for doc in documents or ():
+        document_cache.update(doc.get("id"), **{f: doc.get(f) for f in DocumentMetadataCache.FIELDS})
@@ -3,6 +3,7 @@ import requests
 import tempfile
 import os
 import re
+from contextlib import nullcontext
 
 # Imports opcionais para processamento de documentos
 try:
@@ -28,7 +29,11 @@ class DocumentProcessor:
     Processa documentos incorporados (PDF, DOC, RAR, etc.)
     """
 
-    def __init__(self):
+    def __init__(self, host_limiter=None, http_client=None):
+        # Mesmo controle de cortesia por host das páginas (crawl_scheduler.HostLimiter)
+        self.host_limiter = host_limiter
+        # Com http_client, o download passa pelo retry e pelo arquivo de coleta dele
+        self.http_client = http_client
         self.ocr_reader = None
         if HAS_OCR:
             try:
@@ -49,15 +54,23 @@ class DocumentProcessor:
             Lista de blocos de documento
         """
         try:
-            # Download do documento
-            response = requests.get(url, timeout=30, stream=True)
-            response.raise_for_status()
+            # Download do documento (só o download ocupa a vaga do host)
+            with self._host_slot(url):
+                if self.http_client is not None:
+                    response = self.http_client.fetch_bytes(url)
+                    if response['error']:
+                        raise requests.exceptions.RequestException(f"{response['error']}: {url}")
+                    chunks = [response['content']]
+                else:
+                    response = requests.get(url, timeout=30, stream=True)
+                    response.raise_for_status()
+                    chunks = response.iter_content(chunk_size=8192)
 
-            # Salvar temporariamente
-            with tempfile.NamedTemporaryFile(delete=False, suffix=self._get_file_extension(url)) as temp_file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    temp_file.write(chunk)
-                temp_path = temp_file.name
+                # Salvar temporariamente
+                with tempfile.NamedTemporaryFile(delete=False, suffix=self._get_file_extension(url)) as temp_file:
+                    for chunk in chunks:
+                        temp_file.write(chunk)
+                    temp_path = temp_file.name
 
             try:
                 # Processar baseado no tipo
@@ -106,6 +119,11 @@ class DocumentProcessor:
         else:
             return 'unknown'
 
+    def _host_slot(self, url: str):
+        if self.host_limiter is None:
+            return nullcontext()
+        return self.host_limiter.slot(url)
+
     def _get_file_extension(self, url: str) -> str:
         """Extrai extensão do arquivo da URL"""
         import os.path
@@ -2,14 +2,54 @@ import os
 import requests
 import time
 from typing import List
+from django.conf import settings
+
+from .metrics import EMBEDDED_TEXTS, EMBEDDING_LATENCY, EMBEDDING_REQUESTS
 
 HF_MODEL = "intfloat/multilingual-e5-large"
 HF_API_URL = f"https://router.huggingface.co/hf-inference/models/{HF_MODEL}/pipeline/feature-extraction"
 
+# Sessão compartilhada: reaproveita conexões TLS com o HF entre chamadas
+_session = requests.Session()
+
 
 def embed_batch(
     texts: List[str],
     mode: str = "document"  # "document" ou "query"
+) -> List[List[float]]:
+    """
+    Gera embeddings semânticos para o ChatENEM.
+
+    Com settings.EMBEDDING_SERVICE_URL definido, o pedido vai para o serviço local,
+    que junta as chamadas de todos os workers em micro-lotes e mantém uma
+    única instância do modelo. Se o serviço estiver fora do ar, cai para a
+    API do Hugging Face.
+    """
+    service_url = settings.EMBEDDING_SERVICE_URL.rstrip("/")
+    if service_url:
+        started = time.perf_counter()
+        try:
+            response = _session.post(
+                f"{service_url}/embed",
+                json={"texts": texts, "mode": mode},
+                timeout=120
+            )
+            if response.status_code == 200:
+                EMBEDDING_LATENCY.observe(time.perf_counter() - started, backend="service")
+                EMBEDDING_REQUESTS.inc(backend="service", outcome="ok")
+                EMBEDDED_TEXTS.inc(len(texts), backend="service")
+                return response.json()["embeddings"]
+            print(f"Serviço de embeddings respondeu {response.status_code}: {response.text}")
+        except requests.RequestException as e:
+            print(f"Serviço de embeddings indisponível, usando HF: {e}")
+        EMBEDDING_REQUESTS.inc(backend="service", outcome="error")
+
+    return embed_remote(texts, mode)
+
+
+def embed_remote(
+    texts: List[str],
+    mode: str = "document"  # "document" ou "query"
 ) -> List[List[float]]:
     """
     Gera embeddings semânticos para o ChatENEM usando Hugging Face (gratuito).
@@ -48,8 +88,9 @@ def embed_batch(
         }
     }
 
+    started = time.perf_counter()
     try:
-        response = requests.post(
+        response = _session.post(
             HF_API_URL,
             headers=headers,
             json=payload,
@@ -59,7 +100,7 @@ def embed_batch(
         # Modelo carregando
         if response.status_code == 503:
             time.sleep(20)
-            response = requests.post(
+            response = _session.post(
                 HF_API_URL,
                 headers=headers,
                 json=payload,
@@ -71,7 +112,11 @@ def embed_batch(
                 f"HF API error {response.status_code}: {response.text}"
             )
 
+        EMBEDDING_LATENCY.observe(time.perf_counter() - started, backend="hf")
+        EMBEDDING_REQUESTS.inc(backend="hf", outcome="ok")
+        EMBEDDED_TEXTS.inc(len(texts), backend="hf")
         return response.json()
 
     except Exception as e:
+        EMBEDDING_REQUESTS.inc(backend="hf", outcome="error")
         raise RuntimeError(f"Erro ao gerar embeddings do ENEM: {e}") from e
@@ -0,0 +1,202 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty, Queue
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_WINDOW_MS = 5.0
+DEFAULT_MAX_BATCH = 64
+REQUEST_TIMEOUT = 120.0
+
+Backend = Callable[[List[str], str], List[List[float]]]
+
+
+# =============================
+# BACKENDS
+# =============================
+
+def local_backend(model_name: str, device: Optional[str] = None) -> Backend:
+    """
+    Modelo carregado uma única vez no processo do serviço
+    (requer sentence-transformers, dependência opcional).
+    """
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError as e:
+        raise RuntimeError(
+            "Backend local requer sentence-transformers (pip install sentence-transformers)"
+        ) from e
+
+    model = SentenceTransformer(model_name, device=device)
+
+    def encode(texts: List[str], mode: str) -> List[List[float]]:
+        prefix = "query: " if mode == "query" else "passage: "
+        vectors = model.encode([prefix + t for t in texts], batch_size=len(texts),
+                               normalize_embeddings=True, show_progress_bar=False)
+        return vectors.tolist()
+
+    return encode
+
+
+def remote_backend() -> Backend:
+    """Repassa os lotes para a API do Hugging Face (uma chamada por micro-lote)"""
+    from .embedding import embed_remote
+    return embed_remote
+
+
+# =============================
+# MICRO-LOTES
+# =============================
+
+class _Request:
+    __slots__ = ("texts", "mode", "done", "result", "error")
+
+    def __init__(self, texts: List[str], mode: str):
+        self.texts = texts
+        self.mode = mode
+        self.done = threading.Event()
+        self.result: Optional[List[List[float]]] = None
+        self.error: Optional[str] = None
+
+
+class MicroBatcher:
+    """
+    Junta pedidos concorrentes (de todos os workers) em micro-lotes.
+
+    O primeiro pedido abre uma janela de window_ms; tudo que chegar dentro
+    dela (até max_batch textos) vai para o modelo numa única chamada, agrupado
+    por modo (query/document). Cada pedido recebe de volta apenas seus vetores.
+    """
+
+    def __init__(self, backend: Backend, window_ms: float = DEFAULT_WINDOW_MS,
+                 max_batch: int = DEFAULT_MAX_BATCH):
+        self.backend = backend
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue: "Queue[_Request]" = Queue()
+        self._stats = {"requests": 0, "texts": 0, "batches": 0, "batch_seconds": 0.0}
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def embed(self, texts: List[str], mode: str = "document",
+              timeout: float = REQUEST_TIMEOUT) -> List[List[float]]:
+        request = _Request(texts, mode)
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError("Tempo esgotado aguardando o micro-lote")
+        if request.error:
+            raise RuntimeError(request.error)
+        return request.result
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_batch_texts"] = stats["texts"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def _collect(self) -> List[_Request]:
+        first = self._queue.get()
+        batch, size = [first], len(first.texts)
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            for mode in {r.mode for r in batch}:
+                self._process([r for r in batch if r.mode == mode], mode)
+
+    def _process(self, requests: List[_Request], mode: str):
+        texts = [t for r in requests for t in r.texts]
+        started = time.perf_counter()
+        try:
+            vectors = self.backend(texts, mode)
+            if len(vectors) != len(texts):
+                raise RuntimeError(f"Backend devolveu {len(vectors)} vetores para {len(texts)} textos")
+        except Exception as e:
+            for r in requests:
+                r.error = f"Erro ao gerar embeddings: {e}"
+                r.done.set()
+            return
+
+        offset = 0
+        for r in requests:
+            r.result = vectors[offset:offset + len(r.texts)]
+            offset += len(r.texts)
+            r.done.set()
+
+        with self._stats_lock:
+            self._stats["requests"] += len(requests)
+            self._stats["texts"] += len(texts)
+            self._stats["batches"] += 1
+            self._stats["batch_seconds"] += time.perf_counter() - started
+
+
+# =============================
+# SERVIDOR HTTP
+# =============================
+
+class _Handler(BaseHTTPRequestHandler):
+    batcher: MicroBatcher = None
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send(404, {"error": "not found"})
+            return
+        self._send(200, {"status": "ok", **self.batcher.stats()})
+
+    def do_POST(self):
+        if self.path != "/embed":
+            self._send(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            texts = payload.get("texts")
+            mode = payload.get("mode", "document")
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError("'texts' deve ser uma lista de strings")
+            if mode not in ("document", "query"):
+                raise ValueError("'mode' deve ser 'document' ou 'query'")
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+
+        if not texts:
+            self._send(200, {"embeddings": []})
+            return
+        try:
+            self._send(200, {"embeddings": self.batcher.embed(texts, mode)})
+        except Exception as e:
+            self._send(502, {"error": str(e)})
+
+    def _send(self, status: int, body: Dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(batcher: MicroBatcher, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """Servidor local: POST /embed {"texts": [...], "mode": "query"} e GET /health"""
+    handler = type("EmbeddingHandler", (_Handler,), {"batcher": batcher})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
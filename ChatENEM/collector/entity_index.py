@@ -0,0 +1,291 @@
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from difflib import SequenceMatcher
+from typing import List, Dict, Any, Optional, Tuple
+
+from django.dispatch import receiver
+
+from .signals import corpus_changed
+
+# Tipos de tabela com estrutura conhecida (ver TableProcessor.table_type_patterns)
+ANSWERABLE_TYPES = ("cronograma_enem", "competencia_redacao", "estrutura_prova", "nota_minima")
+
+# Palavras que indicam que a pergunta é uma consulta a um tipo de entidade
+TYPE_TRIGGERS = {
+    "cronograma_enem": ("data", "datas", "quando", "dia", "prazo", "periodo", "cronograma"),
+    "competencia_redacao": ("competencia",),
+    "estrutura_prova": ("quantas questoes", "numero de questoes", "questoes", "peso"),
+    "nota_minima": ("nota minima", "nota de corte", "pontuacao minima"),
+}
+
+# Atributos de contexto que não entram na resposta
+_HIDDEN_ATTRIBUTES = {"Contexto", "Grupo"}
+
+_STOPWORDS = {
+    "a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "no", "na", "nos", "nas",
+    "qual", "quais", "que", "quando", "eh", "para", "pra", "sobre", "um", "uma", "enem",
+    "como", "ser", "sera", "vai", "foi", "me", "diga", "sabe", "por", "favor",
+}
+
+MIN_CONFIDENCE = 0.75   # score mínimo para responder sem LLM
+MIN_MARGIN = 0.1        # vantagem mínima sobre o segundo candidato
+RELOAD_INTERVAL = 30.0
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sem acentos e pontuação"""
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _content_tokens(text: str) -> List[str]:
+    return [t for t in normalize(text).split() if t not in _STOPWORDS]
+
+
+class EntityIndex:
+    """
+    Índice de entidades de tabela (cronograma, competências, estrutura da
+    prova, notas mínimas) persistido em JSON e consultado por chave com
+    correspondência aproximada.
+
+    Permite responder consultas factuais diretamente a partir da linha da
+    tabela, sem busca vetorial nem LLM. O arquivo é relido quando muda em
+    disco (a ingestão roda em outro processo).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entities: List[Dict[str, Any]] = []
+        self._by_key: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # Persistência
+    # -----------------------------
+
+    def load(self, force: bool = False) -> int:
+        """Carrega (ou recarrega, se o arquivo mudou) o índice do disco"""
+        now = time.time()
+        if not force and now - self._checked_at < RELOAD_INTERVAL:
+            return len(self.entities)
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return len(self.entities)
+        if not force and mtime == self._mtime:
+            return len(self.entities)
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entities = json.load(f)
+        except Exception as e:
+            print(f"Erro carregando índice de entidades: {e}")
+            return len(self.entities)
+
+        with self._lock:
+            self._set_entities(entities)
+            self._mtime = mtime
+        return len(self.entities)
+
+    def save(self):
+        """Grava o índice de forma atômica (arquivo temporário + rename)"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entities, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._mtime = os.path.getmtime(self.path)
+
+    def _set_entities(self, entities: List[Dict[str, Any]]):
+        self.entities = entities
+        self._by_key = {(e["entity_type"], normalize(e["key_value"])): e for e in entities}
+
+    # -----------------------------
+    # Atualização
+    # -----------------------------
+
+    def add_chunks(self, chunks: List[Dict[str, Any]], document_id=None,
+                   chunk_ids: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Adiciona as entidades presentes em chunks do SemanticProcessor
+        (metadata.type == "table_entity"). chunk_ids mapeia hash → id no banco;
+        chunks sem id (não gravados nesta chamada) ficam de fora.
+        """
+        chunk_ids = chunk_ids or {}
+        rows = []
+        for chunk in chunks:
+            meta = chunk.get("metadata", {})
+            rows.append({
+                "id": chunk_ids.get(chunk.get("hash")),
+                "document_id": document_id,
+                "chunk_text": chunk.get("text", ""),
+                "metadata": meta,
+            })
+        return self.add_rows(rows)
+
+    def add_rows(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Adiciona entidades a partir de linhas de document_chunks. Linhas sem
+        id são descartadas: a resposta extrativa precisa citar o chunk.
+        """
+        added = 0
+        without_id = 0
+        with self._lock:
+            by_key = dict(self._by_key)
+            for row in rows:
+                meta = row.get("metadata") or {}
+                if meta.get("type") != "table_entity" or meta.get("entity_type") not in ANSWERABLE_TYPES:
+                    continue
+                if not meta.get("key_value"):
+                    continue
+                if row.get("id") is None:
+                    without_id += 1
+                    continue
+                entity = {
+                    "entity_type": meta["entity_type"],
+                    "key_field": meta.get("key_field", ""),
+                    "key_value": meta["key_value"],
+                    "attributes": meta.get("attributes", {}),
+                    "confidence": meta.get("confidence", "high"),
+                    "source_url": meta.get("source_url", ""),
+                    "chunk_id": row.get("id"),
+                    "document_id": row.get("document_id"),
+                    "text": row.get("chunk_text", ""),
+                }
+                by_key[(entity["entity_type"], normalize(entity["key_value"]))] = entity
+                added += 1
+            self._set_entities(list(by_key.values()))
+        if without_id:
+            print(f"Índice de entidades: {without_id} entidades sem chunk_id ignoradas")
+        return added
+
+    def remove_documents(self, document_ids: List) -> int:
+        ids = {str(d) for d in document_ids}
+        with self._lock:
+            kept = [e for e in self.entities if str(e.get("document_id")) not in ids]
+            removed = len(self.entities) - len(kept)
+            if removed:
+                self._set_entities(kept)
+        return removed
+
+    # -----------------------------
+    # Consulta
+    # -----------------------------
+
+    def match(self, question: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Retorna (entidade, score) quando a pergunta é uma consulta factual
+        claramente coberta por uma única entidade; caso contrário, None.
+        """
+        self.load()
+        if not self.entities:
+            return None
+
+        norm_q = normalize(question)
+        types = [t for t, triggers in TYPE_TRIGGERS.items()
+                 if any(re.search(rf"\b{tr}\b", norm_q) for tr in triggers)]
+        if not types:
+            return None
+
+        # "competência 3" / "competencia III": número identifica a entidade
+        if "competencia_redacao" in types:
+            number = _competencia_number(norm_q)
+            if number:
+                for e in self.entities:
+                    if (e["entity_type"] == "competencia_redacao" and e.get("confidence") != "low"
+                            and _competencia_number(normalize(e["key_value"])) == number):
+                        return e, 1.0
+
+        q_tokens = set(_content_tokens(question))
+        scored = []
+        for e in self.entities:
+            if e["entity_type"] not in types or e.get("confidence") == "low":
+                continue
+            key_tokens = _content_tokens(e["key_value"])
+            if not key_tokens:
+                continue
+            coverage = sum(1 for t in key_tokens if t in q_tokens or _fuzzy_in(t, q_tokens)) / len(key_tokens)
+            ratio = SequenceMatcher(None, " ".join(key_tokens), " ".join(sorted(q_tokens))).ratio()
+            scored.append((0.8 * coverage + 0.2 * ratio, e))
+
+        if not scored:
+            return None
+        scored.sort(key=lambda s: s[0], reverse=True)
+        best_score, best = scored[0]
+        second = scored[1][0] if len(scored) > 1 else 0.0
+        if best_score >= MIN_CONFIDENCE and best_score - second >= MIN_MARGIN:
+            return best, best_score
+        return None
+
+
+_ROMAN = {"i": 1, "ii": 2, "iii": 3, "iv": 4, "v": 5}
+
+
+def _competencia_number(norm_text: str) -> Optional[int]:
+    m = re.search(r"competencia\s+(\d+|i{1,3}|iv|v)\b", norm_text)
+    if not m:
+        return None
+    value = m.group(1)
+    return int(value) if value.isdigit() else _ROMAN.get(value)
+
+
+def _fuzzy_in(token: str, tokens: set) -> bool:
+    """Tolera pequenas diferenças de grafia ("inscricoes" x "inscricao")"""
+    if len(token) < 4:
+        return False
+    return any(len(t) >= 4 and SequenceMatcher(None, token, t).ratio() >= 0.8 for t in tokens)
+
+
+def render_answer(entity: Dict[str, Any]) -> str:
+    """Resposta em texto a partir da linha da tabela (sem LLM)"""
+    attrs = {k: v for k, v in entity.get("attributes", {}).items()
+             if k not in _HIDDEN_ATTRIBUTES and k != entity.get("key_field") and v}
+    details = "; ".join(f"{k}: {v}" for k, v in attrs.items())
+    key = entity["key_value"]
+    entity_type = entity["entity_type"]
+
+    if entity_type == "cronograma_enem":
+        return f"De acordo com o cronograma oficial do ENEM, {key}: {details}."
+    if entity_type == "competencia_redacao":
+        return f"{key} da redação do ENEM — {details}."
+    if entity_type == "estrutura_prova":
+        return f"Na prova do ENEM, {key}: {details}."
+    if entity_type == "nota_minima":
+        return f"Nota mínima para {key}: {details}."
+    return f"{key}: {details}."
+
+
+_index: Optional[EntityIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_entity_index() -> EntityIndex:
+    """Índice do processo, no caminho settings.ENTITY_INDEX_PATH"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from django.conf import settings
+                index = EntityIndex(settings.ENTITY_INDEX_PATH)
+                index.load(force=True)
+                _index = index
+    return _index
+
+
+@receiver(corpus_changed)
+def _remove_deleted_entities(sender, document_ids=(), reason="", **kwargs):
+    if reason != "delete_documents" or sender == "journal":
+        return
+    index = get_entity_index()
+    if index.remove_documents(document_ids):
+        index.save()
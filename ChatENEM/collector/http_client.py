@@ -1,9 +1,13 @@
 import requests
+import threading
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, NamedTuple
 import urllib.robotparser
 from urllib.parse import urlparse
 
+from .crawl_archive import CrawlArchive
+from .validator_store import ValidatorStore, content_hash
+
 INSECURE_SSL_DOMAINS = {
     "inep.gov.br",
     "www.inep.gov.br",
@@ -15,6 +19,19 @@ INSECURE_SSL_DOMAINS = {
     "www.ifpi.edu.br",
 }
 
+class _RawResponse(NamedTuple):
+    """Resposta recebida da rede ou lida do arquivo de coleta"""
+    status_code: int
+    headers: Dict[str, str]
+    url: str
+    body: bytes
+    encoding: Optional[str]
+
+    @property
+    def text(self) -> str:
+        return (self.body or b"").decode(self.encoding or "utf-8", errors="replace")
+
+
 class HTTPClient:
     """
     Cliente HTTP com retry, backoff, robots.txt e configuração avançada
@@ -31,7 +48,9 @@ class HTTPClient:
                 timeout: int = 30,
                 max_retries: int = 3,
                 backoff_factor: float = 2.0,
-                respect_robots: bool = True
+                respect_robots: bool = True,
+                validator_store: Optional[ValidatorStore] = None,
+                archive: Optional[CrawlArchive] = None
                ):
 
         self.user_agent = user_agent
@@ -39,13 +58,26 @@ class HTTPClient:
         self.max_retries = max_retries
         self.backoff_factor = backoff_factor
         self.respect_robots = respect_robots
+        # ETag/Last-Modified da última versão processada (GET condicional)
+        self.validator_store = validator_store
+        # Gravação/replay das respostas (crawl_archive.CrawlArchive)
+        self.archive = archive
 
-        # Cache de robots.txt
+        # Cache de robots.txt (compartilhado pelas threads de coleta)
         self.robots_cache: Dict[str, urllib.robotparser.RobotFileParser] = {}
+        self._robots_lock = threading.Lock()
+
+        # requests.Session não é thread-safe (cookies, pool de conexões):
+        # cada thread de coleta (e a thread principal, que baixa os
+        # documentos) usa a própria sessão, criada no primeiro uso
+        self._local = threading.local()
+        self._sessions: List[requests.Session] = []
+        self._sessions_lock = threading.Lock()
 
-        # Sessão requests com configurações otimizadas
-        self.session = requests.Session()
-        self.session.headers.update({
+    def _new_session(self) -> requests.Session:
+        """Sessão requests com configurações otimizadas"""
+        session = requests.Session()
+        session.headers.update({
             'User-Agent': self.user_agent,
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
             'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8',
@@ -54,6 +86,17 @@ class HTTPClient:
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
         })
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        """Sessão da thread atual"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._new_session()
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
 
     def can_fetch(self, url: str) -> bool:
         """Verifica se pode fazer fetch da URL (robots.txt)"""
@@ -61,10 +104,18 @@ class HTTPClient:
             return True
 
         try:
-            parsed = urlparse(url)
-            robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+            return self._robots(url).can_fetch(self.user_agent, url)
+
+        except Exception as e:
+            print(f"Erro verificando robots.txt para {url}: {e}")
+            return True  # Permissivo em caso de erro
+
+    def _robots(self, url: str) -> urllib.robotparser.RobotFileParser:
+        parsed = urlparse(url)
+        robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
 
-            # Cache robots.txt
+        # Cache robots.txt
+        with self._robots_lock:
             if robots_url not in self.robots_cache:
                 rp = urllib.robotparser.RobotFileParser()
                 rp.set_url(robots_url)
@@ -74,37 +125,32 @@ class HTTPClient:
                     # Se não conseguir ler, assume permissivo
                     pass
                 self.robots_cache[robots_url] = rp
+            return self.robots_cache[robots_url]
 
-            rp = self.robots_cache[robots_url]
-            return rp.can_fetch(self.user_agent, url)
+    def crawl_delay(self, url: str) -> Optional[float]:
+        """Intervalo (s) pedido pelo robots.txt do host: Crawl-delay ou Request-rate"""
+        if not self.respect_robots or (self.archive is not None and self.archive.replaying):
+            return None
+        rp = self._robots(url)
+        delay = rp.crawl_delay(self.user_agent)
+        rate = rp.request_rate(self.user_agent)
+        candidates = [float(delay)] if delay else []
+        if rate and rate.requests:
+            candidates.append(rate.seconds / rate.requests)
+        return max(candidates) if candidates else None
 
-        except Exception as e:
-            print(f"Erro verificando robots.txt para {url}: {e}")
-            return True  # Permissivo em caso de erro
-
-    def fetch(self, url: str) -> Optional[Dict[str, Any]]:
+    def _get(self, url: str, headers: Optional[Dict[str, str]] = None) -> Optional[_RawResponse]:
         """
-        Faz requisição HTTP segura e controlada.
-
-        Retorna:
-            {
-                status_code,
-                content,
-                headers,
-                url,
-                error
-            }
+        GET com retry e backoff (ou leitura do arquivo, no modo replay).
+        Retorna None no replay se a URL não foi gravada; levanta a última
+        exceção se todas as tentativas falharem.
         """
-
-        # Verificar robots.txt
-        if not self.can_fetch(url):
-            return {
-                'status_code': 403,
-                'content': '',
-                'headers': {},
-                'url': url,
-                'error': 'Blocked by robots.txt'
-            }
+        if self.archive is not None and self.archive.replaying:
+            record = self.archive.lookup(url)
+            if record is None:
+                return None
+            return _RawResponse(record["status_code"], record["headers"], record["final_url"],
+                                record["body"], record["encoding"])
 
         last_exception = None
 
@@ -116,6 +162,7 @@ class HTTPClient:
 
                 response = self.session.get(
                     url,
+                    headers=headers or {},
                     timeout=self.timeout,
                     allow_redirects=True,
                     verify=not insecure_ssl
@@ -124,26 +171,17 @@ class HTTPClient:
                 if insecure_ssl:
                     print(f"[SSL INSEGURO - WHITELIST] {url}")
 
-
-                # Sucesso
-                if response.status_code == 200:
-                    return {
-                        'status_code': response.status_code,
-                        'content': response.text,
-                        'headers': dict(response.headers),
-                        'url': response.url,
-                        'error': None
-                    }
-
-                # Erro HTTP
-                else:
-                    return {
-                        'status_code': response.status_code,
-                        'content': response.text if response.text else '',
-                        'headers': dict(response.headers),
-                        'url': response.url,
-                        'error': f'HTTP {response.status_code}'
-                    }
+                raw = _RawResponse(
+                    response.status_code,
+                    dict(response.headers),
+                    response.url,
+                    response.content,
+                    response.encoding or response.apparent_encoding,
+                )
+                # 304 não tem corpo: no replay vale a última resposta completa
+                if self.archive is not None and raw.status_code != 304:
+                    self.archive.record(url, raw.url, raw.status_code, raw.headers, raw.body, raw.encoding)
+                return raw
 
             except requests.exceptions.RequestException as e:
                 last_exception = e
@@ -154,15 +192,149 @@ class HTTPClient:
                 else:
                     print(f"Falhou após {self.max_retries + 1} tentativas: {e}")
 
-        # Todas as tentativas falharam
+        raise last_exception
+
+    def fetch(self, url: str, conditional: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Faz requisição HTTP segura e controlada.
+
+        Com validator_store, envia If-None-Match/If-Modified-Since da última
+        versão processada. not_modified=True indica que a página não mudou:
+        304 do servidor ou 200 com o mesmo hash de conteúdo (servidores sem
+        ETag/Last-Modified).
+
+        Retorna:
+            {
+                status_code,
+                content,
+                headers,
+                url,
+                error,
+                not_modified,
+                validators
+            }
+        """
+
+        # Verificar robots.txt (no replay não há rede)
+        replaying = self.archive is not None and self.archive.replaying
+        if not replaying and not self.can_fetch(url):
+            return {
+                'status_code': 403,
+                'content': '',
+                'headers': {},
+                'url': url,
+                'error': 'Blocked by robots.txt'
+            }
+
+        stored = self.validator_store.get(url) if (conditional and self.validator_store) else None
+        request_headers = {}
+        if stored:
+            if stored["etag"]:
+                request_headers['If-None-Match'] = stored["etag"]
+            if stored["last_modified"]:
+                request_headers['If-Modified-Since'] = stored["last_modified"]
+
+        try:
+            response = self._get(url, request_headers)
+        except requests.exceptions.RequestException as e:
+            # Todas as tentativas falharam
+            return {
+                'status_code': 0,
+                'content': '',
+                'headers': {},
+                'url': url,
+                'error': str(e)
+            }
+
+        if response is None:
+            return {
+                'status_code': 0,
+                'content': '',
+                'headers': {},
+                'url': url,
+                'error': 'URL ausente no arquivo de coleta'
+            }
+
+        # Não modificada desde a última versão processada
+        if response.status_code == 304 and stored:
+            return {
+                'status_code': 304,
+                'content': '',
+                'headers': response.headers,
+                'url': response.url,
+                'error': None,
+                'not_modified': True,
+                'validators': stored
+            }
+
+        # Sucesso
+        if response.status_code == 200:
+            validators = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_hash': content_hash(response.body),
+            }
+            unchanged = bool(stored) and stored["content_hash"] == validators['content_hash']
+            if unchanged:
+                validators['links'] = stored["links"]
+            return {
+                'status_code': response.status_code,
+                'content': response.text,
+                'headers': response.headers,
+                'url': response.url,
+                'error': None,
+                'not_modified': unchanged,
+                'validators': validators
+            }
+
+        # Erro HTTP
+        return {
+            'status_code': response.status_code,
+            'content': response.text,
+            'headers': response.headers,
+            'url': response.url,
+            'error': f'HTTP {response.status_code}'
+        }
+
+    def fetch_bytes(self, url: str) -> Dict[str, Any]:
+        """
+        Download binário (PDF, DOCX, ZIP) pela mesma sessão, retry e arquivo
+        de coleta das páginas. content são os bytes do corpo.
+        """
+        try:
+            response = self._get(url)
+        except requests.exceptions.RequestException as e:
+            return {'status_code': 0, 'content': b'', 'headers': {}, 'url': url, 'error': str(e)}
+        if response is None:
+            return {'status_code': 0, 'content': b'', 'headers': {}, 'url': url,
+                    'error': 'URL ausente no arquivo de coleta'}
         return {
-            'status_code': 0,
-            'content': '',
-            'headers': {},
-            'url': url,
-            'error': str(last_exception)
+            'status_code': response.status_code,
+            'content': response.body,
+            'headers': response.headers,
+            'url': response.url,
+            'error': None if response.status_code == 200 else f'HTTP {response.status_code}'
         }
 
+    def commit_validators(self, url: str, response: Dict[str, Any], links: Optional[List[str]] = None):
+        """Grava os validadores de uma resposta 200 depois que ela foi processada com sucesso"""
+        validators = response.get('validators')
+        if self.validator_store is None or not validators or response.get('status_code') != 200:
+            return
+        self.validator_store.commit(
+            url,
+            validators.get('etag'),
+            validators.get('last_modified'),
+            validators.get('content_hash'),
+            links,
+        )
+
     def close(self):
-        """Fecha sessão"""
-        self.session.close()
+        """Fecha as sessões de todas as threads"""
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        self._local = threading.local()
+        if self.validator_store is not None:
+            self.validator_store.close()
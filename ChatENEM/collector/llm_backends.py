@@ -0,0 +1,89 @@
+import os
+import threading
+from typing import Dict, Optional
+
+from openai import OpenAI
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+
+class LLMBackendBusy(RuntimeError):
+    """Nenhuma vaga de concorrência liberada dentro do tempo de espera"""
+
+
+class LLMBackend:
+    """
+    Servidor compatível com a API da OpenAI (OpenRouter, llama.cpp, vLLM,
+    Ollama...). max_concurrency limita as chamadas simultâneas deste backend
+    no processo; quem chega acima do limite espera até queue_timeout por uma
+    vaga em vez de falhar na hora.
+    """
+
+    def __init__(self, name: str, base_url: str, api_key: str,
+                 max_concurrency: Optional[int] = None, queue_timeout: float = 60.0):
+        self.name = name
+        self.client = OpenAI(base_url=base_url, api_key=api_key)
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    def create(self, **kwargs):
+        """client.chat.completions.create dentro do limite de concorrência"""
+        if self._slots is None:
+            return self.client.chat.completions.create(**kwargs)
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise LLMBackendBusy(f"Backend {self.name} ocupado ({self.max_concurrency} chamadas em andamento)")
+        try:
+            result = self.client.chat.completions.create(**kwargs)
+            if kwargs.get("stream"):
+                # Em stream a vaga só é liberada quando a resposta termina
+                return _release_after(result, self._slots)
+            self._slots.release()
+            return result
+        except Exception:
+            self._slots.release()
+            raise
+
+
+def _release_after(stream, slots: threading.BoundedSemaphore):
+    try:
+        for event in stream:
+            yield event
+    finally:
+        slots.release()
+
+
+_backends: Dict[str, LLMBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def register_backend(backend: LLMBackend):
+    with _backends_lock:
+        _backends[backend.name] = backend
+
+
+def _load_defaults():
+    """
+    openrouter quando OPENROUTER_API_KEY está definida; local quando
+    settings.LOCAL_LLM_URL está definido. Um backend sem configuração fica
+    de fora (get_backend devolve None) e os tiers que dependem dele são pulados.
+    """
+    from django.conf import settings
+    api_key = os.environ.get("OPENROUTER_API_KEY", "")
+    if api_key and "openrouter" not in _backends:
+        _backends["openrouter"] = LLMBackend("openrouter", OPENROUTER_BASE_URL, api_key)
+    local_url = getattr(settings, "LOCAL_LLM_URL", "")
+    if local_url and "local" not in _backends:
+        _backends["local"] = LLMBackend(
+            "local", local_url, settings.LOCAL_LLM_API_KEY,
+            max_concurrency=settings.LOCAL_LLM_MAX_CONCURRENCY,
+            queue_timeout=settings.LOCAL_LLM_QUEUE_TIMEOUT,
+        )
+
+
+def get_backend(name: str) -> Optional[LLMBackend]:
+    """Backend registrado com esse nome (None se não configurado)"""
+    if name not in _backends:
+        with _backends_lock:
+            _load_defaults()
+    return _backends.get(name)
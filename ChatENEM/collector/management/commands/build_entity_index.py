@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from collector.entity_index import EntityIndex
+from collector.supabase_client import SupabaseClient
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói o índice de entidades de tabela (cronograma, competências, "
+        "estrutura da prova, notas mínimas) a partir de document_chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=None, help="Arquivo do índice (padrão: settings.ENTITY_INDEX_PATH)")
+        parser.add_argument("--page-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"] or settings.ENTITY_INDEX_PATH
+        supabase = SupabaseClient()
+        index = EntityIndex(path)
+        page_size = options["page_size"]
+        last_id = 0
+
+        while True:
+            response = supabase.session.get(
+                f"{supabase.url}/rest/v1/document_chunks"
+                f"?select=id,document_id,chunk_text,metadata"
+                f"&metadata->>type=eq.table_entity&id=gt.{last_id}&order=id.asc&limit={page_size}",
+                headers=supabase.headers,
+                timeout=60
+            )
+            if response.status_code != 200:
+                raise CommandError(f"Erro lendo chunks: {response.status_code} - {response.text}")
+            rows = response.json()
+            if not rows:
+                break
+            index.add_rows(rows)
+            last_id = rows[-1]["id"]
+
+        index.save()
+        self.stdout.write(self.style.SUCCESS(f"Índice de entidades gravado em {path} ({len(index.entities)} entidades)"))
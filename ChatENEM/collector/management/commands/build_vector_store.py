@@ -0,0 +1,54 @@
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from collector.chunk_selector import parse_embedding
+from collector.supabase_client import SupabaseClient
+from collector.vector_store import VectorStoreWriter
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera um snapshot do índice local (vetores + textos em memória mapeada) "
+        "a partir de document_chunks no Supabase e o publica atomicamente."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=None, help="Diretório do índice (padrão: settings.LOCAL_INDEX_DIR)")
+        parser.add_argument("--page-size", type=int, default=500)
+        parser.add_argument("--dim", type=int, default=1024)
+
+    def handle(self, *args, **options):
+        root = options["dir"] or settings.LOCAL_INDEX_DIR
+        if not root:
+            raise CommandError("Informe --dir ou defina LOCAL_INDEX_DIR")
+
+        supabase = SupabaseClient()
+        writer = VectorStoreWriter(root, dim=options["dim"])
+        page_size = options["page_size"]
+        last_id = 0
+
+        # Paginação por chave (id > último) para não depender de OFFSET
+        while True:
+            response = supabase.session.get(
+                f"{supabase.url}/rest/v1/document_chunks"
+                f"?select=id,document_id,chunk_text,metadata,embedding,documents(title,source,url)"
+                f"&embedding=not.is.null&id=gt.{last_id}&order=id.asc&limit={page_size}",
+                headers=supabase.headers,
+                timeout=60
+            )
+            if response.status_code != 200:
+                raise CommandError(f"Erro lendo chunks: {response.status_code} - {response.text}")
+
+            rows = response.json()
+            if not rows:
+                break
+
+            for row in rows:
+                row["embedding"] = parse_embedding(row.get("embedding"))
+            writer.add(r for r in rows if r["embedding"])
+            last_id = rows[-1]["id"]
+            self.stdout.write(f"{writer.count} chunks gravados (último id {last_id})")
+
+        path = writer.commit()
+        self.stdout.write(self.style.SUCCESS(f"Snapshot publicado: {path} ({writer.count} chunks)"))
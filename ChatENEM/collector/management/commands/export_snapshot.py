@@ -0,0 +1,88 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from collector.snapshot import (
+    CHUNK_COLUMNS,
+    DOCUMENT_COLUMNS,
+    TABLES,
+    SnapshotManifest,
+    write_shard,
+)
+from collector.supabase_client import SupabaseClient
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta documents e document_chunks (com embeddings e metadados) para um "
+        "snapshot portátil: shards JSONL gzip + NPZ, manifesto e checksums. "
+        "Retoma automaticamente uma exportação interrompida no mesmo diretório."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Diretório de destino do snapshot")
+        parser.add_argument("--page-size", type=int, default=1000, help="Linhas por shard")
+        parser.add_argument("--restart", action="store_true", help="Ignora o manifesto existente e recomeça")
+
+    def handle(self, *args, **options):
+        directory = options["directory"]
+        page_size = options["page_size"]
+
+        manifest = None if options["restart"] else SnapshotManifest.load(directory)
+        if manifest is None:
+            manifest = SnapshotManifest(directory)
+            manifest.save()
+        elif manifest.complete:
+            self.stdout.write(self.style.SUCCESS("Snapshot já completo; use --restart para refazer."))
+            return
+        else:
+            problems = manifest.verify()
+            if problems:
+                raise CommandError("Shards existentes inválidos: " + "; ".join(problems))
+            self.stdout.write("Retomando exportação a partir do manifesto existente")
+
+        supabase = SupabaseClient()
+        for table in TABLES:
+            if manifest.table(table)["complete"]:
+                continue
+            self._export_table(supabase, manifest, table, page_size)
+            manifest.mark_complete(table)
+
+        totals = {t: manifest.table(t)["rows"] for t in TABLES}
+        self.stdout.write(self.style.SUCCESS(f"Snapshot completo em {directory}: {totals}"))
+
+    def _export_table(self, supabase, manifest, table, page_size):
+        columns = list(DOCUMENT_COLUMNS if table == "documents" else CHUNK_COLUMNS)
+        if table == "document_chunks":
+            columns.append("embedding")
+        select = ",".join(columns)
+
+        last_id = manifest.last_id(table)
+        index = len(manifest.table(table)["shards"]) + 1
+        started = time.time()
+        exported = 0
+
+        # Paginação por chave: cada página vira um shard e só ela fica em memória
+        while True:
+            response = supabase.session.get(
+                f"{supabase.url}/rest/v1/{table}?select={select}"
+                f"&id=gt.{last_id}&order=id.asc&limit={page_size}",
+                headers=supabase.headers,
+                timeout=120
+            )
+            if response.status_code != 200:
+                raise CommandError(f"Erro lendo {table}: {response.status_code} - {response.text}")
+            rows = response.json()
+            if not rows:
+                break
+
+            shard = write_shard(manifest.directory, table, index, rows)
+            if shard.get("dim"):
+                manifest.data["embedding_dim"] = shard["dim"]
+            manifest.add_shard(table, shard)
+
+            last_id = shard["last_id"]
+            index += 1
+            exported += len(rows)
+            rate = exported / max(time.time() - started, 1e-6)
+            self.stdout.write(f"{table}: {manifest.table(table)['rows']} linhas (id ≤ {last_id}, {rate:.0f} linhas/s)")
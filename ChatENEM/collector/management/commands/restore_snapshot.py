@@ -0,0 +1,191 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from collector.database_layer import DatabaseLayer
+from collector.signals import publish_change
+from collector.snapshot import SnapshotManifest, iter_shards
+from collector.vector_codecs import format_vector
+
+
+class Command(BaseCommand):
+    help = (
+        "Restaura um snapshot (export_snapshot) no Supabase com upserts em lote "
+        "e vários workers paralelos. Chunks já existentes (chunk_hash) são mantidos. "
+        "O banco de destino precisa estar vazio, a menos que se use --merge."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Diretório do snapshot")
+        parser.add_argument("--batch-size", type=int, default=500, help="Linhas por POST")
+        parser.add_argument("--workers", type=int, default=4, help="Requisições paralelas")
+        parser.add_argument("--keep-chunk-ids", action="store_true",
+                            help="Preserva os ids dos chunks (banco de destino vazio)")
+        parser.add_argument("--skip-verify", action="store_true", help="Não confere checksums antes")
+        parser.add_argument("--allow-partial", action="store_true", help="Aceita snapshot incompleto")
+        parser.add_argument("--merge", action="store_true",
+                            help="Restaura em um banco com documentos: nenhum documento existente é "
+                                 "sobrescrito e documentos cujo id já pertence a outra URL são pulados")
+
+    def handle(self, *args, **options):
+        manifest = SnapshotManifest.load(options["directory"])
+        if manifest is None:
+            raise CommandError("Manifesto não encontrado")
+        if not manifest.complete and not options["allow_partial"]:
+            raise CommandError("Snapshot incompleto; rode export_snapshot novamente ou use --allow-partial")
+        if not options["skip_verify"]:
+            problems = manifest.verify()
+            if problems:
+                raise CommandError("Snapshot corrompido: " + "; ".join(problems))
+
+        self.database = DatabaseLayer(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+        self.workers = options["workers"]
+        self.batch_size = options["batch_size"]
+        self.restored_document_ids = []
+        self.merge = options["merge"]
+        self.skipped_document_ids = set()
+
+        # Pool de conexões do tamanho do paralelismo, compartilhado entre threads
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Os ids dos documentos vêm do snapshot: num banco com dados eles
+        # podem pertencer a documentos não relacionados
+        if not self.merge and self._existing_documents():
+            raise CommandError(
+                "O banco de destino já tem documentos; os ids do snapshot podem colidir com eles. "
+                "Restaure em um banco vazio ou use --merge"
+            )
+
+        started = time.time()
+        doc_stats = self._restore_table(
+            manifest, "documents", self._document_row,
+            on_conflict="id", ignore_duplicates=True,
+        )
+        keep_ids = options["keep_chunk_ids"]
+        chunk_stats = self._restore_table(
+            manifest, "document_chunks", lambda r: self._chunk_row(r, keep_ids),
+            on_conflict="chunk_hash", ignore_duplicates=True,
+        )
+        if self.skipped_document_ids:
+            self.stdout.write(self.style.WARNING(
+                f"{len(self.skipped_document_ids)} documentos (e seus chunks) pulados: o id já pertence "
+                f"a outra URL no destino ({', '.join(map(str, sorted(self.skipped_document_ids)[:20]))})"
+            ))
+        elapsed = time.time() - started
+
+        # Ids gravados explicitamente não avançam as sequências do Postgres
+        self._sync_id_sequences()
+
+        # Caches dos workers web dependem dos documentos restaurados
+        publish_change(document_ids=self.restored_document_ids, reason="restore_snapshot")
+
+        total = doc_stats["written"] + chunk_stats["written"]
+        self.stdout.write(self.style.SUCCESS(
+            f"Restauração concluída em {elapsed:.1f}s: {doc_stats['written']} documentos, "
+            f"{chunk_stats['written']} chunks ({total / max(elapsed, 1e-6):.0f} linhas/s), "
+            f"erros: {doc_stats['errors'] + chunk_stats['errors']}"
+        ))
+
+    def _sync_id_sequences(self):
+        """Avança as sequências de id (RPC sync_id_sequences, migração 0003)"""
+        response = self.session.post(
+            f"{self.database.url}/rest/v1/rpc/sync_id_sequences",
+            headers=self.database.headers, json={}, timeout=60,
+        )
+        if response.status_code != 200:
+            raise CommandError(
+                f"Linhas restauradas, mas as sequências de id não foram ajustadas "
+                f"({response.status_code} - {response.text}); aplique a migração 0003 e rode "
+                f"SELECT * FROM sync_id_sequences(); antes de inserir documentos"
+            )
+        for row in response.json():
+            self.stdout.write(f"Sequência de {row['table_name']}: próximo id {row['next_id']}")
+
+    def _existing_documents(self, ids=None):
+        """id → url_norm dos documentos do destino (só os ids pedidos, ou o primeiro)"""
+        url = f"{self.database.url}/rest/v1/documents?select=id,url_norm"
+        url += f"&id=in.({','.join(map(str, ids))})" if ids is not None else "&limit=1"
+        response = self.session.get(url, headers=self.database.headers, timeout=60)
+        if response.status_code != 200:
+            raise CommandError(f"Erro consultando documentos do destino: {response.status_code} - {response.text}")
+        return {row["id"]: row.get("url_norm") for row in response.json()}
+
+    def _skip_conflicting_documents(self, rows):
+        """Em --merge, descarta documentos cujo id já é de outra URL no destino"""
+        ids = [r["id"] for r in rows]
+        existing = {}
+        for start in range(0, len(ids), 200):  # URL do filtro id=in.(...) com tamanho limitado
+            existing.update(self._existing_documents(ids[start:start + 200]))
+        kept = []
+        for row in rows:
+            if row["id"] in existing and existing[row["id"]] != row.get("url_norm"):
+                self.skipped_document_ids.add(row["id"])
+            else:
+                kept.append(row)
+        return kept
+
+    def _document_row(self, row):
+        self.restored_document_ids.append(row["id"])
+        row["created_at"] = row.get("created_at") or "now()"
+        return row
+
+    def _chunk_row(self, row, keep_ids):
+        if row.get("document_id") in self.skipped_document_ids:
+            return None
+        embedding = row.pop("embedding", None)
+        row["embedding"] = format_vector(embedding) if embedding else None
+        if not keep_ids:
+            row.pop("id", None)
+        # Todas as linhas de um lote precisam das mesmas colunas no PostgREST
+        row["created_at"] = row.get("created_at") or "now()"
+        return row
+
+    def _restore_table(self, manifest, table, transform, on_conflict, ignore_duplicates):
+        stats = {"written": 0, "errors": 0}
+        lock = threading.Lock()
+        started = time.time()
+        pending = set()
+
+        def submit_batch(executor, batch):
+            return executor.submit(
+                self.database.bulk_upsert, table, batch,
+                on_conflict=on_conflict, ignore_duplicates=ignore_duplicates, session=self.session,
+            )
+
+        def collect(done):
+            for future in done:
+                result = future.result()
+                with lock:
+                    stats["written"] += result["written"]
+                    stats["errors"] += result["errors"]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for shard, rows in iter_shards(manifest, table):
+                if table == "documents" and self.merge and rows:
+                    rows = self._skip_conflicting_documents(rows)
+                rows = [r for r in map(transform, rows) if r is not None]
+                for start in range(0, len(rows), self.batch_size):
+                    # Limita lotes em voo para não carregar o snapshot inteiro em memória
+                    while len(pending) >= self.workers * 2:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        pending.difference_update(done)
+                        collect(done)
+                    pending.add(submit_batch(executor, rows[start:start + self.batch_size]))
+
+                elapsed = max(time.time() - started, 1e-6)
+                self.stdout.write(
+                    f"{table}: shard {shard['file']} enviado "
+                    f"({stats['written']} gravadas, {stats['written'] / elapsed:.0f} linhas/s)"
+                )
+
+            done, _ = wait(pending)
+            collect(done)
+
+        return stats
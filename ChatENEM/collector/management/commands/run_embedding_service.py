@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from collector.embedding import HF_MODEL
+from collector.embedding_service import (
+    DEFAULT_MAX_BATCH,
+    DEFAULT_WINDOW_MS,
+    MicroBatcher,
+    local_backend,
+    make_server,
+    remote_backend,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Sobe o serviço local de embeddings compartilhado pelos workers "
+        "(defina EMBEDDING_SERVICE_URL=http://HOST:PORTA nos workers). "
+        "Pedidos concorrentes são agrupados em micro-lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--backend", choices=("local", "hf"), default="hf",
+                            help="local = modelo carregado neste processo; hf = API do Hugging Face")
+        parser.add_argument("--model", default=HF_MODEL, help="Modelo do backend local")
+        parser.add_argument("--device", default=None, help="Dispositivo do backend local (cpu, cuda)")
+        parser.add_argument("--window-ms", type=float, default=DEFAULT_WINDOW_MS,
+                            help="Janela de espera para formar um micro-lote")
+        parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+                            help="Máximo de textos por micro-lote")
+
+    def handle(self, *args, **options):
+        try:
+            if options["backend"] == "local":
+                self.stdout.write(f"Carregando modelo {options['model']}...")
+                backend = local_backend(options["model"], options["device"])
+            else:
+                backend = remote_backend()
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        batcher = MicroBatcher(backend, window_ms=options["window_ms"], max_batch=options["max_batch"])
+        server = make_server(batcher, options["host"], options["port"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Serviço de embeddings em http://{options['host']}:{options['port']} "
+            f"(backend {options['backend']}, janela {options['window_ms']}ms, lote ≤ {options['max_batch']})"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Estatísticas: {batcher.stats()}")
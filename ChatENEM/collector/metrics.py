@@ -0,0 +1,328 @@
+import atexit
+import copy
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos nem limpeza de arquivos
+    fcntl = None
+
+FLUSH_INTERVAL = 5.0
+RETIRED_FILE = "metrics-retired.json"
+
+# Buckets (segundos) para latências de requisição e de etapas
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict[str, str]) -> str:
+    return json.dumps([str(labels.get(n, "")) for n in labelnames])
+
+
+class Counter:
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[str, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+        self.registry.touch()
+
+
+class Histogram:
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str,
+                 labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values: Dict[str, Dict] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.registry.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["buckets"][i] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+        self.registry.touch()
+
+
+class MetricsRegistry:
+    """
+    Contadores e histogramas do processo, no formato de texto do Prometheus.
+
+    Atualizar uma métrica é só um incremento sob lock. Com um diretório
+    compartilhado, cada processo (workers do gunicorn, crawler) grava seu
+    estado em metrics-<pid>-<token>.json a cada FLUSH_INTERVAL segundos, e o
+    endpoint /collector/metrics soma os arquivos de todos eles.
+
+    O token distingue processos que reaproveitam o mesmo pid. Na coleta, o
+    arquivo de um processo que já terminou é somado ao total acumulado
+    (metrics-retired.json) e removido, para que os contadores nunca voltem
+    atrás nem o diretório cresça com workers mortos.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.metrics: Dict[str, object] = {}
+        self._flusher: Optional[threading.Thread] = None
+        self._token = uuid.uuid4().hex[:12]
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A thread de gravação não sobrevive ao fork; o filho grava no próprio arquivo
+        self._flusher = None
+        self._token = uuid.uuid4().hex[:12]
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        metric = Counter(self, name, documentation, labelnames)
+        self.metrics[name] = metric
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(self, name, documentation, labelnames, buckets)
+        self.metrics[name] = metric
+        return metric
+
+    # -----------------------------
+    # Persistência entre processos
+    # -----------------------------
+
+    def touch(self):
+        """Inicia a thread de gravação na primeira atualização do processo"""
+        if self._flusher is not None or not self._directory():
+            return
+        with self.lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+            self._flusher.start()
+        atexit.register(self.flush)
+
+    def _directory(self) -> str:
+        if self.directory is None:
+            try:
+                from django.conf import settings
+                self.directory = getattr(settings, "METRICS_DIR", "")
+            except Exception:
+                self.directory = ""
+        return self.directory
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self.lock:
+            return {name: {"values": copy.deepcopy(metric.values)} for name, metric in self.metrics.items()}
+
+    def flush(self):
+        directory = self._directory()
+        if not directory:
+            return
+        try:
+            os.makedirs(directory, exist_ok=True)
+            _write_json(os.path.join(directory, self._filename()), self.snapshot())
+        except OSError as e:
+            print(f"Erro gravando métricas: {e}")
+
+    def _filename(self) -> str:
+        return f"metrics-{os.getpid()}-{self._token}.json"
+
+    def _retire_dead(self, directory: str) -> Dict:
+        """
+        Soma ao total acumulado os arquivos de processos que terminaram e os
+        remove. O acumulado guarda os nomes já somados, então uma queda entre
+        gravar o total e apagar o arquivo não conta o processo duas vezes.
+        Retorna o acumulado.
+        """
+        retired_path = os.path.join(directory, RETIRED_FILE)
+        if fcntl is None:
+            return _read_json(retired_path) or {"files": [], "metrics": {}}
+        with open(os.path.join(directory, "metrics.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            retired = _read_json(retired_path) or {"files": [], "metrics": {}}
+            present = {os.path.basename(p): p for p in _process_files(directory)}
+            merged_files = {name for name in retired["files"] if name in present}
+            changed = len(merged_files) != len(retired["files"])
+            for name, path in present.items():
+                pid = _pid_from_filename(name)
+                if name in merged_files or pid is None or _pid_alive(pid):
+                    continue
+                data = _read_json(path)
+                if data is not None:
+                    _merge(retired["metrics"], data)
+                merged_files.add(name)
+                changed = True
+            if changed:
+                retired["files"] = sorted(merged_files)
+                _write_json(retired_path, retired)
+            for name in merged_files:
+                try:
+                    os.remove(present[name])
+                except FileNotFoundError:
+                    pass
+        return retired
+
+    def collect(self) -> Dict[str, Dict]:
+        """Estado somado de todos os processos (ou só deste, sem diretório)"""
+        directory = self._directory()
+        if not directory:
+            return self.snapshot()
+
+        self.flush()
+        retired = self._retire_dead(directory)
+        merged: Dict[str, Dict] = copy.deepcopy(retired["metrics"])
+        for path in _process_files(directory):
+            if os.path.basename(path) in retired["files"]:
+                continue
+            data = _read_json(path)
+            if data is not None:
+                _merge(merged, data)
+        return merged
+
+    # -----------------------------
+    # Exposição
+    # -----------------------------
+
+    def render(self) -> str:
+        """Formato de texto do Prometheus (versão 0.0.4)"""
+        collected = self.collect()
+        lines: List[str] = []
+        for name, metric in self.metrics.items():
+            kind = "histogram" if isinstance(metric, Histogram) else "counter"
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(collected.get(name, {}).get("values", {}).items()):
+                labels = list(zip(metric.labelnames, json.loads(key)))
+                if kind == "counter":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                # Contagens por bucket já são cumulativas (value <= bound)
+                for bound, count in zip(metric.buckets, value["buckets"]):
+                    lines.append(f"{name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + [('le', '+Inf')])} {value['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(merged: Dict[str, Dict], data: Dict[str, Dict]):
+    for name, metric in data.items():
+        target = merged.setdefault(name, {"values": {}})["values"]
+        for key, value in metric["values"].items():
+            if isinstance(value, dict):
+                entry = target.setdefault(key, {"buckets": [0] * len(value["buckets"]), "sum": 0.0, "count": 0})
+                entry["buckets"] = [a + b for a, b in zip(entry["buckets"], value["buckets"])]
+                entry["sum"] += value["sum"]
+                entry["count"] += value["count"]
+            else:
+                target[key] = target.get(key, 0.0) + value
+
+
+def _process_files(directory: str) -> List[str]:
+    return [p for p in glob.glob(os.path.join(directory, "metrics-*.json"))
+            if os.path.basename(p) != RETIRED_FILE]
+
+
+def _pid_from_filename(name: str) -> Optional[int]:
+    try:
+        return int(name[len("metrics-"):].split("-")[0].split(".")[0])
+    except ValueError:
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # existe, mas é de outro usuário
+    return True
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: Dict):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _format_labels(labels: List[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    escaped = [(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+registry = MetricsRegistry()
+
+# =============================
+# MÉTRICAS
+# =============================
+
+ASK_REQUESTS = registry.counter(
+    "chatenem_ask_requests_total", "Requisições ao /collector/ask por resultado", ["status"])
+ASK_LATENCY = registry.histogram(
+    "chatenem_ask_latency_seconds", "Latência total do /collector/ask")
+STAGE_LATENCY = registry.histogram(
+    "chatenem_stage_latency_seconds", "Latência por etapa de answer_question", ["stage"])
+ROUTES = registry.counter(
+    "chatenem_routes_total", "Perguntas por rota do roteador local", ["route"])
+ANSWER_CACHE = registry.counter(
+    "chatenem_answer_cache_total", "Consultas ao cache de respostas", ["result"])
+LLM_REQUESTS = registry.counter(
+    "chatenem_llm_requests_total", "Chamadas ao LLM por modelo e resultado", ["model", "outcome"])
+LLM_FALLBACKS = registry.counter(
+    "chatenem_llm_fallbacks_total", "Respostas obtidas só depois de falha do(s) modelo(s) anterior(es)")
+EMBEDDING_REQUESTS = registry.counter(
+    "chatenem_embedding_requests_total", "Chamadas de embedding por backend e resultado", ["backend", "outcome"])
+EMBEDDED_TEXTS = registry.counter(
+    "chatenem_embedded_texts_total", "Textos convertidos em embedding", ["backend"])
+EMBEDDING_LATENCY = registry.histogram(
+    "chatenem_embedding_latency_seconds", "Latência das chamadas de embedding", ["backend"])
+SUPABASE_REQUESTS = registry.counter(
+    "chatenem_supabase_requests_total", "Operações no Supabase por resultado", ["operation", "outcome"])
+CRAWL_PAGES = registry.counter(
+    "chatenem_crawl_pages_total", "Páginas processadas pelo pipeline de coleta", ["outcome"])
+CRAWL_PAGE_LATENCY = registry.histogram(
+    "chatenem_crawl_page_seconds", "Tempo de processamento de uma página coletada")
+CRAWL_FETCH_LATENCY = registry.histogram(
+    "chatenem_crawl_fetch_seconds", "Tempo de download de uma página (sem a espera por cortesia)")
+CRAWL_CHUNKS = registry.counter(
+    "chatenem_crawl_chunks_total", "Chunks da coleta por resultado da inserção", ["result"])
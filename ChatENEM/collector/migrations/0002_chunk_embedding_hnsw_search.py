@@ -0,0 +1,131 @@
+"""
+Coluna pgvector, índice HNSW e função search_chunks versionados.
+
+Em PostgreSQL (Supabase ou um Postgres local com pgvector) a migração cria
+a extensão, as colunas embedding/metadata, os índices e a função chamada
+via /rest/v1/rpc/search_chunks, com os metadados do documento na coluna
+documents. Em SQLite (desenvolvimento) só a coluna metadata é criada; o
+restante não se aplica.
+
+Parâmetros de construção do HNSW: alterar exige uma nova migração que
+recrie o índice (DROP + CREATE), para que o valor em uso fique registrado.
+
+Em PostgreSQL a migração é irreversível: a search_chunks anterior não
+está versionada neste repositório.
+"""
+
+from django.db import migrations, models
+from django.db.migrations.exceptions import IrreversibleError
+
+EMBEDDING_DIM = 1024
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 64
+DEFAULT_EF_SEARCH = 40
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS vector",
+    f"ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding vector({EMBEDDING_DIM})",
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS metadata jsonb NOT NULL DEFAULT '{}'::jsonb",
+    f"""
+    CREATE INDEX IF NOT EXISTS document_chunks_embedding_hnsw
+        ON document_chunks USING hnsw (embedding vector_cosine_ops)
+        WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS document_chunks_metadata_gin
+        ON document_chunks USING gin (metadata jsonb_path_ops)
+    """,
+    # Assinatura antiga (query_embedding, match_count) sem parâmetros extras
+    f"DROP FUNCTION IF EXISTS search_chunks(vector({EMBEDDING_DIM}), integer)",
+    f"DROP FUNCTION IF EXISTS search_chunks(vector({EMBEDDING_DIM}), integer, integer, jsonb, boolean)",
+    # A coluna documents (title, source, url) é lida pelo prompt e pelas citações
+    f"""
+    CREATE FUNCTION search_chunks(
+        query_embedding vector({EMBEDDING_DIM}),
+        match_count integer DEFAULT 5,
+        ef_search integer DEFAULT {DEFAULT_EF_SEARCH},
+        filter jsonb DEFAULT '{{}}'::jsonb,
+        include_embedding boolean DEFAULT false
+    )
+    RETURNS TABLE (
+        id bigint,
+        document_id bigint,
+        chunk_text text,
+        metadata jsonb,
+        embedding vector({EMBEDDING_DIM}),
+        similarity double precision,
+        documents jsonb
+    )
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        -- Vale só para esta transação; ef_search >= match_count para não truncar o resultado
+        PERFORM set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+        RETURN QUERY
+        SELECT c.id,
+               c.document_id,
+               c.chunk_text,
+               c.metadata,
+               CASE WHEN include_embedding THEN c.embedding END,
+               1 - (c.embedding <=> query_embedding),
+               CASE WHEN d.id IS NOT NULL
+                    THEN jsonb_build_object('title', d.title, 'source', d.source, 'url', d.url) END
+        FROM document_chunks c
+        LEFT JOIN documents d ON d.id = c.document_id
+        WHERE c.embedding IS NOT NULL
+          AND (filter = '{{}}'::jsonb OR c.metadata @> filter)
+        ORDER BY c.embedding <=> query_embedding
+        LIMIT match_count;
+    END;
+    $$
+    """,
+]
+
+
+def _metadata_field():
+    field = models.JSONField(blank=True, default=dict)
+    field.set_attributes_from_name("metadata")
+    return field
+
+
+def forward(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        model = apps.get_model("collector", "DocumentChunk")
+        schema_editor.add_field(model, _metadata_field())
+        return
+    for statement in POSTGRES_FORWARD:
+        schema_editor.execute(statement)
+
+
+def reverse(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        model = apps.get_model("collector", "DocumentChunk")
+        schema_editor.remove_field(model, _metadata_field())
+        return
+    # A search_chunks anterior foi criada direto no Supabase e sua definição
+    # não está versionada; recriar um palpite quebraria o código antigo
+    raise IrreversibleError(
+        "collector.0002 não pode ser desfeita em PostgreSQL: a definição anterior "
+        "de search_chunks não está versionada"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            # No Supabase a coluna metadata pode já existir; o SQL usa IF NOT EXISTS
+            database_operations=[migrations.RunPython(forward, reverse)],
+            state_operations=[
+                migrations.AddField(
+                    model_name='documentchunk',
+                    name='metadata',
+                    field=models.JSONField(blank=True, default=dict),
+                ),
+            ],
+        ),
+    ]
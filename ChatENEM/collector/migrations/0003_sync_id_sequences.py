@@ -0,0 +1,55 @@
+"""
+Função sync_id_sequences, chamada via /rest/v1/rpc/sync_id_sequences pelo
+restore_snapshot depois de gravar linhas com ids explícitos: avança as
+sequências de documents e document_chunks para além do maior id, senão o
+próximo insert_document colide na chave primária. Em SQLite não há nada a
+fazer (o autoincremento já usa o maior id).
+"""
+
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    """
+    CREATE OR REPLACE FUNCTION sync_id_sequences()
+    RETURNS TABLE (table_name text, next_id bigint)
+    LANGUAGE sql
+    AS $$
+        SELECT 'documents',
+               setval(pg_get_serial_sequence('documents', 'id'), coalesce(max(id), 0) + 1, false)
+        FROM documents
+        UNION ALL
+        SELECT 'document_chunks',
+               setval(pg_get_serial_sequence('document_chunks', 'id'), coalesce(max(id), 0) + 1, false)
+        FROM document_chunks
+    $$
+    """,
+]
+
+POSTGRES_REVERSE = [
+    "DROP FUNCTION IF EXISTS sync_id_sequences()",
+]
+
+
+def forward(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for statement in POSTGRES_FORWARD:
+        schema_editor.execute(statement)
+
+
+def reverse(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for statement in POSTGRES_REVERSE:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0002_chunk_embedding_hnsw_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, reverse),
+    ]
@@ -0,0 +1,118 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import List, Optional
+
+from .query_router import BROAD_RE
+
+
+@dataclass
+class ModelTier:
+    """Grupo de modelos com orçamento próprio de saída e tempo"""
+    name: str
+    models: List[str]
+    max_tokens: int
+    timeout: float
+    backend: str = "openrouter"
+
+
+# Do mais rápido ao mais capaz. Se todos os modelos de um tier falharem,
+# a chamada sobe para o tier seguinte.
+MODEL_TIERS: List[ModelTier] = [
+    ModelTier(
+        name="small",
+        models=[
+            "meta-llama/llama-3.2-3b-instruct:free",
+            "google/gemma-3-27b-it:free",
+        ],
+        max_tokens=512,
+        timeout=20,
+    ),
+    ModelTier(
+        name="medium",
+        models=[
+            "openai/gpt-oss-20b:free",
+            "google/gemma-3-27b-it:free",
+        ],
+        max_tokens=1024,
+        timeout=40,
+    ),
+    ModelTier(
+        name="large",
+        models=[
+            "openai/gpt-oss-120b:free",
+            "nousresearch/hermes-3-llama-3.1-405b:free",
+        ],
+        max_tokens=2048,
+        timeout=90,
+    ),
+]
+
+# Limites de tamanho do prompt (tokens estimados) para cada tier
+SMALL_MAX_PROMPT_TOKENS = 1200
+MEDIUM_MAX_PROMPT_TOKENS = 3000
+
+# Português fica em torno de 4 caracteres por token nos tokenizadores BPE
+CHARS_PER_TOKEN = 4
+
+_MULTI_PART_RE = re.compile(r"\?.+\?|\b(e tambem|alem disso|por que|porque|qual a diferenca)\b")
+
+
+def estimate_tokens(*texts: str) -> int:
+    return sum(len(t or "") for t in texts) // CHARS_PER_TOKEN + 1
+
+
+def question_complexity(question: str) -> int:
+    """
+    Pontuação simples de complexidade:
+      0 = pergunta pontual ("qual a data da prova?")
+      1 = pergunta média
+      2 = pergunta ampla, comparativa ou com várias partes
+    """
+    # Sem acentos, como os padrões ("diferença" → "diferenca"); a pontuação
+    # fica, porque duas interrogações indicam várias perguntas
+    norm = unicodedata.normalize("NFKD", (question or "").lower())
+    norm = "".join(ch for ch in norm if not unicodedata.combining(ch))
+    words = len(norm.split())
+    if BROAD_RE.search(norm) or _MULTI_PART_RE.search(norm) or words > 30:
+        return 2
+    if words > 12:
+        return 1
+    return 0
+
+
+def choose_tier(question: str, prompt_tokens: int) -> int:
+    """Índice em MODEL_TIERS do tier inicial para esta pergunta/prompt"""
+    complexity = question_complexity(question)
+    if complexity >= 2 or prompt_tokens > MEDIUM_MAX_PROMPT_TOKENS:
+        return 2
+    if complexity == 1 or prompt_tokens > SMALL_MAX_PROMPT_TOKENS:
+        return 1
+    return 0
+
+
+def local_tier() -> Optional[ModelTier]:
+    """
+    Servidor local compatível com a OpenAI (settings.LOCAL_LLM_URL), usado
+    como último recurso: mais lento, mas sem cota nem limite de taxa externos.
+    """
+    from django.conf import settings
+    if not getattr(settings, "LOCAL_LLM_URL", "") or not settings.LOCAL_LLM_MODEL:
+        return None
+    return ModelTier(
+        name="local",
+        models=[settings.LOCAL_LLM_MODEL],
+        max_tokens=settings.LOCAL_LLM_MAX_TOKENS,
+        timeout=settings.LOCAL_LLM_TIMEOUT,
+        backend="local",
+    )
+
+
+def tier_plan(question: str, prompt_tokens: int) -> List[ModelTier]:
+    """
+    Tiers a tentar, em ordem: o escolhido, como fallback os maiores e, por
+    último, o servidor local (se configurado).
+    """
+    plan = MODEL_TIERS[choose_tier(question, prompt_tokens):]
+    local = local_tier()
+    return plan + [local] if local else plan
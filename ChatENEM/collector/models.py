@@ -24,6 +24,8 @@ class DocumentChunk(models.Model):
     chunk_text = models.TextField()
     chunk_hash = models.CharField(max_length=128, unique=True)
     embedding_model = models.TextField()
+    # Coluna embedding vector(1024) e índice HNSW: ver migração 0002 (só PostgreSQL)
+    metadata = models.JSONField(blank=True, default=dict)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -0,0 +1,265 @@
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Conexão direta com o Postgres (sem PostgREST). psycopg e psycopg_pool só
+# são importados quando DATABASE_BACKEND="postgres".
+
+DEFAULT_EF_SEARCH = 40  # mesmo padrão da função search_chunks (migração 0002)
+
+SEARCH_SQL = (
+    "SELECT id, document_id, chunk_text, metadata, embedding, similarity, documents "
+    "FROM search_chunks(%s, %s, %s, %s, %s)"
+)
+
+CHUNK_LOAD_COLUMNS = ("document_id", "chunk_hash", "chunk_text", "embedding", "embedding_model", "metadata")
+CHUNK_LOAD_TYPES = ("int8", "text", "text", "vector", "text", "jsonb")
+
+_LOAD_COLUMNS = ", ".join(CHUNK_LOAD_COLUMNS)
+CHUNK_LOAD_TABLE_SQL = (
+    "CREATE TEMP TABLE IF NOT EXISTS _chunk_load ("
+    + ", ".join(f"{c} {t}" for c, t in zip(CHUNK_LOAD_COLUMNS, CHUNK_LOAD_TYPES))
+    + ") ON COMMIT DELETE ROWS"
+)
+CHUNK_COPY_SQL = f"COPY _chunk_load ({_LOAD_COLUMNS}) FROM STDIN (FORMAT BINARY)"
+CHUNK_INSERT_SQL = (
+    f"INSERT INTO document_chunks ({_LOAD_COLUMNS}, created_at) "
+    f"SELECT {_LOAD_COLUMNS}, now() FROM _chunk_load "
+    "ON CONFLICT (chunk_hash) DO NOTHING RETURNING chunk_hash, id"
+)
+
+
+def dump_vector(values) -> bytes:
+    """
+    Formato binário do tipo vector do pgvector: uint16 dimensão, uint16
+    reservado e float32 big-endian.
+    """
+    values = np.asarray(values, dtype=">f4")
+    return struct.pack(">HH", values.shape[0], 0) + values.tobytes()
+
+
+def load_vector(data) -> List[float]:
+    dim, _ = struct.unpack_from(">HH", data)
+    return np.frombuffer(bytes(data), dtype=">f4", count=dim, offset=4).astype(np.float32).tolist()
+
+
+def load_vector_text(data) -> List[float]:
+    return [float(v) for v in bytes(data).decode().strip("[]").split(",") if v]
+
+
+def _register_vector(conn):
+    """
+    Adapta o tipo vector do pgvector no formato binário (dump_vector).
+    Evita serializar 1024 floats como texto na ida e na volta.
+    """
+    from psycopg.adapt import Dumper, Loader
+    from psycopg.pq import Format
+    from psycopg.types import TypeInfo
+
+    info = TypeInfo.fetch(conn, "vector")
+    if info is None:
+        raise RuntimeError("Extensão pgvector não instalada (aplique a migração 0002)")
+    # Registra o nome "vector" na conexão (usado por copy.set_types em copy_chunks)
+    info.register(conn)
+
+    class VectorBinaryDumper(Dumper):
+        format = Format.BINARY
+        oid = info.oid
+
+        def dump(self, obj):
+            return dump_vector(obj)
+
+    class VectorBinaryLoader(Loader):
+        format = Format.BINARY
+
+        def load(self, data):
+            return load_vector(data)
+
+    class VectorTextLoader(Loader):
+        format = Format.TEXT
+
+        def load(self, data):
+            return load_vector_text(data)
+
+    conn.adapters.register_dumper(np.ndarray, VectorBinaryDumper)
+    conn.adapters.register_loader(info.oid, VectorBinaryLoader)
+    conn.adapters.register_loader(info.oid, VectorTextLoader)
+
+
+def _vector(values) -> np.ndarray:
+    return np.asarray(values, dtype=np.float32)
+
+
+class PostgresUnavailable(RuntimeError):
+    """Banco fora do ar (ou em espera após falha): use o PostgREST"""
+
+
+class PostgresBackend:
+    """
+    Acesso direto ao Postgres/pgvector para os caminhos quentes (busca e
+    ingestão de chunks), com pool de conexões, prepared statements no
+    servidor, vetores em formato binário e COPY para inserções em lote.
+
+    Prepared statements exigem conexão direta ou pooler em modo sessão (no
+    Supabase, a porta 5432); em modo transação use prepare_threshold=None.
+
+    Com o banco inacessível, cada chamada espera no máximo pool_timeout
+    segundos; depois de uma falha de conexão o backend fica em espera
+    (backoff exponencial até max_backoff) e as chamadas levantam
+    PostgresUnavailable na hora, para o chamador usar o PostgREST.
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10,
+                 prepare_threshold: Optional[int] = 0, connect_timeout: int = 3,
+                 pool_timeout: float = 5.0, backoff: float = 5.0, max_backoff: float = 120.0):
+        try:
+            from psycopg.rows import dict_row
+            from psycopg_pool import ConnectionPool
+        except ImportError as e:
+            raise RuntimeError("Backend postgres requer psycopg e psycopg_pool") from e
+
+        def configure(conn):
+            _register_vector(conn)
+            conn.prepare_threshold = prepare_threshold
+            conn.commit()
+
+        self.pool = ConnectionPool(
+            dsn, min_size=min_size, max_size=max_size, timeout=pool_timeout,
+            kwargs={"row_factory": dict_row, "connect_timeout": connect_timeout},
+            configure=configure, open=True,
+        )
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._failures = 0
+        self._unavailable_until = 0.0
+        self._state_lock = threading.Lock()
+
+    def close(self):
+        self.pool.close()
+
+    @contextmanager
+    def _connection(self):
+        """pool.connection() com falha rápida e espera entre tentativas"""
+        from psycopg import OperationalError, errors
+        from psycopg_pool import PoolTimeout
+
+        if time.time() < self._unavailable_until:
+            raise PostgresUnavailable("Conexão direta em espera após falha")
+        try:
+            with self.pool.connection() as conn:
+                yield conn
+        except (PoolTimeout, OperationalError) as e:
+            if isinstance(e, errors.QueryCanceled):
+                raise  # statement_timeout: o banco respondeu
+            with self._state_lock:
+                delay = min(self.backoff * 2 ** self._failures, self.max_backoff)
+                self._failures += 1
+                self._unavailable_until = time.time() + delay
+            print(f"Conexão direta indisponível, nova tentativa em {delay:.0f}s: {e}")
+            raise PostgresUnavailable(str(e)) from e
+        else:
+            if self._failures:
+                with self._state_lock:
+                    self._failures = 0
+                    self._unavailable_until = 0.0
+
+    def ping(self) -> bool:
+        with self._connection() as conn:
+            conn.execute("SELECT 1")
+        return True
+
+    # -----------------------------
+    # Busca
+    # -----------------------------
+
+    def search_chunks(self, query_embedding: List[float], match_count: int = 5,
+                      ef_search: Optional[int] = None, filter: Optional[Dict] = None,
+                      include_embedding: bool = False) -> List[Dict[str, Any]]:
+        """Mesmo contrato do RPC search_chunks (linhas com "similarity")"""
+        from psycopg.types.json import Jsonb
+        from psycopg.types.numeric import Int4
+
+        # Tipos fixos: o mesmo prepared statement serve para qualquer k
+        params = (_vector(query_embedding), Int4(match_count), Int4(ef_search or DEFAULT_EF_SEARCH),
+                  Jsonb(filter or {}), include_embedding)
+        with self._connection() as conn:
+            with conn.cursor(binary=True) as cur:
+                cur.execute(SEARCH_SQL, params)
+                return cur.fetchall()
+
+    # -----------------------------
+    # Ingestão
+    # -----------------------------
+
+    def insert_document(self, url: str, url_norm: str, title: str, source: str) -> Optional[int]:
+        with self._connection() as conn:
+            row = conn.execute(
+                "INSERT INTO documents (url, url_norm, title, source, created_at) "
+                "VALUES (%s, %s, %s, %s, now()) RETURNING id",
+                (url, url_norm, title, source),
+            ).fetchone()
+        return row["id"] if row else None
+
+    def existing_hashes(self, hashes: Iterable[str]) -> set:
+        hashes = [h for h in hashes if h]
+        if not hashes:
+            return set()
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT chunk_hash FROM document_chunks WHERE chunk_hash = ANY(%s)", (hashes,)
+            ).fetchall()
+        return {r["chunk_hash"] for r in rows}
+
+    def copy_chunks(self, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Insere chunks via COPY binário numa tabela temporária e depois
+        INSERT ... ON CONFLICT (chunk_hash) DO NOTHING. Retorna {hash: id}
+        dos chunks efetivamente inseridos.
+        """
+        if not rows:
+            return {}
+        with self._connection() as conn:
+            with conn.transaction(), conn.cursor() as cur:
+                cur.execute(CHUNK_LOAD_TABLE_SQL)
+                with cur.copy(CHUNK_COPY_SQL) as copy:
+                    copy.set_types(CHUNK_LOAD_TYPES)
+                    for row in rows:
+                        embedding = row.get("embedding")
+                        copy.write_row((
+                            row.get("document_id"),
+                            row["chunk_hash"],
+                            row.get("chunk_text", ""),
+                            _vector(embedding) if embedding else None,
+                            row.get("embedding_model"),
+                            row.get("metadata") or {},
+                        ))
+                cur.execute(CHUNK_INSERT_SQL)
+                return {r["chunk_hash"]: r["id"] for r in cur.fetchall()}
+
+
+_backend: Optional[PostgresBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_postgres_backend() -> Optional[PostgresBackend]:
+    """
+    Backend direto do processo quando settings.DATABASE_BACKEND == "postgres";
+    None no modo padrão (PostgREST).
+    """
+    global _backend
+    from django.conf import settings
+    if getattr(settings, "DATABASE_BACKEND", "postgrest") != "postgres":
+        return None
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if not settings.POSTGRES_DSN:
+                    raise RuntimeError("DATABASE_BACKEND=postgres requer POSTGRES_DSN")
+                _backend = PostgresBackend(settings.POSTGRES_DSN, max_size=settings.POSTGRES_POOL_MAX,
+                                           connect_timeout=settings.POSTGRES_CONNECT_TIMEOUT,
+                                           pool_timeout=settings.POSTGRES_POOL_TIMEOUT)
+    return _backend
@@ -0,0 +1,211 @@
+import atexit
+import glob
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+QUEUE_SIZE = 10000
+FLUSH_INTERVAL = 1.0
+
+_IDLE = object()  # fila vazia por FLUSH_INTERVAL: só verifica flush/rotação
+
+
+class QueryTrace:
+    """
+    Registro de uma pergunta: rota, chunks recuperados, modelo usado,
+    acerto de cache e tempo de cada etapa (ms).
+    """
+
+    def __init__(self, question: str, k: int, conversation_id: Optional[str] = None):
+        self.started = time.perf_counter()
+        self.data: Dict[str, Any] = {
+            "ts": time.time(),
+            "question": question,
+            "k": k,
+            "conversation_id": conversation_id,
+            "cache_hit": False,
+            "timings_ms": {},
+        }
+
+    def set(self, **fields):
+        self.data.update(fields)
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings = self.data["timings_ms"]
+            timings[name] = round(timings.get(name, 0.0) + (time.perf_counter() - t0) * 1000, 2)
+
+    def finish(self, result: Optional[Dict] = None, error: Optional[str] = None) -> Dict[str, Any]:
+        self.data["total_ms"] = round((time.perf_counter() - self.started) * 1000, 2)
+        if result is not None:
+            self.data["found_context"] = result.get("found_context", False)
+            self.data["answer_chars"] = len(result.get("answer") or "")
+        if error:
+            self.data["error"] = error
+        return self.data
+
+
+_local = threading.local()
+
+
+@contextmanager
+def tracing(trace: QueryTrace):
+    """Torna trace a trace corrente da thread (usada por trace_stage)"""
+    previous = getattr(_local, "trace", None)
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+def current_trace() -> Optional[QueryTrace]:
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def trace_stage(name: str):
+    """Mede uma etapa na trace corrente; sem trace, não faz nada"""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    with trace.stage(name):
+        yield
+
+
+class QueryLogWriter:
+    """
+    Log de consultas somente-anexação, escrito por uma thread em segundo
+    plano em arquivos JSONL gzip rotacionados.
+
+    log() só enfileira (put_nowait) e nunca bloqueia a requisição; com a
+    fila cheia o registro é descartado e contado em "dropped". Cada processo
+    escreve no próprio arquivo; ao rotacionar, o arquivo aberto
+    (.jsonl.gz.open) é renomeado para .jsonl.gz e passa a ser lido pelos
+    consumidores (aquecimento de cache, respostas pré-computadas, benchmarks).
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 16 * 1024 * 1024,
+                 max_age_seconds: int = 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=QUEUE_SIZE)
+        self._file = None
+        self._path: Optional[str] = None
+        self._written = 0
+        self._opened_at = 0.0
+        self._sequence = 0
+        self._thread = threading.Thread(target=self._run, name="query-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, record: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0):
+        """Grava o que estiver na fila e fecha o arquivo corrente"""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    # -----------------------------
+    # Thread de escrita
+    # -----------------------------
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                record = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                record = _IDLE
+            if record is None:
+                self._rotate()
+                return
+
+            try:
+                if record is not _IDLE:
+                    self._write(record)
+                if self._file and time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                    self._file.flush()
+                    last_flush = time.monotonic()
+                if self._file and (self._written >= self.max_bytes
+                                   or time.time() - self._opened_at >= self.max_age_seconds):
+                    self._rotate()
+            except Exception as e:
+                print(f"Erro gravando log de consultas: {e}")
+
+    def _write(self, record: Dict[str, Any]):
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            self._sequence += 1
+            name = f"queries-{stamp}-{os.getpid()}-{self._sequence:04d}.jsonl.gz.open"
+            self._path = os.path.join(self.directory, name)
+            self._file = gzip.open(self._path, "ab")
+            self._written = 0
+            self._opened_at = time.time()
+        line = json.dumps(record, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+        self._file.write(line)
+        self._written += len(line)
+
+    def _rotate(self):
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(self._path, self._path[:-len(".open")])
+        self._file = None
+        self._path = None
+
+
+def iter_query_log(directory: str, include_open: bool = False) -> Iterator[Dict[str, Any]]:
+    """Lê os registros dos arquivos rotacionados, do mais antigo ao mais novo"""
+    paths: List[str] = sorted(glob.glob(os.path.join(directory, "queries-*.jsonl.gz")))
+    if include_open:
+        paths += sorted(glob.glob(os.path.join(directory, "queries-*.jsonl.gz.open")))
+    for path in paths:
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except (OSError, EOFError, ValueError) as e:
+            # Arquivo aberto por outro processo pode terminar no meio de um bloco
+            print(f"Log de consultas {path} incompleto: {e}")
+
+
+_writer: Optional[QueryLogWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_query_log() -> Optional[QueryLogWriter]:
+    """Writer do processo em settings.QUERY_LOG_DIR; None se desativado"""
+    global _writer
+    from django.conf import settings
+    directory = getattr(settings, "QUERY_LOG_DIR", "")
+    if not directory:
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = QueryLogWriter(directory, max_bytes=settings.QUERY_LOG_MAX_BYTES)
+    return _writer
@@ -0,0 +1,243 @@
+import math
+import re
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .entity_index import TYPE_TRIGGERS
+
+# =============================
+# RESPOSTAS PRONTAS
+# =============================
+
+GREETING_REPLY = (
+    "Olá! Sou o assistente do ChatENEM. Posso tirar dúvidas sobre o ENEM com base "
+    "nos documentos oficiais do INEP/MEC: datas, inscrição, redação, estrutura da prova e mais."
+)
+THANKS_REPLY = "De nada! Se tiver outra dúvida sobre o ENEM, é só perguntar."
+META_REPLY = (
+    "Sou o assistente educacional do ChatENEM. Respondo perguntas sobre o ENEM usando "
+    "apenas documentos oficiais do INEP/MEC e indico as fontes de cada resposta."
+)
+OFF_TOPIC_REPLY = (
+    "Só consigo responder perguntas sobre o ENEM (inscrição, datas, provas, redação, notas). "
+    "Pode reformular sua dúvida?"
+)
+
+# =============================
+# REGRAS
+# =============================
+
+_GREETING_RE = re.compile(
+    r"^(oi+|ola|ola+|opa|e ai|eai|bom dia|boa tarde|boa noite|hey|hello|hi|salve|tudo bem|tudo bom)"
+    r"( (tudo bem|tudo bom|chat|chatenem|pessoal))*$"
+)
+# Só agradecimentos/despedidas puros: palavras de cortesia, sem nenhum assunto
+# junto (pontuação e emoji já somem na normalização)
+_THANKS_WORD = r"(obrigad[oa]|brigad[oa]|valeu|vlw|obg|agradeco|tchau|ate mais|ate logo|falou|flw)"
+_THANKS_RE = re.compile(
+    rf"^((ok|muito|mesmo|demais|pela ajuda|chat|chatenem) )*{_THANKS_WORD}"
+    rf"( (ok|muito|mesmo|demais|pela ajuda|chat|chatenem|{_THANKS_WORD}))*$"
+)
+# Perguntas sobre o próprio assistente; ancorado para não capturar
+# "para que serve o cartão de confirmação"
+_META_RE = re.compile(
+    r"^(e |mas |ei |chat )?(quem (e|eh) (voce|vc)|o que (voce|vc) (e|faz|sabe fazer)|como (voce|vc) funciona"
+    r"|(voce|vc) (e|eh) (um robo|uma ia|humano)|qual (e )?(o )?seu nome|para que (voce|vc) serve)$"
+)
+_INTERROGATIVE_RE = re.compile(
+    r"\b(quando|qual|quais|como|onde|quanto|quanta|quantos|quantas|que|quem|porque|pode|posso|devo)\b"
+)
+
+# Termos que indicam assunto ENEM; com eles a pergunta nunca é tratada como fora do tema
+_ENEM_TERMS = (
+    "enem", "inep", "mec", "redacao", "prova", "provas", "inscricao", "inscricoes", "isencao",
+    "competencia", "nota", "notas", "sisu", "prouni", "fies", "gabarito", "cartao", "resposta",
+    "edital", "cronograma", "questoes", "participante", "candidato", "local de prova",
+    "linguagens", "matematica", "humanas", "natureza", "taxa", "boleto", "atendimento",
+    "resultado", "resultados", "nota de corte", "treineiro", "treineiros", "aplicacao", "reaplicacao",
+    "tri", "correcao", "recurso", "senha", "gov br", "portao", "portoes", "documento", "documentos",
+    "caneta", "simulado", "vestibular", "faculdade", "universidade", "curso", "eliminado", "acertos",
+    "desempenho", "boletim", "certificacao", "encceja", "segunda chamada",
+)
+
+# =============================
+# MODELO LINEAR (n-gramas de caracteres)
+# =============================
+
+N_FEATURES = 1 << 12
+NGRAM_RANGE = (2, 4)
+OFF_TOPIC_THRESHOLD = 0.95
+
+# Exemplos rotulados usados para treinar o classificador na importação.
+# 1 = pergunta sobre o ENEM, 0 = fora do tema.
+_TRAINING_DATA: List[Tuple[str, int]] = [
+    ("quando é a prova do enem", 1),
+    ("qual a data de inscrição", 1),
+    ("como funciona a redação", 1),
+    ("quantas questões tem a prova de matemática", 1),
+    ("o que é a competência 3", 1),
+    ("qual a nota mínima para medicina", 1),
+    ("como pedir isenção da taxa", 1),
+    ("quanto custa a inscrição", 1),
+    ("o que levar no dia da prova", 1),
+    ("posso usar caneta azul", 1),
+    ("quando sai o gabarito", 1),
+    ("como consultar o local de prova", 1),
+    ("qual o tema da redação", 1),
+    ("como é calculada a nota", 1),
+    ("o que zera a redação", 1),
+    ("quais documentos são aceitos", 1),
+    ("quanto tempo dura a prova", 1),
+    ("como solicitar atendimento especializado", 1),
+    ("posso usar a nota no sisu", 1),
+    ("quais são as áreas do conhecimento", 1),
+    ("qual o horário de abertura dos portões", 1),
+    ("como recuperar a senha do participante", 1),
+    ("o que é tri", 1),
+    ("quantas linhas tem a folha de redação", 1),
+    ("e para a redação", 1),
+    ("e a segunda aplicação", 1),
+    ("preciso imprimir o cartão de confirmação", 1),
+    ("treineiro pode fazer", 1),
+    ("onde vejo meu resultado", 1),
+    ("como vejo minha nota", 1),
+    ("quando começa o sisu", 1),
+    ("perdi o dia da prova o que faço", 1),
+    ("qual a receita de bolo de chocolate", 0),
+    ("quem ganhou o jogo ontem", 0),
+    ("me conta uma piada", 0),
+    ("qual a previsão do tempo amanhã", 0),
+    ("como fazer bolo de cenoura", 0),
+    ("recomende um filme", 0),
+    ("qual o melhor celular", 0),
+    ("quanto está o dólar hoje", 0),
+    ("escreva um poema de amor", 0),
+    ("qual a capital da frança", 0),
+    ("quem é o presidente dos estados unidos", 0),
+    ("como emagrecer rápido", 0),
+    ("qual o resultado do campeonato", 0),
+    ("me ajuda a programar em python", 0),
+    ("qual a melhor pizza da cidade", 0),
+    ("como trocar o pneu do carro", 0),
+    ("que horas são", 0),
+    ("me indica uma série", 0),
+    ("quanto custa um iphone", 0),
+    ("como ganhar dinheiro na internet", 0),
+    ("qual seu time de futebol", 0),
+    ("conte uma história", 0),
+    ("traduza para o inglês", 0),
+    ("como fazer um currículo", 0),
+]
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _features(norm_text: str) -> Dict[int, float]:
+    """Hashing de n-gramas de caracteres, normalizado em L2"""
+    padded = f" {norm_text} "
+    counts: Dict[int, float] = {}
+    for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+        for i in range(len(padded) - n + 1):
+            h = zlib.crc32(padded[i:i + n].encode("utf-8")) % N_FEATURES
+            counts[h] = counts.get(h, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {h: v / norm for h, v in counts.items()}
+
+
+class CharNgramClassifier:
+    """Regressão logística binária sobre n-gramas de caracteres (treino por SGD)"""
+
+    def __init__(self, epochs: int = 30, learning_rate: float = 0.5, l2: float = 1e-4):
+        self.weights = [0.0] * N_FEATURES
+        self.bias = 0.0
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+
+    def fit(self, samples: List[Tuple[str, int]]) -> "CharNgramClassifier":
+        data = [(_features(_normalize(text)), label) for text, label in samples]
+        for _ in range(self.epochs):
+            for feats, label in data:
+                error = self._sigmoid(self._score(feats)) - label
+                for h, v in feats.items():
+                    self.weights[h] -= self.learning_rate * (error * v + self.l2 * self.weights[h])
+                self.bias -= self.learning_rate * error
+        return self
+
+    def predict_proba(self, norm_text: str) -> float:
+        """Probabilidade de a pergunta ser sobre o ENEM"""
+        return self._sigmoid(self._score(_features(norm_text)))
+
+    def _score(self, feats: Dict[int, float]) -> float:
+        return self.bias + sum(self.weights[h] * v for h, v in feats.items())
+
+    @staticmethod
+    def _sigmoid(x: float) -> float:
+        if x < -30:
+            return 0.0
+        return 1.0 / (1.0 + math.exp(-x))
+
+
+_classifier = CharNgramClassifier().fit(_TRAINING_DATA)
+
+# =============================
+# ROTEAMENTO
+# =============================
+
+@dataclass
+class Route:
+    """Destino de uma pergunta e profundidade de recuperação"""
+    name: str                    # greeting | thanks | meta | off_topic | extractive | rag
+    k: int = 0                   # máximo de chunks para a busca (0 = sem busca)
+    reply: Optional[str] = None  # resposta pronta, quando não há busca nem LLM
+    confidence: float = 1.0
+
+
+# k máximo por rota com busca. A rota extrativa usa o k do RAG: ele só vale
+# quando o índice de entidades não encontra resposta e a pergunta cai na busca.
+FACTUAL_K = 4
+BROAD_K = 8
+
+BROAD_RE = re.compile(r"\b(explique|explica|como funciona|quais sao|diferenca|compare|detalhe|resuma|tudo sobre)\b")
+
+
+def route_question(question: str) -> Route:
+    """
+    Classificador local barato executado antes de answer_question.
+
+    Saudações, agradecimentos, perguntas sobre o assistente e perguntas fora
+    do tema recebem resposta pronta (sem embedding, busca ou LLM); mensagens
+    com pergunta nunca recebem a resposta de agradecimento, e só perguntas
+    claramente fora do tema são recusadas. Consultas factuais a tabelas vão
+    para o caminho extrativo; o resto (e o extrativo sem entidade) segue para
+    o RAG, com k menor para perguntas pontuais e maior para perguntas amplas.
+    """
+    norm = _normalize(question)
+    if not norm:
+        return Route("greeting", reply=GREETING_REPLY)
+
+    if _GREETING_RE.match(norm):
+        return Route("greeting", reply=GREETING_REPLY)
+    is_question = "?" in question or bool(_INTERROGATIVE_RE.search(norm))
+    if not is_question and _THANKS_RE.match(norm):
+        return Route("thanks", reply=THANKS_REPLY)
+    if _META_RE.match(norm):
+        return Route("meta", reply=META_REPLY)
+
+    has_enem_term = any(re.search(rf"\b{t}\b", norm) for t in _ENEM_TERMS)
+    if not has_enem_term:
+        p_enem = _classifier.predict_proba(norm)
+        if 1.0 - p_enem >= OFF_TOPIC_THRESHOLD:
+            return Route("off_topic", reply=OFF_TOPIC_REPLY, confidence=1.0 - p_enem)
+
+    rag_k = BROAD_K if BROAD_RE.search(norm) or len(norm.split()) > 20 else FACTUAL_K
+    if any(re.search(rf"\b{tr}\b", norm) for triggers in TYPE_TRIGGERS.values() for tr in triggers):
+        return Route("extractive", k=rag_k)
+    return Route("rag", k=rag_k)
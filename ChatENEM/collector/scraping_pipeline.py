@@ -1,12 +1,26 @@
-from typing import List, Dict, Any
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Optional
+import os
 import time
 
+from django.conf import settings
+
 from .url_manager import URLManager
 from .http_client import HTTPClient
+from .validator_store import ValidatorStore
+from .crawl_archive import CrawlArchive
+from .crawl_scheduler import (
+    DEFAULT_CONNECTIONS_PER_HOST,
+    DEFAULT_FETCH_WORKERS,
+    ConcurrentFetcher,
+    HostLimiter,
+)
 from .block_extractor import BlockExtractor
 from .document_processor import DocumentProcessor
 from .semantic_processor import SemanticProcessor
 from .database_layer import DatabaseLayer
+from .entity_index import EntityIndex
+from .metrics import CRAWL_CHUNKS, CRAWL_PAGE_LATENCY, CRAWL_PAGES
 
 
 class ENEMScrapingPipeline:
@@ -24,28 +38,70 @@ class ENEMScrapingPipeline:
         supabase_url: str,
         supabase_key: str,
         domain_filter: str = "inep.gov.br",
-        checkpoint_file: str = "ChatENEM/data/enem_scraping_checkpoint.json",
+        checkpoint_file: str = "ChatENEM/data/enem_scraping_checkpoint.sqlite3",
         max_pages: int = 200,
-        delay: float = 1.5
+        delay: float = 1.5,
+        entity_index_file: Optional[str] = None,
+        fetch_workers: int = DEFAULT_FETCH_WORKERS,
+        max_connections_per_host: int = DEFAULT_CONNECTIONS_PER_HOST,
+        validator_file: Optional[str] = "ChatENEM/data/http_validators.sqlite3",
+        archive_dir: Optional[str] = None,
+        archive_mode: str = "record",
+        recrawl: bool = False,
     ):
+        # archive_dir grava as respostas (archive_mode="record") ou roda a
+        # coleta offline a partir delas ("replay", sem espera entre requisições).
+        # O replay sempre reprocessa tudo a partir das sementes: usa uma
+        # fronteira nova dentro do arquivo e nenhum validador (senão as
+        # páginas gravadas seriam vistas como "sem alterações" e puladas).
+        archive = CrawlArchive(archive_dir, archive_mode) if archive_dir else None
+        replaying = archive is not None and archive.replaying
+        if replaying:
+            checkpoint_file = os.path.join(archive_dir, "replay_frontier.sqlite3")
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(checkpoint_file + suffix):
+                    os.remove(checkpoint_file + suffix)
+            validator_file = None
+
         # Núcleo do pipeline
         self.url_manager = URLManager(checkpoint_file, domain_filter)
+        # validator_file=None desativa a revalidação (toda página é reprocessada)
         self.http_client = HTTPClient(
-            user_agent="ChatENEM/1.0 (Educational Research Bot - INEP/ENEM)"
+            user_agent="ChatENEM/1.0 (Educational Research Bot - INEP/ENEM)",
+            validator_store=ValidatorStore(validator_file) if validator_file else None,
+            archive=archive,
         )
+        # delay = intervalo mínimo entre requisições ao mesmo host (ou o
+        # Crawl-delay do robots.txt, se maior)
+        self.host_limiter = HostLimiter(
+            min_interval=0.0 if replaying else delay,
+            max_connections=max_connections_per_host,
+            interval_for=self.http_client.crawl_delay,
+        )
+        self.fetcher = ConcurrentFetcher(self.http_client, self.host_limiter, workers=fetch_workers)
         self.block_extractor = BlockExtractor()
-        self.document_processor = DocumentProcessor()
+        self.document_processor = DocumentProcessor(host_limiter=self.host_limiter, http_client=self.http_client)
         self.semantic_processor = SemanticProcessor()
         self.database = DatabaseLayer(supabase_url, supabase_key)
+        # Mesmo arquivo que o agente lê (settings.ENTITY_INDEX_PATH), qualquer que seja o cwd
+        self.entity_index = EntityIndex(entity_index_file or settings.ENTITY_INDEX_PATH)
+        self.entity_index.load(force=True)
 
         # Configurações
         self.max_pages = max_pages
         self.delay = delay
+        self.fetch_workers = fetch_workers
         self.domain_filter = domain_filter
+        # recrawl=True devolve as URLs já visitadas à fila no início do run:
+        # cada uma é buscada com GET condicional e só é reprocessada se mudou
+        # (sem isso, a fronteira persistente ignora as sementes já visitadas
+        # e a revalidação só acontece a partir de um checkpoint novo)
+        self.recrawl = recrawl and not replaying
 
         # Estatísticas
         self.stats = {
             "pages_processed": 0,
+            "pages_unchanged": 0,
             "chunks_created": 0,
             "documents_processed": 0,
             "errors": 0,
@@ -61,33 +117,69 @@ class ENEMScrapingPipeline:
         print("=== Iniciando Pipeline Oficial do ChatENEM ===")
         self.stats["start_time"] = time.time()
 
-        self.url_manager.add_seed_urls(seed_urls)
-        print(f"URLs iniciais carregadas: {len(seed_urls)}")
-
-        while self.stats["pages_processed"] < self.max_pages:
-            url = self.url_manager.get_next_pending()
-
-            if not url:
-                print("Nenhuma URL pendente restante.")
-                break
-
-            print(f"\n🔍 Processando página {self.stats['pages_processed'] + 1}/{self.max_pages}")
-            print(f"URL: {url}")
-
-            success = self._process_page(url)
-
-            if success:
-                self.stats["pages_processed"] += 1
-                time.sleep(self.delay)
-            else:
-                self.stats["errors"] += 1
+        # Downloads correm em paralelo (limitados por host) enquanto esta
+        # thread processa as páginas que já chegaram. Links descobertos
+        # entram na fila e são buscados assim que houver vaga.
+        in_flight = {}
+        try:
+            if self.recrawl:
+                requeued = self.url_manager.requeue_visited()
+                print(f"Recoleta: {requeued} URLs visitadas voltaram para a fila")
+            self.url_manager.add_seed_urls(seed_urls)
+            print(f"URLs iniciais carregadas: {len(seed_urls)}")
+
+            while self.stats["pages_processed"] < self.max_pages:
+                while (len(in_flight) < self.fetch_workers * 2
+                       and self.stats["pages_processed"] + len(in_flight) < self.max_pages):
+                    url = self.url_manager.get_next_pending()
+                    if not url:
+                        break
+                    in_flight[self.fetcher.submit(url)] = url
+
+                if not in_flight:
+                    print("Nenhuma URL pendente restante.")
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = in_flight.pop(future)
+                    print(f"\n🔍 Processando página {self.stats['pages_processed'] + 1}/{self.max_pages}")
+                    print(f"URL: {url}")
+
+                    # O processamento (OCR, embeddings) pode passar do prazo
+                    # do empréstimo: renova esta URL e as que ainda esperam
+                    self.url_manager.renew_lease([url, *in_flight.values()])
+                    response = future.result()
+                    started = time.perf_counter()
+                    success = self._process_page(url, response)
+                    CRAWL_PAGE_LATENCY.observe(time.perf_counter() - started)
+                    if success and response.get("not_modified"):
+                        CRAWL_PAGES.inc(outcome="unchanged")
+                    else:
+                        CRAWL_PAGES.inc(outcome="ok" if success else "error")
+
+                    if success:
+                        self.stats["pages_processed"] += 1
+                    else:
+                        self.stats["errors"] += 1
+                        # 4xx (exceto 429) não melhora com nova tentativa
+                        status = response.get("status_code") or 0
+                        self.url_manager.mark_failed(
+                            url,
+                            response.get("error") or "erro no processamento",
+                            permanent=400 <= status < 500 and status != 429,
+                        )
 
-            if self.stats["pages_processed"] % 10 == 0:
-                self._print_progress()
+                    if self.stats["pages_processed"] % 10 == 0:
+                        self._print_progress()
+        finally:
+            # Sessões (pools de conexões) e bancos são fechados mesmo com erro
+            self.fetcher.close()
+            self.url_manager.close()
+            self.http_client.close()
 
         self.stats["end_time"] = time.time()
         self._print_final_stats()
-        self.http_client.close()
 
         return self.stats
 
@@ -95,9 +187,16 @@ class ENEMScrapingPipeline:
     # PROCESSAMENTO DE PÁGINA
     # =============================
 
-    def _process_page(self, url: str) -> bool:
+    def _process_page(self, url: str, response: Optional[Dict[str, Any]] = None) -> bool:
         try:
-            response = self.http_client.fetch(url)
+            if response is None:
+                with self.host_limiter.slot(url):
+                    response = self.http_client.fetch(url)
+
+            # Página igual à última versão processada: sem extração,
+            # chunking nem embeddings; só reaproveita os links dela.
+            if response.get("not_modified"):
+                return self._skip_unchanged(url, response)
 
             if response["status_code"] != 200:
                 print(f"Erro HTTP {response['status_code']}")
@@ -132,8 +231,15 @@ class ENEMScrapingPipeline:
             if doc_id and chunks:
                 result = self.database.insert_chunks(chunks, doc_id)
                 self.stats["chunks_created"] += result["inserted"]
+                for key in ("inserted", "skipped", "errors"):
+                    CRAWL_CHUNKS.inc(result[key], result=key)
+
+                # Entidades de tabela alimentam o fast-path extrativo do agente
+                if self.entity_index.add_chunks(chunks, doc_id, result.get("ids")):
+                    self.entity_index.save()
 
             self.url_manager.mark_visited(url)
+            self.http_client.commit_validators(url, response, page_data.get("links", []))
             self.stats["documents_processed"] += 1
 
             print("✓ Página ENEM processada com sucesso")
@@ -143,6 +249,17 @@ class ENEMScrapingPipeline:
             print(f"Erro processando página ENEM: {e}")
             return False
 
+    def _skip_unchanged(self, url: str, response: Dict[str, Any]) -> bool:
+        links = response["validators"].get("links", [])
+        for link in links:
+            self.url_manager.add_pending_url(link)
+        self.url_manager.mark_visited(url)
+        # Mesmo conteúdo com ETag/Last-Modified novos: atualiza os validadores
+        self.http_client.commit_validators(url, response, links)
+        self.stats["pages_unchanged"] += 1
+        print("✓ Página sem alterações desde a última coleta")
+        return True
+
     # =============================
     # DOCUMENTOS INCORPORADOS
     # =============================
@@ -204,6 +321,7 @@ class ENEMScrapingPipeline:
         print("=" * 60)
         print(f"Tempo total: {elapsed:.1f}s")
         print(f"Páginas processadas: {self.stats['pages_processed']}")
+        print(f"Páginas sem alterações: {self.stats['pages_unchanged']}")
         print(f"Documentos processados: {self.stats['documents_processed']}")
         print(f"Chunks criados: {self.stats['chunks_created']}")
         print(f"Erros: {self.stats['errors']}")
@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Iterable, Optional
+
+from django.dispatch import Signal
+
+# Enviado quando a ingestão altera documentos/chunks.
+# kwargs: document_ids (list), chunk_ids (list), reason (str),
+#         documents (list de {id, title, source, url}, quando conhecidos)
+corpus_changed = Signal()
+
+JOURNAL_MAX_BYTES = 1024 * 1024
+POLL_INTERVAL = 1.0
+
+_lock = threading.Lock()
+_journal_offset: Optional[int] = None
+_journal_generation: Optional[str] = None
+_journal_stat: Optional[tuple] = None
+_polled_at = 0.0
+
+
+def _journal_path() -> Optional[str]:
+    try:
+        from django.conf import settings
+        return getattr(settings, "CHANGE_JOURNAL_PATH", None) or None
+    except Exception:
+        return None
+
+
+def publish_change(document_ids: Iterable = (), chunk_ids: Iterable = (), reason: str = "",
+                   documents: Iterable[dict] = ()):
+    """
+    Publica uma alteração do corpus.
+
+    No próprio processo, dispara corpus_changed imediatamente. Para os workers
+    web (outros processos), acrescenta o evento ao journal compartilhado em
+    CHANGE_JOURNAL_PATH, que cada worker lê em poll_changes().
+    """
+    event = {
+        "ts": time.time(),
+        "pid": os.getpid(),
+        "reason": reason,
+        "document_ids": [d for d in document_ids if d is not None],
+        "chunk_ids": [c for c in chunk_ids if c is not None],
+        "documents": list(documents),
+    }
+    if not event["document_ids"] and not event["chunk_ids"]:
+        return
+
+    corpus_changed.send(sender=reason or "local", document_ids=event["document_ids"],
+                        chunk_ids=event["chunk_ids"], reason=reason, documents=event["documents"])
+
+    path = _journal_path()
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) > JOURNAL_MAX_BYTES:
+            # Rotação por rename (o arquivo nunca é truncado no lugar): os
+            # leitores percebem a geração nova e terminam de ler o antigo em .1
+            os.replace(path, _rotated_path(path))
+        _create_journal(path)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event) + "\n")
+    except Exception as e:
+        print(f"Erro gravando journal de alterações: {e}")
+
+
+def _rotated_path(path: str) -> str:
+    return path + ".1"
+
+
+def _create_journal(path: str):
+    """Cria o journal com o cabeçalho de geração, se ainda não existir"""
+    try:
+        with open(path, "x", encoding="utf-8") as f:
+            f.write(json.dumps({"generation": uuid.uuid4().hex}) + "\n")
+    except FileExistsError:
+        pass
+
+
+def _read_generation(path: str) -> Optional[str]:
+    """Geração do journal (primeira linha); None para journals sem cabeçalho"""
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.readline()
+    try:
+        return json.loads(first).get("generation")
+    except (ValueError, AttributeError):
+        return None
+
+
+def _read_lines(path: str, offset: int):
+    """Linhas completas a partir de offset; retorna (linhas, novo offset)"""
+    with open(path, "r", encoding="utf-8") as f:
+        f.seek(offset)
+        lines = f.readlines()
+        offset = f.tell()
+    if lines and not lines[-1].endswith("\n"):
+        # Linha ainda sendo escrita: reler na próxima vez
+        offset -= len(lines.pop().encode("utf-8"))
+    return lines, offset
+
+
+def poll_changes(force: bool = False):
+    """
+    Aplica eventos novos do journal (no máximo uma leitura por POLL_INTERVAL).
+    Custa um stat() quando não há nada novo.
+    """
+    global _journal_offset, _journal_generation, _journal_stat, _polled_at
+    path = _journal_path()
+    if not path:
+        return
+
+    now = time.time()
+    if not force and now - _polled_at < POLL_INTERVAL:
+        return
+
+    with _lock:
+        _polled_at = now
+        try:
+            stat = os.stat(path)
+            signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            if _journal_offset is not None and signature == _journal_stat:
+                return
+            generation = _read_generation(path)
+        except OSError:
+            return
+        size = stat.st_size
+        _journal_stat = signature
+
+        if _journal_offset is None:
+            # Primeiro poll do processo: o cache está vazio, só marcar a posição
+            _journal_offset, _journal_generation = size, generation
+            return
+
+        lines = []
+        if generation != _journal_generation:
+            # Journal rotacionado: o arquivo que estávamos lendo agora é o .1
+            try:
+                rotated = _rotated_path(path)
+                if _read_generation(rotated) != _journal_generation:
+                    raise OSError("journal rotacionado mais de uma vez")
+                lines, _ = _read_lines(rotated, _journal_offset)
+            except OSError:
+                # Eventos perdidos entre duas rotações: descarta todo o cache
+                corpus_changed.send(sender="journal", document_ids=[], chunk_ids=[], reason="flush_all")
+            _journal_offset, _journal_generation = 0, generation
+        elif size < _journal_offset:
+            # Truncado por fora da rotação
+            _journal_offset = 0
+            corpus_changed.send(sender="journal", document_ids=[], chunk_ids=[], reason="flush_all")
+
+        new_lines, _journal_offset = _read_lines(path, _journal_offset)
+        lines += new_lines
+
+    pid = os.getpid()
+    for line in lines:
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if "generation" in event or event.get("pid") == pid:
+            continue  # cabeçalho, ou já aplicado localmente em publish_change
+        corpus_changed.send(sender="journal", document_ids=event.get("document_ids", []),
+                            chunk_ids=event.get("chunk_ids", []), reason=event.get("reason", ""),
+                            documents=event.get("documents", []))
@@ -0,0 +1,170 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .chunk_selector import parse_embedding
+
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+# Colunas exportadas de cada tabela (embedding vai para o .npz, não para o JSONL)
+DOCUMENT_COLUMNS = ["id", "title", "source", "url", "url_norm", "created_at"]
+CHUNK_COLUMNS = ["id", "document_id", "chunk_text", "chunk_hash", "embedding_model", "metadata", "created_at"]
+
+TABLES = ("documents", "document_chunks")
+
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _atomic_write_bytes(path: str, data: bytes):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class SnapshotManifest:
+    """
+    Manifesto de um snapshot do índice (documents + document_chunks).
+
+    Cada tabela é exportada em shards (uma página cada); o manifesto registra
+    arquivos, linhas, último id e sha256 de cada shard. É regravado de forma
+    atômica após cada shard, o que permite retomar uma exportação interrompida.
+    """
+
+    def __init__(self, directory: str, data: Optional[Dict[str, Any]] = None):
+        self.directory = directory
+        self.data = data or {
+            "version": SNAPSHOT_VERSION,
+            "created_at": time.time(),
+            "completed_at": None,
+            "embedding_dim": None,
+            "tables": {t: {"shards": [], "rows": 0, "complete": False} for t in TABLES},
+        }
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["SnapshotManifest"]:
+        path = os.path.join(directory, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Versão de snapshot não suportada: {data.get('version')}")
+        return cls(directory, data)
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        payload = json.dumps(self.data, indent=2, ensure_ascii=False).encode("utf-8")
+        _atomic_write_bytes(os.path.join(self.directory, MANIFEST_FILE), payload)
+
+    def table(self, name: str) -> Dict[str, Any]:
+        return self.data["tables"][name]
+
+    def last_id(self, name: str) -> int:
+        shards = self.table(name)["shards"]
+        return shards[-1]["last_id"] if shards else 0
+
+    def add_shard(self, name: str, shard: Dict[str, Any]):
+        table = self.table(name)
+        table["shards"].append(shard)
+        table["rows"] += shard["rows"]
+        self.save()
+
+    def mark_complete(self, name: str):
+        self.table(name)["complete"] = True
+        if all(self.table(t)["complete"] for t in TABLES):
+            self.data["completed_at"] = time.time()
+        self.save()
+
+    @property
+    def complete(self) -> bool:
+        return self.data.get("completed_at") is not None
+
+    def verify(self) -> List[str]:
+        """Retorna a lista de arquivos ausentes ou com checksum divergente"""
+        problems = []
+        for name in TABLES:
+            for shard in self.table(name)["shards"]:
+                for key in ("file", "vectors_file"):
+                    filename = shard.get(key)
+                    if not filename:
+                        continue
+                    path = os.path.join(self.directory, filename)
+                    if not os.path.exists(path):
+                        problems.append(f"{filename}: ausente")
+                    elif sha256_file(path) != shard["sha256"][key]:
+                        problems.append(f"{filename}: checksum divergente")
+        return problems
+
+
+def write_shard(directory: str, table: str, index: int, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Grava um shard: linhas em JSONL gzip e, para chunks, embeddings em .npz
+    (matriz float32 alinhada às linhas + ids). Retorna a entrada do manifesto.
+    """
+    base = f"{table}-{index:05d}"
+    shard: Dict[str, Any] = {"rows": len(rows), "last_id": rows[-1]["id"], "sha256": {}}
+
+    columns = CHUNK_COLUMNS if table == "document_chunks" else DOCUMENT_COLUMNS
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) as gz:
+        for row in rows:
+            gz.write(json.dumps({c: row.get(c) for c in columns}, ensure_ascii=False).encode("utf-8"))
+            gz.write(b"\n")
+    shard["file"] = f"{base}.jsonl.gz"
+    _atomic_write_bytes(os.path.join(directory, shard["file"]), buffer.getvalue())
+    shard["sha256"]["file"] = hashlib.sha256(buffer.getvalue()).hexdigest()
+
+    if table == "document_chunks":
+        vectors = [parse_embedding(r.get("embedding")) for r in rows]
+        dim = next((len(v) for v in vectors if v), 0)
+        matrix = np.zeros((len(rows), dim), dtype=np.float32)
+        has_embedding = np.zeros(len(rows), dtype=bool)
+        for i, v in enumerate(vectors):
+            if v and len(v) == dim:
+                matrix[i] = v
+                has_embedding[i] = True
+        npz = io.BytesIO()
+        np.savez_compressed(npz, ids=np.array([r["id"] for r in rows], dtype=np.int64),
+                            embeddings=matrix, has_embedding=has_embedding)
+        shard["vectors_file"] = f"{base}.npz"
+        shard["dim"] = dim
+        _atomic_write_bytes(os.path.join(directory, shard["vectors_file"]), npz.getvalue())
+        shard["sha256"]["vectors_file"] = hashlib.sha256(npz.getvalue()).hexdigest()
+
+    return shard
+
+
+def read_shard(directory: str, shard: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Lê um shard; linhas de chunks voltam com "embedding" (lista) ou None"""
+    with gzip.open(os.path.join(directory, shard["file"]), "rt", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    if shard.get("vectors_file"):
+        with np.load(os.path.join(directory, shard["vectors_file"])) as npz:
+            ids, embeddings, has_embedding = npz["ids"], npz["embeddings"], npz["has_embedding"]
+            for i, row in enumerate(rows):
+                if int(ids[i]) != row["id"]:
+                    raise ValueError(f"Shard {shard['file']}: ids desalinhados na linha {i}")
+                row["embedding"] = embeddings[i].tolist() if has_embedding[i] else None
+    return rows
+
+
+def iter_shards(manifest: SnapshotManifest, table: str) -> Iterator[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    for shard in manifest.table(table)["shards"]:
+        yield shard, read_shard(manifest.directory, shard)
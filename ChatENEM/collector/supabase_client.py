@@ -3,8 +3,14 @@ import json
 from django.conf import settings
 from typing import List, Dict, Optional
 
+from .signals import publish_change
+
+# Sessão compartilhada entre instâncias: mantém o pool de conexões com o Supabase
+_session = requests.Session()
+
 class SupabaseClient:
     def __init__(self):
+        self.session = _session
         self.url = settings.SUPABASE_URL
         self.key = settings.SUPABASE_KEY
         self.headers = {
@@ -152,15 +158,37 @@ class SupabaseClient:
             return [item["chunk_hash"] for item in response.json()]
         return []
     
-    def search_chunks(self, query_embedding: List[float], match_count: int = 5) -> List[Dict]:
+    def search_payload(self, query_embedding: List[float], match_count: int = 5,
+                       include_embedding: bool = False, filter: Optional[Dict] = None) -> Dict:
+        """
+        Corpo do RPC search_chunks (assinatura da migração 0002). ef_search só
+        é enviado com settings.SEARCH_EF_SEARCH > 0; senão vale o padrão da função.
+        """
+        payload = {"query_embedding": query_embedding, "match_count": match_count,
+                   "include_embedding": include_embedding, "filter": filter or {}}
+        if settings.SEARCH_EF_SEARCH > 0:
+            payload["ef_search"] = settings.SEARCH_EF_SEARCH
+        return payload
+
+    def search_chunks(self, query_embedding: List[float], match_count: int = 5,
+                      filter: Optional[Dict] = None) -> List[Dict]:
         """Busca chunks similares usando pgvector"""
-        response = requests.post(
+        response = self.session.post(
             f"{self.url}/rest/v1/rpc/search_chunks",
             headers=self.headers,
-            json={"query_embedding": query_embedding, "match_count": match_count}
+            json=self.search_payload(query_embedding, match_count, filter=filter)
         )
         return response.json() if response.status_code == 200 else []
 
+    def ping(self) -> bool:
+        """Abre (ou reaproveita) a conexão com o PostgREST; usado no warm-up"""
+        response = self.session.get(
+            f"{self.url}/rest/v1/documents?select=id&limit=1",
+            headers=self.headers,
+            timeout=10
+        )
+        return response.status_code == 200
+
     def delete_documents_with_url_substrings(self, substrings: List[str]) -> Dict:
         """Deleta documentos (e seus chunks) cujas URLs contenham qualquer uma das substrings.
 
@@ -196,4 +224,7 @@ class SupabaseClient:
             return {"deleted": deleted}
         except Exception as e:
             print(f"Erro durante exclusão: {e}")
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
+        finally:
+            if deleted:
+                publish_change(document_ids=[d.get('id') for d in deleted], reason="delete_documents")
\ No newline at end of file
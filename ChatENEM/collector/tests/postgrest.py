@@ -0,0 +1,135 @@
+"""
+Subconjunto mínimo da API do PostgREST sobre um Postgres real, para rodar
+os testes do backend PostgREST sem o servidor PostgREST: filtros eq, gt e
+in, select, order (por id) e limit, inserts e upserts (json_populate_recordset, como o
+PostgREST, com on_conflict e Prefer: resolution=...) e RPC com argumentos
+nomeados.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import psycopg
+from psycopg import sql
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+
+
+class PostgRESTStub:
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub._handle(self, "GET")
+
+            def do_POST(self):
+                stub._handle(self, "POST")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handle(self, request, method):
+        parsed = urlparse(request.path)
+        name = parsed.path.split("/rest/v1/", 1)[1]
+        query = dict(parse_qsl(parsed.query))
+        body = None
+        if method == "POST":
+            body = json.loads(request.rfile.read(int(request.headers.get("Content-Length") or 0)) or "null")
+        try:
+            with psycopg.connect(self.dsn, row_factory=dict_row, autocommit=True) as conn:
+                if name.startswith("rpc/"):
+                    status, rows = 200, self._rpc(conn, name[4:], body)
+                elif method == "GET":
+                    status, rows = 200, self._select(conn, name, query)
+                else:
+                    prefer = request.headers.get("Prefer") or ""
+                    rows = self._insert(conn, name, body, query.get("select", "*"),
+                                        query.get("on_conflict"), prefer)
+                    status = 201
+                    if "return=representation" not in prefer:
+                        rows = None
+        except psycopg.Error as e:
+            status, rows = 400, {"message": str(e)}
+
+        payload = b"" if rows is None else json.dumps(rows, default=str).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
+
+    @staticmethod
+    def _columns(select: str):
+        if select == "*":
+            return sql.SQL("*")
+        return sql.SQL(", ").join(sql.Identifier(c) for c in select.split(","))
+
+    def _select(self, conn, table, query):
+        select = query.pop("select", "*")
+        limit = query.pop("limit", None)
+        query.pop("order", None)  # sempre ORDER BY 1 (id)
+        where = []
+        for col, value in query.items():
+            if value.startswith("eq."):
+                where.append(sql.SQL("{}::text = {}").format(sql.Identifier(col), sql.Literal(value[3:])))
+            elif value.startswith("gt."):
+                where.append(sql.SQL("{} > {}").format(sql.Identifier(col), sql.Literal(int(value[3:]))))
+            elif value.startswith("in.("):
+                values = [sql.Literal(v) for v in value[4:-1].split(",") if v]
+                if not values:
+                    return []
+                where.append(sql.SQL("{}::text IN ({})").format(sql.Identifier(col), sql.SQL(", ").join(values)))
+        statement = sql.SQL("SELECT {} FROM {}").format(self._columns(select), sql.Identifier(table))
+        if where:
+            statement += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(where)
+        statement += sql.SQL(" ORDER BY 1")
+        if limit:
+            statement += sql.SQL(" LIMIT {}").format(sql.Literal(int(limit)))
+        return conn.execute(statement).fetchall()
+
+    def _insert(self, conn, table, body, select, on_conflict=None, prefer=""):
+        rows = body if isinstance(body, list) else [body]
+        columns = list(rows[0])
+        conflict = sql.SQL("")
+        if on_conflict:
+            target = sql.SQL(", ").join(sql.Identifier(c) for c in on_conflict.split(","))
+            if "resolution=ignore-duplicates" in prefer:
+                conflict = sql.SQL(" ON CONFLICT ({}) DO NOTHING").format(target)
+            else:
+                updates = sql.SQL(", ").join(
+                    sql.SQL("{0} = excluded.{0}").format(sql.Identifier(c)) for c in columns)
+                conflict = sql.SQL(" ON CONFLICT ({}) DO UPDATE SET {}").format(target, updates)
+        statement = sql.SQL(
+            "INSERT INTO {table} ({columns}) SELECT {columns} "
+            "FROM json_populate_recordset(NULL::{table}, %s){conflict} RETURNING {select}"
+        ).format(table=sql.Identifier(table), columns=sql.SQL(", ").join(sql.Identifier(c) for c in columns),
+                 conflict=conflict, select=self._columns(select))
+        return conn.execute(statement, (json.dumps(rows),)).fetchall()
+
+    def _rpc(self, conn, function, args):
+        params, values = [], []
+        for key, value in (args or {}).items():
+            if isinstance(value, list):
+                params.append(sql.SQL("{} => %s::vector").format(sql.Identifier(key)))
+                values.append(json.dumps(value))
+            elif isinstance(value, dict):
+                params.append(sql.SQL("{} => %s").format(sql.Identifier(key)))
+                values.append(Jsonb(value))
+            else:
+                params.append(sql.SQL("{} => %s").format(sql.Identifier(key)))
+                values.append(value)
+        statement = sql.SQL("SELECT * FROM {}({})").format(sql.Identifier(function), sql.SQL(", ").join(params))
+        return conn.execute(statement, values).fetchall()
@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from collector import agent
+from collector.answer_cache import answer_cache
+
+QUESTION = "Quando começam as inscrições do ENEM?"
+CHUNKS = [{"id": "c1", "document_id": 1, "chunk_text": "Inscrições de 27 de maio a 7 de junho."}]
+TIER = SimpleNamespace(name="small", backend="openrouter", models=["modelo-a", "modelo-b"],
+                       max_tokens=512, timeout=10)
+
+
+def completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+class AnswerWithTitleTests(SimpleTestCase):
+    def setUp(self):
+        answer_cache.clear()
+        self.addCleanup(answer_cache.clear)
+        self.backend = mock.Mock()
+        route = SimpleNamespace(name="rag", k=5, confidence=1.0, reply=None)
+        patches = [
+            mock.patch.object(agent, "route_question", return_value=route),
+            mock.patch.object(agent, "poll_changes"),
+            mock.patch.object(agent, "_retrieve", return_value=(CHUNKS, [0.9])),
+            mock.patch.object(agent, "select_chunks", side_effect=lambda c, s, max_k: (c, s)),
+            mock.patch.object(agent, "compress_chunks", side_effect=lambda q, c, **kw: c),
+            mock.patch.object(agent, "document_metadata", return_value={"title": "Edital"}),
+            mock.patch.object(agent, "tier_plan", return_value=[TIER]),
+            mock.patch.object(agent, "get_backend", return_value=self.backend),
+            mock.patch.object(agent, "get_query_log", return_value=None),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_combined_output_yields_title_and_answer(self):
+        self.backend.create.return_value = completion(
+            '{"title": "Datas de inscrição do ENEM.", "answer": "De 27 de maio a 7 de junho."}')
+        result = agent.answer_question(QUESTION, with_title=True)
+        self.assertEqual(result["answer"], "De 27 de maio a 7 de junho.")
+        self.assertEqual(result["title"], "Datas de inscrição do ENEM")
+        self.assertEqual(self.backend.create.call_count, 1)
+
+    def test_invalid_json_is_retried_without_json_mode(self):
+        self.backend.create.side_effect = [
+            completion('{"title": "Inscrições", "answer": "De 27 de maio a'),
+            completion("De 27 de maio a 7 de junho."),
+        ]
+        result = agent.answer_question(QUESTION, with_title=True)
+
+        self.assertEqual(result["answer"], "De 27 de maio a 7 de junho.")
+        self.assertNotIn("title", result)
+        retry = self.backend.create.call_args_list[1].kwargs
+        self.assertNotIn("response_format", retry)
+        self.assertEqual(retry["messages"][0]["content"], agent.SYSTEM_PROMPT)
+        # O que ficou no cache é a resposta refeita, nunca o JSON bruto
+        cached = agent.answer_question(QUESTION)
+        self.assertEqual(cached["answer"], "De 27 de maio a 7 de junho.")
+        self.assertEqual(self.backend.create.call_count, 2)
+
+    def test_unavailable_answer_is_not_cached(self):
+        self.backend.create.side_effect = [
+            completion("não é JSON"), RuntimeError("fora do ar"), RuntimeError("fora do ar"),
+        ]
+        result = agent.answer_question(QUESTION, with_title=True)
+        self.assertFalse(result["found_context"])
+        self.assertNotIn("JSON", result["answer"])
+        self.assertIsNone(answer_cache.get(f"{agent.normalize_question(QUESTION)}|k=5"))
+
+
+class TitleGeneratorTests(SimpleTestCase):
+    def test_invalid_titles_fall_through_to_next_model(self):
+        from collector import title_generator as module
+        backend = mock.Mock()
+        backend.create.side_effect = [
+            completion("Este é um título longo demais para as regras de oito palavras"),
+            completion('Título: "Isenção da taxa do ENEM."'),
+        ]
+        with mock.patch.object(module, "get_backend", return_value=backend), \
+                mock.patch.object(module, "local_tier", return_value=None):
+            self.assertEqual(module.title_generator(QUESTION), "Isenção da taxa do ENEM")
+        self.assertEqual(backend.create.call_count, 2)
+
+    def test_no_valid_title_returns_empty(self):
+        from collector import title_generator as module
+        backend = mock.Mock()
+        backend.create.return_value = completion("")
+        with mock.patch.object(module, "get_backend", return_value=backend), \
+                mock.patch.object(module, "local_tier", return_value=None):
+            self.assertEqual(module.title_generator(QUESTION), "")
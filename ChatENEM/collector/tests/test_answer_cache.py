@@ -0,0 +1,69 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from collector import answer_cache as cache_module
+from collector.answer_cache import (
+    CORPUS_TAG,
+    TaggedCache,
+    chunk_tag,
+    document_tag,
+    normalize_question,
+    tags_for_chunks,
+)
+from collector.signals import corpus_changed, publish_change
+
+CHUNKS = [{"id": 11, "document_id": 1}, {"id": 12, "document_id": 2}]
+
+
+class TaggedCacheTests(SimpleTestCase):
+    def test_only_dependent_entries_are_invalidated(self):
+        cache = TaggedCache()
+        cache.set("inscricao", "resposta 1", tags_for_chunks(CHUNKS))
+        cache.set("redacao", "resposta 2", tags_for_chunks([{"id": 30, "document_id": 3}]))
+        cache.set("sem contexto", "resposta 3", tags_for_chunks([]))
+
+        self.assertEqual(cache.invalidate_tags({document_tag(2), CORPUS_TAG}), 2)
+        self.assertIsNone(cache.get("inscricao"))
+        self.assertIsNone(cache.get("sem contexto"))
+        self.assertEqual(cache.get("redacao"), "resposta 2")
+        self.assertEqual(cache.invalidate_tags({chunk_tag(30), document_tag(3)}), 1)
+        self.assertEqual(cache._by_tag, {})
+
+    def test_ttl_and_lru(self):
+        cache = TaggedCache(max_entries=2, ttl_seconds=60)
+        with mock.patch("time.time", return_value=1000.0):
+            cache.set("a", 1, {"doc:1"})
+            cache.set("b", 2, {"doc:1"}, ttl_seconds=5)
+            cache.get("a")
+            cache.set("c", 3, {"doc:2"})
+            self.assertIsNone(cache.get("b"))
+        with mock.patch("time.time", return_value=1010.0):
+            self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        with mock.patch("time.time", return_value=1100.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache._by_tag, {"doc:2": {"c"}})
+
+    def test_question_normalization(self):
+        self.assertEqual(normalize_question("  Quando é a INSCRIÇÃO do ENEM?! "), "quando e a inscricao do enem")
+
+
+@override_settings(CHANGE_JOURNAL_PATH="")
+class IngestionInvalidationTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = TaggedCache()
+        patcher = mock.patch.object(cache_module, "answer_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache.set("inscricao", "resposta", tags_for_chunks(CHUNKS))
+        self.cache.set("redacao", "resposta", tags_for_chunks([{"id": 30, "document_id": 3}]))
+        self.cache.set("sem contexto", "resposta", tags_for_chunks([]))
+
+    def test_ingestion_write_invalidates_dependents_and_no_context_answers(self):
+        publish_change(document_ids=[1], chunk_ids=[40], reason="insert_chunks")
+        self.assertEqual(set(self.cache._entries), {"redacao"})
+
+    def test_flush_all_clears_everything(self):
+        corpus_changed.send(sender="journal", document_ids=[], chunk_ids=[], reason="flush_all")
+        self.assertEqual(len(self.cache), 0)
+
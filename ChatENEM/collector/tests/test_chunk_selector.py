@@ -0,0 +1,47 @@
+from django.test import SimpleTestCase
+
+from collector.chunk_selector import elbow_cutoff, parse_embedding, select_chunks
+
+
+def chunk(chunk_id, text="", embedding=None):
+    return {"id": chunk_id, "chunk_text": text, "embedding": embedding}
+
+
+class ElbowCutoffTests(SimpleTestCase):
+    def test_cuts_at_largest_significant_drop(self):
+        self.assertEqual(elbow_cutoff([0.91, 0.89, 0.88, 0.52, 0.50, 0.49], max_k=6), 3)
+
+    def test_flat_scores_keep_max_k(self):
+        self.assertEqual(elbow_cutoff([0.80, 0.79, 0.78, 0.77, 0.76], max_k=4), 4)
+
+    def test_respects_min_k(self):
+        self.assertEqual(elbow_cutoff([0.9, 0.85, 0.3, 0.29], max_k=4, min_k=2), 2)
+        # Queda antes de min_k não conta como cotovelo
+        self.assertEqual(elbow_cutoff([0.9, 0.3, 0.29, 0.28], max_k=4, min_k=2), 4)
+        self.assertEqual(elbow_cutoff([0.9], max_k=5), 1)
+
+
+class SelectChunksTests(SimpleTestCase):
+    def test_near_duplicates_are_replaced(self):
+        chunks = [chunk(1, embedding=[1.0, 0.0, 0.0]), chunk(2, embedding=[0.999, 0.01, 0.0]),
+                  chunk(3, embedding=[0.0, 1.0, 0.0]), chunk(4, embedding=[0.0, 0.0, 1.0])]
+        selected, scores = select_chunks(chunks, [0.90, 0.89, 0.88, 0.87], max_k=3)
+        self.assertEqual([c["id"] for c in selected], [1, 3, 4])
+        self.assertEqual(scores, [0.90, 0.88, 0.87])
+
+    def test_lexical_similarity_without_embeddings(self):
+        text = "As inscrições do ENEM vão de 27 de maio a 7 de junho pela Página do Participante"
+        chunks = [chunk(1, text), chunk(2, text + "."), chunk(3, "A taxa de inscrição é de 85 reais")]
+        selected, _ = select_chunks(chunks, [0.9, 0.89, 0.88], max_k=2)
+        self.assertEqual([c["id"] for c in selected], [1, 3])
+
+    def test_irrelevant_tail_is_dropped(self):
+        chunks = [chunk(i, embedding=[float(i == j) for j in range(5)]) for i in range(5)]
+        selected, _ = select_chunks(chunks, [0.9, 0.88, 0.4, 0.39, 0.38], max_k=5)
+        self.assertEqual([c["id"] for c in selected], [0, 1])
+
+    def test_empty_and_embedding_parsing(self):
+        self.assertEqual(select_chunks([], [], max_k=5), ([], []))
+        self.assertEqual(parse_embedding("[0.5, 1]"), [0.5, 1.0])
+        self.assertIsNone(parse_embedding("não é vetor"))
+        self.assertIsNone(parse_embedding([]))
@@ -0,0 +1,55 @@
+from django.test import SimpleTestCase
+
+from collector.context_compressor import GAP_MARKER, compress_chunks, split_sentences
+
+FILLER = [
+    "O exame é organizado pelo Inep desde 1998 e serve de porta de entrada para universidades públicas.",
+    "A aplicação acontece em dois domingos, com provas objetivas e uma redação dissertativa.",
+    "Os portões abrem ao meio-dia e fecham às 13h, no horário de Brasília, sem tolerância.",
+    "O participante deve levar caneta esferográfica de tinta preta fabricada em material transparente.",
+]
+ANSWER = "A taxa de inscrição custa R$ 85,00 e o boleto deve ser pago até 14 de junho."
+
+
+def long_chunk(sentences, **extra):
+    return {"id": 7, "document_id": 3, "chunk_text": " ".join(sentences), "metadata": {}, **extra}
+
+
+class CompressChunksTests(SimpleTestCase):
+    def test_keeps_relevant_sentence_and_marks_gaps(self):
+        chunk = long_chunk(FILLER[:2] + [ANSWER] + FILLER[2:])
+        [compressed] = compress_chunks("Qual o valor da taxa de inscrição?", [chunk])
+        text = compressed["chunk_text"]
+        self.assertIn(ANSWER, text)
+        self.assertLess(len(text), len(chunk["chunk_text"]) * 0.75)
+        self.assertTrue(text.startswith(GAP_MARKER.lstrip()))
+        self.assertEqual((compressed["id"], compressed["document_id"]), (7, 3))
+        self.assertEqual(chunk["chunk_text"], " ".join(FILLER[:2] + [ANSWER] + FILLER[2:]))
+
+    def test_inflected_terms_match(self):
+        chunk = long_chunk(FILLER + ["As inscrições terminam em 7 de junho."])
+        [compressed] = compress_chunks("até quando vai a inscrição?", [chunk])
+        self.assertIn("As inscrições terminam em 7 de junho.", compressed["chunk_text"])
+
+    def test_section_header_is_kept(self):
+        chunk = long_chunk(FILLER + [ANSWER])
+        chunk["chunk_text"] = "Edital > Taxa de inscrição\n" + chunk["chunk_text"]
+        chunk["metadata"] = {"context": "Edital > Taxa de inscrição"}
+        [compressed] = compress_chunks("Qual o valor do boleto?", [chunk])
+        self.assertTrue(compressed["chunk_text"].startswith("Edital > Taxa de inscrição\n"))
+        self.assertIn(ANSWER, compressed["chunk_text"])
+
+    def test_short_chunks_and_table_entities_are_untouched(self):
+        short = {"id": 1, "chunk_text": ANSWER, "metadata": {}}
+        table = long_chunk(FILLER + [ANSWER], metadata={"type": "table_entity"})
+        self.assertEqual(compress_chunks("taxa", [short, table]), [short, table])
+
+    def test_without_common_terms_keeps_the_beginning(self):
+        chunk = long_chunk(FILLER + [ANSWER])
+        [compressed] = compress_chunks("xyz", [chunk])
+        self.assertTrue(compressed["chunk_text"].startswith(FILLER[0]))
+        self.assertTrue(compressed["chunk_text"].endswith(GAP_MARKER.rstrip()))
+
+    def test_split_sentences(self):
+        self.assertEqual(split_sentences("Primeira frase. Segunda: 2025.\n• item"),
+                         ["Primeira frase.", "Segunda:", "2025.", "• item"])
@@ -0,0 +1,112 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from collector import conversation_store as store_module
+from collector.conversation_store import ConversationStore, condense_query, is_follow_up
+from collector.signals import corpus_changed
+
+CHUNKS = [{"id": 11, "document_id": 1, "chunk_text": "Nota mínima do SISU"},
+          {"id": 12, "document_id": 2, "chunk_text": "Nota da redação"}]
+
+
+class ConversationStoreTests(SimpleTestCase):
+    def test_follow_up_keeps_cached_pool(self):
+        store = ConversationStore()
+        store.record_turn("c1", "Qual a nota mínima do SISU?", CHUNKS, [0.9, 0.8], [0.1, 0.2], 20)
+        state = store.record_turn("c1", "e para a redação?")
+        self.assertEqual(state.chunk_ids, [11, 12])
+        self.assertEqual(state.match_count, 20)
+        self.assertEqual(state.questions, ["Qual a nota mínima do SISU?", "e para a redação?"])
+
+    def test_expiry_and_lru_eviction(self):
+        store = ConversationStore(max_sessions=2, ttl_seconds=60)
+        with mock.patch("time.time", return_value=1000.0):
+            store.record_turn("a", "pergunta a")
+            store.record_turn("b", "pergunta b")
+            store.get("a")
+            store.record_turn("c", "pergunta c")
+        with mock.patch("time.time", return_value=1030.0):
+            self.assertIsNone(store.get("b"))
+            self.assertIsNotNone(store.get("a"))
+        with mock.patch("time.time", return_value=1100.0):
+            self.assertIsNone(store.get("c"))
+
+    def test_only_questions_are_capped(self):
+        store = ConversationStore(max_turns=2)
+        for question in ("um", "dois", "três"):
+            state = store.record_turn("c1", question)
+        self.assertEqual(state.questions, ["dois", "três"])
+
+    def test_changed_corpus_drops_affected_pools(self):
+        store = ConversationStore()
+        store.record_turn("c1", "Nota mínima do SISU?", CHUNKS, [0.9, 0.8])
+        store.record_turn("c2", "Taxa de inscrição?", [{"id": 30, "document_id": 3}], [0.9])
+        self.assertEqual(store.invalidate(document_ids=[2]), 1)
+        self.assertEqual(store.get("c1").chunks, [])
+        self.assertEqual(store.get("c2").chunk_ids, [30])
+        self.assertEqual(store.invalidate(chunk_ids=[30]), 1)
+
+    def test_corpus_changed_signal_reaches_global_store(self):
+        store = ConversationStore()
+        with mock.patch.object(store_module, "conversation_store", store):
+            store.record_turn("c1", "Nota mínima do SISU?", CHUNKS, [0.9, 0.8])
+            store.record_turn("c2", "Taxa de inscrição?")
+            corpus_changed.send(sender="local", document_ids=[1], chunk_ids=[], reason="ingest")
+            self.assertEqual(store.get("c1").chunks, [])
+            corpus_changed.send(sender="journal", document_ids=[], chunk_ids=[], reason="flush_all")
+            self.assertEqual(len(store), 0)
+
+
+class CondenseQueryTests(SimpleTestCase):
+    def test_follow_up_is_anchored_on_last_self_contained_question(self):
+        store = ConversationStore()
+        store.record_turn("c1", "Qual a nota mínima do SISU para medicina?")
+        state = store.record_turn("c1", "e para direito?")
+        self.assertEqual(condense_query("e para a redação?", state),
+                         "Qual a nota mínima do SISU para medicina? e para a redação?")
+
+    def test_self_contained_question_is_unchanged(self):
+        state = ConversationStore().record_turn("c1", "Qual a nota mínima do SISU?")
+        question = "Quando sai o resultado do ENEM deste ano para os treineiros?"
+        self.assertFalse(is_follow_up(question))
+        self.assertEqual(condense_query(question, state), question)
+        self.assertEqual(condense_query("e a redação?", None), "e a redação?")
+
+
+class RetrieveTests(SimpleTestCase):
+    def setUp(self):
+        from collector import agent
+        self.agent = agent
+        self.store = ConversationStore()
+        self.embeddings = {}
+        pool = [{**c, "embedding": [1.0, 0.0]} for c in CHUNKS]
+        patches = [
+            mock.patch.object(agent, "conversation_store", self.store),
+            mock.patch.object(agent, "embed_batch", side_effect=lambda texts: [self.embeddings[texts[0]]]),
+            mock.patch.object(agent, "_search_by_embedding", return_value=(pool, [0.9, 0.8])),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_close_follow_up_reuses_pool_without_search(self):
+        self.embeddings = {"Qual a nota mínima do SISU para medicina?": [1.0, 0.0],
+                           "Qual a nota mínima do SISU para medicina? e para a redação?": [0.99, 0.05]}
+        self.agent._retrieve("Qual a nota mínima do SISU para medicina?", 15, "c1")
+        chunks, scores = self.agent._retrieve("e para a redação?", 15, "c1")
+        self.assertEqual([c["id"] for c in chunks], [11, 12])
+        self.assertEqual(self.agent._search_by_embedding.call_count, 1)
+        # Scores refeitos contra o embedding da pergunta condensada
+        self.assertAlmostEqual(scores[0], 0.99 / (0.99 ** 2 + 0.05 ** 2) ** 0.5)
+
+    def test_drifted_or_larger_question_searches_again(self):
+        self.embeddings = {"Qual a nota mínima do SISU para medicina?": [1.0, 0.0],
+                           "Qual a nota mínima do SISU para medicina? e a taxa de inscrição?": [0.0, 1.0]}
+        self.agent._retrieve("Qual a nota mínima do SISU para medicina?", 15, "c1")
+        self.agent._retrieve("e a taxa de inscrição?", 15, "c1")
+        self.assertEqual(self.agent._search_by_embedding.call_count, 2)
+
+        self.embeddings["Qual a nota mínima do SISU para medicina? e a redação?"] = [1.0, 0.0]
+        self.agent._retrieve("e a redação?", 30, "c1")
+        self.assertEqual(self.agent._search_by_embedding.call_count, 3)
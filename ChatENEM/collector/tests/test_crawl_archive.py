@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from collector.crawl_archive import CrawlArchive
+from collector.http_client import HTTPClient
+from collector.url_manager import URLManager
+from collector.validator_store import ValidatorStore, content_hash
+
+PAGE = "<html><body><h1>Inscrição ENEM</h1></body></html>".encode("utf-8")
+PDF = b"%PDF-1.4 edital"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    hits = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/robots.txt":
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.hits.append(self.path)
+        body = PDF if self.path.endswith(".pdf") else PAGE
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TempDirMixin:
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+
+class CrawlArchiveTests(TempDirMixin, SimpleTestCase):
+    def test_bodies_are_content_addressed(self):
+        archive = CrawlArchive(self.tmp, "record")
+        archive.record("https://inep.gov.br/a", "https://inep.gov.br/a", 200, {}, PAGE, "utf-8")
+        archive.record("https://inep.gov.br/b", "https://inep.gov.br/b", 200, {}, PAGE, "utf-8")
+        bodies = [f for _, _, files in os.walk(os.path.join(self.tmp, "bodies")) for f in files]
+        self.assertEqual(len(bodies), 1)
+        self.assertEqual(len(list(archive.iter_records())), 2)
+
+    def test_replay_serves_latest_record(self):
+        archive = CrawlArchive(self.tmp, "record")
+        archive.record("https://inep.gov.br/a", "https://inep.gov.br/a", 200, {}, b"v1", "utf-8")
+        archive.record("https://inep.gov.br/a", "https://inep.gov.br/a", 200, {}, b"v2", "utf-8")
+        replay = CrawlArchive(self.tmp, "replay")
+        self.assertEqual(replay.lookup("https://inep.gov.br/a")["body"], b"v2")
+        self.assertIsNone(replay.lookup("https://inep.gov.br/missing"))
+
+    def test_truncated_index_line_is_ignored(self):
+        archive = CrawlArchive(self.tmp, "record")
+        archive.record("https://inep.gov.br/a", "https://inep.gov.br/a", 200, {}, b"ok", "utf-8")
+        with open(archive.index_path, "a", encoding="utf-8") as f:
+            f.write('{"url": "https://inep.gov.br/b", "sha')
+        self.assertEqual([r["url"] for r in CrawlArchive(self.tmp, "replay").iter_records()],
+                         ["https://inep.gov.br/a"])
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            CrawlArchive(self.tmp, "rewrite")
+
+
+class HTTPClientRecordReplayTests(TempDirMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        _Handler.hits = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+
+    def test_replay_runs_offline_with_same_content(self):
+        recorder = HTTPClient(archive=CrawlArchive(self.tmp, "record"), max_retries=0)
+        page = recorder.fetch(self.base + "/enem")
+        document = recorder.fetch_bytes(self.base + "/edital.pdf")
+        recorder.close()
+
+        self.server.shutdown()
+        replayer = HTTPClient(archive=CrawlArchive(self.tmp, "replay"), max_retries=0)
+        self.assertEqual(replayer.fetch(self.base + "/enem")["content"], page["content"])
+        self.assertEqual(replayer.fetch_bytes(self.base + "/edital.pdf")["content"], document["content"])
+        self.assertEqual(replayer.fetch(self.base + "/outra")["status_code"], 0)
+        self.assertEqual(_Handler.hits, ["/enem", "/edital.pdf"])
+        self.assertIn("Inscrição", page["content"])
+
+
+class PipelineMixin(TempDirMixin):
+    """Pipeline com extração, chunking e banco falsos; só coleta e fronteira são reais"""
+    URL = "https://inep.gov.br/enem"
+
+    def make_pipeline(self, **kwargs):
+        from collector.scraping_pipeline import ENEMScrapingPipeline
+        pipeline = ENEMScrapingPipeline(
+            "http://supabase.invalid", "key",
+            checkpoint_file=os.path.join(self.tmp, "frontier.sqlite3"),
+            entity_index_file=os.path.join(self.tmp, "entity_index.json"),
+            validator_file=os.path.join(self.tmp, "validators.sqlite3"),
+            max_pages=5,
+            **kwargs,
+        )
+        pipeline.block_extractor = mock.Mock()
+        pipeline.block_extractor.extract_blocks.return_value = {
+            "url": self.URL, "title": "ENEM", "blocks": [], "links": []}
+        pipeline.semantic_processor = mock.Mock()
+        pipeline.semantic_processor.process_blocks_to_chunks.return_value = []
+        pipeline.database = mock.Mock()
+        pipeline.database.insert_document.return_value = 1
+        pipeline.database.get_stats.return_value = {"documents": 1, "chunks": 0}
+        return pipeline
+
+
+class PipelineReplayTests(PipelineMixin, SimpleTestCase):
+    def test_replay_reprocesses_pages_seen_while_recording(self):
+        archive_dir = os.path.join(self.tmp, "archive")
+        CrawlArchive(archive_dir, "record").record(self.URL, self.URL, 200, {}, PAGE, "utf-8")
+
+        # Estado deixado pela coleta que gravou o arquivo: URL visitada e
+        # validadores com o mesmo hash do corpo gravado
+        URLManager(os.path.join(self.tmp, "frontier.sqlite3")).mark_visited(self.URL)
+        ValidatorStore(os.path.join(self.tmp, "validators.sqlite3")).commit(
+            self.URL, None, None, content_hash(PAGE), [])
+
+        for _ in range(2):
+            pipeline = self.make_pipeline(archive_dir=archive_dir, archive_mode="replay")
+            stats = pipeline.run([self.URL])
+            self.assertEqual(stats["pages_processed"], 1)
+            self.assertEqual(stats["pages_unchanged"], 0)
+            pipeline.block_extractor.extract_blocks.assert_called_once()
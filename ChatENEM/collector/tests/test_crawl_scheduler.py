@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from collector.crawl_scheduler import ConcurrentFetcher, HostLimiter
+from collector.http_client import HTTPClient
+
+
+class HostLimiterTests(SimpleTestCase):
+    def test_requests_to_same_host_are_spaced(self):
+        limiter = HostLimiter(min_interval=0.05, max_connections=4)
+        starts = []
+
+        def request(url):
+            with limiter.slot(url):
+                starts.append(time.monotonic())
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            list(pool.map(request, ["https://inep.gov.br/a", "https://inep.gov.br/b", "https://INEP.gov.br/c"]))
+        starts.sort()
+        gaps = [b - a for a, b in zip(starts, starts[1:])]
+        self.assertTrue(all(gap >= 0.045 for gap in gaps), gaps)
+
+    def test_hosts_do_not_wait_for_each_other(self):
+        limiter = HostLimiter(min_interval=1.0)
+        started = time.monotonic()
+        for url in ("https://inep.gov.br/a", "https://gov.br/a", "https://mec.gov.br/a"):
+            with limiter.slot(url):
+                pass
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_connections_per_host_are_capped(self):
+        limiter = HostLimiter(min_interval=0.0, max_connections=2)
+        active, peak, lock = [0], [0], threading.Lock()
+
+        def request(_):
+            with limiter.slot("https://inep.gov.br/x"):
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            list(pool.map(request, range(6)))
+        self.assertEqual(peak[0], 2)
+
+    def test_robots_crawl_delay_raises_interval(self):
+        limiter = HostLimiter(min_interval=1.5, interval_for=lambda url: 10.0)
+        self.assertEqual(limiter.interval("https://inep.gov.br/a"), 10.0)
+        failing = HostLimiter(min_interval=1.5, interval_for=mock.Mock(side_effect=OSError("robots")))
+        self.assertEqual(failing.interval("https://inep.gov.br/a"), 1.5)
+
+
+class ConcurrentFetcherTests(SimpleTestCase):
+    def test_exceptions_become_error_responses(self):
+        client = mock.Mock()
+        client.fetch.side_effect = [{"status_code": 200, "content": "ok"}, RuntimeError("conexão recusada")]
+        fetcher = ConcurrentFetcher(client, HostLimiter(min_interval=0.0), workers=1)
+        self.addCleanup(fetcher.close)
+        ok = fetcher.submit("https://inep.gov.br/a").result()
+        failed = fetcher.submit("https://inep.gov.br/b").result()
+        self.assertEqual(ok["status_code"], 200)
+        self.assertEqual((failed["status_code"], failed["error"]), (0, "conexão recusada"))
+
+
+class HTTPClientSessionTests(SimpleTestCase):
+    def test_each_thread_gets_its_own_session(self):
+        client = HTTPClient(respect_robots=False)
+        main = client.session
+        self.assertIs(client.session, main)
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            sessions = list(pool.map(lambda _: (threading.get_ident(), client.session), range(30)))
+        by_thread = {}
+        for ident, session in sessions:
+            self.assertIs(by_thread.setdefault(ident, session), session)
+        self.assertNotIn(main, by_thread.values())
+        self.assertEqual(len(set(map(id, by_thread.values()))), len(by_thread))
+        self.assertIn("ChatENEM", main.headers["User-Agent"])
+
+        with mock.patch("requests.Session.close") as close:
+            client.close()
+        self.assertEqual(close.call_count, len(by_thread) + 1)
+        self.assertIsNot(client.session, main)
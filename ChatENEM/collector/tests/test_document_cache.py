@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from collector.document_cache import DocumentMetadataCache, document_metadata
+from collector.signals import corpus_changed
+
+DOCUMENTS = {
+    1: {"id": 1, "title": "Edital ENEM", "source": "inep", "url": "https://inep.gov.br/edital"},
+    2: {"id": 2, "title": "Cronograma", "source": "inep", "url": "https://inep.gov.br/cronograma"},
+}
+
+
+def fake_response(rows, status=200):
+    return SimpleNamespace(status_code=status, json=lambda: rows, text="")
+
+
+class FakeDocumentsAPI:
+    """Responde às consultas de documents que o cache faz via PostgREST"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.calls = []
+        self.fail = False
+        self.url = "http://supabase.test"
+        self.headers = {}
+        self.session = SimpleNamespace(get=self.get)
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls.append(url)
+        if self.fail:
+            return fake_response([], status=503)
+        if "id=eq." in url:
+            doc_id = int(url.split("id=eq.")[1])
+            return fake_response([self.documents[doc_id]] if doc_id in self.documents else [])
+        last_id = int(url.split("id=gt.")[1].split("&")[0])
+        return fake_response([d for i, d in sorted(self.documents.items()) if i > last_id])
+
+
+class DocumentMetadataCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.api = FakeDocumentsAPI(dict(DOCUMENTS))
+        patcher = mock.patch("collector.supabase_client.SupabaseClient", return_value=self.api)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = DocumentMetadataCache()
+
+    def test_loads_lazily_on_first_use(self):
+        self.assertFalse(self.cache.loaded)
+        self.assertEqual(self.cache.get(1)["title"], "Edital ENEM")
+        self.assertTrue(self.cache.loaded)
+        self.assertEqual(self.cache.get("2")["title"], "Cronograma")
+        self.assertEqual(len(self.api.calls), 2)  # carga paginada: uma página + página vazia
+
+    def test_miss_fetches_single_document_and_remembers_absence(self):
+        self.cache.ensure_loaded()
+        self.api.documents[3] = {"id": 3, "title": "Novo", "source": "inep", "url": None}
+        self.assertEqual(self.cache.get(3)["title"], "Novo")
+        self.assertIsNone(self.cache.get(99))
+        self.assertIsNone(self.cache.get(99))
+        calls = [c for c in self.api.calls if "id=eq." in c]
+        self.assertEqual(len(calls), 2)
+
+    def test_failed_load_is_retried_later(self):
+        self.api.fail = True
+        self.assertIsNone(self.cache.get(1))
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(len(self.api.calls), 1)
+
+        self.api.fail = False
+        with mock.patch("collector.document_cache.time.monotonic",
+                        return_value=self.cache._load_failed_at + DocumentMetadataCache.RETRY_SECONDS + 1):
+            self.assertEqual(self.cache.get(1)["title"], "Edital ENEM")
+
+    def test_search_join_takes_precedence(self):
+        chunk = {"document_id": 1, "documents": {"title": "Do join"}}
+        self.assertEqual(document_metadata(chunk)["title"], "Do join")
+
+
+class DocumentCacheSignalTests(SimpleTestCase):
+    def test_ingestion_updates_and_deletes(self):
+        from collector.document_cache import document_cache
+        self.addCleanup(setattr, document_cache, "loaded", document_cache.loaded)
+        document_cache.loaded = True
+        self.addCleanup(document_cache.remove, [42])
+
+        corpus_changed.send(sender="test", document_ids=[42], chunk_ids=[], reason="insert_document",
+                            documents=[{"id": 42, "title": "Manual do participante", "source": "inep"}])
+        self.assertEqual(document_cache.get(42)["title"], "Manual do participante")
+
+        corpus_changed.send(sender="test", document_ids=[42], chunk_ids=[], reason="delete_documents")
+        with mock.patch.object(document_cache, "_fetch_one", return_value=None):
+            self.assertIsNone(document_cache.get(42))
@@ -0,0 +1,98 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from collector import embedding
+from collector.embedding_service import MicroBatcher, make_server
+
+
+class FakeModel:
+    """Backend que registra cada chamada; o vetor codifica o texto e o modo"""
+
+    def __init__(self, gate=None):
+        self.calls = []
+        self.gate = gate
+
+    def __call__(self, texts, mode):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.calls.append((list(texts), mode))
+        return [[float(len(t)), 1.0 if mode == "query" else 0.0] for t in texts]
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def test_concurrent_requests_share_one_batch(self):
+        gate = threading.Event()
+        model = FakeModel(gate)
+        batcher = MicroBatcher(model, window_ms=200)
+        texts = [["a"], ["bb", "ccc"], ["dddd"]]
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(batcher.embed, t, "query") for t in texts]
+            gate.set()
+            results = [f.result(5) for f in futures]
+
+        self.assertEqual(results, [[[1.0, 1.0]], [[2.0, 1.0], [3.0, 1.0]], [[4.0, 1.0]]])
+        self.assertEqual(len(model.calls), 1)
+        self.assertEqual(sorted(model.calls[0][0]), ["a", "bb", "ccc", "dddd"])
+        self.assertEqual(batcher.stats()["avg_batch_texts"], 4.0)
+
+    def test_modes_are_batched_separately(self):
+        model = FakeModel()
+        batcher = MicroBatcher(model, window_ms=200)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            query = pool.submit(batcher.embed, ["pergunta"], "query")
+            document = pool.submit(batcher.embed, ["trecho"], "document")
+            self.assertEqual(query.result(5), [[8.0, 1.0]])
+            self.assertEqual(document.result(5), [[6.0, 0.0]])
+        self.assertEqual(sorted(mode for _, mode in model.calls), ["document", "query"])
+
+    def test_backend_errors_reach_every_waiting_request(self):
+        batcher = MicroBatcher(mock.Mock(side_effect=RuntimeError("GPU sem memória")), window_ms=1)
+        with self.assertRaisesRegex(RuntimeError, "GPU sem memória"):
+            batcher.embed(["texto"])
+        short = MicroBatcher(mock.Mock(return_value=[]), window_ms=1)
+        with self.assertRaisesRegex(RuntimeError, "0 vetores para 1 textos"):
+            short.embed(["texto"])
+
+
+class EmbeddingServiceHTTPTests(SimpleTestCase):
+    def setUp(self):
+        self.model = FakeModel()
+        self.server = make_server(MicroBatcher(self.model, window_ms=1), port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def test_embed_batch_uses_service(self):
+        with override_settings(EMBEDDING_SERVICE_URL=self.url), \
+                mock.patch.object(embedding, "embed_remote") as remote:
+            self.assertEqual(embedding.embed_batch(["Quando é a prova?"], mode="query"), [[17.0, 1.0]])
+        remote.assert_not_called()
+
+    def test_without_service_url_calls_remote(self):
+        with override_settings(EMBEDDING_SERVICE_URL=""), \
+                mock.patch.object(embedding, "embed_remote", return_value=[[0.5]]) as remote:
+            self.assertEqual(embedding.embed_batch(["texto"], mode="query"), [[0.5]])
+        remote.assert_called_once_with(["texto"], "query")
+        self.assertEqual(self.model.calls, [])
+
+    def test_invalid_payload_and_health(self):
+        response = requests.post(self.url + "/embed", json={"texts": "não é lista"}, timeout=5)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(requests.post(self.url + "/embed", json={"texts": []}, timeout=5).json(),
+                         {"embeddings": []})
+        health = requests.get(self.url + "/health", timeout=5).json()
+        self.assertEqual(health["status"], "ok")
+
+    def test_falls_back_to_remote_when_service_is_down(self):
+        url = self.url
+        self.server.shutdown()
+        self.server.server_close()
+        with override_settings(EMBEDDING_SERVICE_URL=url), \
+                mock.patch.object(embedding, "embed_remote", return_value=[[0.5]]) as remote:
+            self.assertEqual(embedding.embed_batch(["texto"]), [[0.5]])
+        remote.assert_called_once_with(["texto"], "document")
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from collector.entity_index import EntityIndex, render_answer
+
+
+def entity_row(entity_type, key_value, chunk_id=1, document_id=10, **attributes):
+    return {
+        "id": chunk_id,
+        "document_id": document_id,
+        "chunk_text": f"{key_value}: {attributes}",
+        "metadata": {
+            "type": "table_entity",
+            "entity_type": entity_type,
+            "key_field": "Evento",
+            "key_value": key_value,
+            "attributes": {"Evento": key_value, **attributes},
+        },
+    }
+
+
+class EntityIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.path = os.path.join(self.tmp, "entity_index.json")
+        self.index = EntityIndex(self.path)
+        self.index.add_rows([
+            entity_row("cronograma_enem", "Período de inscrições", chunk_id=1, Data="27/05 a 07/06"),
+            entity_row("cronograma_enem", "Aplicação das provas", chunk_id=2, Data="09/11 e 16/11"),
+            entity_row("competencia_redacao", "Competência 3", chunk_id=3, document_id=11,
+                       Descrição="Selecionar e organizar informações"),
+        ])
+
+    def test_factual_question_matches_single_entity(self):
+        entity, score = self.index.match("Qual o período de inscrições do ENEM?")
+        self.assertEqual(entity["key_value"], "Período de inscrições")
+        self.assertGreaterEqual(score, 0.75)
+        self.assertIn("27/05 a 07/06", render_answer(entity))
+
+    def test_competencia_by_roman_numeral(self):
+        entity, score = self.index.match("o que avalia a competência III da redação?")
+        self.assertEqual((entity["chunk_id"], score), (3, 1.0))
+
+    def test_low_confidence_competencia_is_not_answered(self):
+        row = entity_row("competencia_redacao", "Competência 5", chunk_id=5, Descrição="Proposta de intervenção")
+        row["metadata"]["confidence"] = "low"
+        self.index.add_rows([row])
+        self.assertIsNone(self.index.match("o que avalia a competência 5?"))
+
+    def test_chunks_without_id_are_not_indexed(self):
+        chunk = {"hash": "h-novo", "text": "Resultado: janeiro",
+                 "metadata": entity_row("cronograma_enem", "Resultado final")["metadata"]}
+        self.assertEqual(self.index.add_chunks([chunk], document_id=10, chunk_ids={}), 0)
+        # Um chunk já gravado (pulado no insert) não sobrescreve a entidade existente
+        skipped = {**chunk, "metadata": entity_row("cronograma_enem", "Período de inscrições")["metadata"]}
+        self.index.add_chunks([skipped], document_id=10, chunk_ids={})
+        self.assertEqual(self.index.match("Qual o período de inscrições?")[0]["chunk_id"], 1)
+        self.assertEqual(self.index.add_chunks([chunk], document_id=10, chunk_ids={"h-novo": 7}), 1)
+
+    def test_open_question_does_not_match(self):
+        self.assertIsNone(self.index.match("Como estudar para o ENEM?"))
+
+    def test_save_and_reload(self):
+        self.index.save()
+        reloaded = EntityIndex(self.path)
+        self.assertEqual(reloaded.load(force=True), 3)
+        self.assertEqual(reloaded.match("data de aplicação das provas")[0]["chunk_id"], 2)
+
+    def test_remove_documents(self):
+        self.assertEqual(self.index.remove_documents([11]), 1)
+        self.assertIsNone(self.index.match("competência 3"))
+
+
+class PipelineEntityIndexPathTests(SimpleTestCase):
+    def test_default_path_comes_from_settings(self):
+        from collector.scraping_pipeline import ENEMScrapingPipeline
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, True)
+        path = os.path.join(tmp, "entity_index.json")
+        with override_settings(ENTITY_INDEX_PATH=path):
+            pipeline = ENEMScrapingPipeline(
+                "http://supabase.invalid", "key",
+                checkpoint_file=os.path.join(tmp, "frontier.sqlite3"),
+                validator_file=None,
+            )
+        self.addCleanup(pipeline.url_manager.close)
+        self.assertEqual(pipeline.entity_index.path, path)
@@ -0,0 +1,130 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from collector.http_client import HTTPClient, _RawResponse
+from collector.tests.test_crawl_archive import PipelineMixin, TempDirMixin
+from collector.validator_store import ValidatorStore
+
+PAGE = "<html><body><h1>Cronograma ENEM</h1></body></html>".encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """/etag responde 304 ao If-None-Match certo; /sem-etag sempre manda o corpo"""
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/robots.txt":
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path == "/etag" and self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(PAGE)))
+        if self.path == "/etag":
+            self.send_header("ETag", '"v1"')
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+
+class ConditionalGetTests(TempDirMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        _Handler.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.client = HTTPClient(validator_store=ValidatorStore(os.path.join(self.tmp, "validators.sqlite3")),
+                                 max_retries=0)
+        self.addCleanup(self.client.close)
+
+    def test_not_modified_after_commit(self):
+        url = self.base + "/etag"
+        first = self.client.fetch(url)
+        self.assertFalse(first["not_modified"])
+        self.client.commit_validators(url, first, ["https://inep.gov.br/enem/edital"])
+
+        second = self.client.fetch(url)
+        self.assertEqual(second["status_code"], 304)
+        self.assertTrue(second["not_modified"])
+        self.assertEqual(second["validators"]["links"], ["https://inep.gov.br/enem/edital"])
+        self.assertEqual(_Handler.requests, [("/etag", None), ("/etag", '"v1"')])
+
+    def test_same_hash_without_validators_is_unchanged(self):
+        url = self.base + "/sem-etag"
+        first = self.client.fetch(url)
+        self.client.commit_validators(url, first, [])
+        second = self.client.fetch(url)
+        self.assertEqual(second["status_code"], 200)
+        self.assertTrue(second["not_modified"])
+
+    def test_validators_are_only_committed_explicitly(self):
+        url = self.base + "/etag"
+        self.client.fetch(url)
+        # Processamento falhou (sem commit_validators): a próxima coleta refaz
+        self.assertFalse(self.client.fetch(url)["not_modified"])
+        self.assertEqual(_Handler.requests, [("/etag", None), ("/etag", None)])
+        self.assertFalse(self.client.fetch(url, conditional=False).get("not_modified"))
+
+
+class PipelineRecrawlTests(PipelineMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.etag = '"v1"'
+        self.conditional_requests = []
+
+    def serve(self, url, headers=None):
+        self.conditional_requests.append((headers or {}).get("If-None-Match"))
+        if (headers or {}).get("If-None-Match") == self.etag:
+            return _RawResponse(304, {}, url, b"", None)
+        return _RawResponse(200, {"ETag": self.etag}, url, PAGE + self.etag.encode(), "utf-8")
+
+    def crawl(self, **kwargs):
+        pipeline = self.make_pipeline(**kwargs)
+        with mock.patch.object(pipeline.http_client, "_get", side_effect=self.serve), \
+                mock.patch.object(pipeline.http_client, "can_fetch", return_value=True):
+            stats = pipeline.run([self.URL])
+        return pipeline, stats
+
+    def test_visited_seeds_are_skipped_without_recrawl(self):
+        self.crawl()
+        _, stats = self.crawl()
+        self.assertEqual((stats["pages_processed"], stats["pages_unchanged"]), (0, 0))
+        self.assertEqual(self.conditional_requests, [None])
+
+    def test_recrawl_revalidates_visited_pages(self):
+        self.crawl()
+
+        pipeline, stats = self.crawl(recrawl=True)
+        self.assertEqual(stats["pages_unchanged"], 1)
+        pipeline.block_extractor.extract_blocks.assert_not_called()
+
+        self.etag = '"v2"'
+        pipeline, stats = self.crawl(recrawl=True)
+        self.assertEqual((stats["pages_processed"], stats["pages_unchanged"]), (1, 0))
+        pipeline.block_extractor.extract_blocks.assert_called_once()
+        self.assertEqual(self.conditional_requests, [None, '"v1"', '"v1"'])
+
+    def test_http_client_is_closed_when_processing_fails(self):
+        pipeline = self.make_pipeline()
+        with mock.patch.object(pipeline.http_client, "_get", side_effect=self.serve), \
+                mock.patch.object(pipeline.http_client, "can_fetch", return_value=True), \
+                mock.patch.object(pipeline, "_process_page", side_effect=RuntimeError("OCR falhou")), \
+                mock.patch.object(pipeline.http_client, "close", wraps=pipeline.http_client.close) as close:
+            with self.assertRaises(RuntimeError):
+                pipeline.run([self.URL])
+        close.assert_called_once()
+        self.assertEqual(pipeline.http_client._sessions, [])
@@ -0,0 +1,148 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from collector import llm_backends
+from collector.llm_backends import LLMBackend, LLMBackendBusy, get_backend
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Servidor compatível com /v1/chat/completions (como llama.cpp ou vLLM)"""
+    delay = 0.0
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        try:
+            time.sleep(cls.delay)
+            text = f"Resposta de {body['model']}"
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for part in (text[:8], text[8:]):
+                    event = {"id": "1", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                             "choices": [{"index": 0, "delta": {"content": part}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                self.wfile.write(b"data: [DONE]\n\n")
+                return
+            payload = json.dumps({
+                "id": "1", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+
+MESSAGES = [{"role": "user", "content": "Quando é a prova?"}]
+
+
+class LocalBackendTests(SimpleTestCase):
+    def setUp(self):
+        _Handler.delay, _Handler.active, _Handler.peak = 0.0, 0, 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+
+    def test_completion_and_stream(self):
+        backend = LLMBackend("local", self.url, "local", max_concurrency=1)
+        result = backend.create(model="qwen", messages=MESSAGES, max_tokens=32)
+        self.assertEqual(result.choices[0].message.content, "Resposta de qwen")
+
+        parts = [e.choices[0].delta.content for e in backend.create(model="qwen", messages=MESSAGES, stream=True)]
+        self.assertEqual("".join(p for p in parts if p), "Resposta de qwen")
+        # A vaga do stream foi devolvida ao fim da leitura
+        self.assertTrue(backend._slots.acquire(blocking=False))
+
+    def test_concurrency_is_capped(self):
+        _Handler.delay = 0.1
+        backend = LLMBackend("local", self.url, "local", max_concurrency=2, queue_timeout=5)
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            results = list(pool.map(lambda _: backend.create(model="qwen", messages=MESSAGES), range(5)))
+        self.assertEqual(len(results), 5)
+        self.assertEqual(_Handler.peak, 2)
+
+    def test_busy_when_queue_timeout_expires(self):
+        _Handler.delay = 0.5
+        backend = LLMBackend("local", self.url, "local", max_concurrency=1, queue_timeout=0.05)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            first = pool.submit(backend.create, model="qwen", messages=MESSAGES)
+            while not _Handler.active:
+                time.sleep(0.01)
+            with self.assertRaises(LLMBackendBusy):
+                backend.create(model="qwen", messages=MESSAGES)
+            first.result()
+        # Falha na chamada também devolve a vaga
+        with mock.patch.object(backend.client.chat.completions, "create", side_effect=RuntimeError("caiu")):
+            with self.assertRaises(RuntimeError):
+                backend.create(model="qwen", messages=MESSAGES)
+        self.assertTrue(backend._slots.acquire(blocking=False))
+
+    def test_agent_falls_back_to_local_server(self):
+        from collector import agent
+        from collector.query_log import QueryTrace
+        with override_settings(LOCAL_LLM_URL=self.url, LOCAL_LLM_MODEL="qwen", LOCAL_LLM_API_KEY="local",
+                               LOCAL_LLM_MAX_CONCURRENCY=1, LOCAL_LLM_QUEUE_TIMEOUT=1.0), \
+                mock.patch.dict(llm_backends._backends, clear=True):
+            remote = LLMBackend("openrouter", "http://127.0.0.1:9/v1", "key")
+            llm_backends.register_backend(remote)
+            with mock.patch.object(remote.client.chat.completions, "create", side_effect=RuntimeError("429")):
+                text, tried = agent._complete(agent.tier_plan("Quando é a prova?", 100), "s", "u",
+                                              QueryTrace("q", 5), None, {})
+            self.assertEqual(get_backend("local").max_concurrency, 1)
+        self.assertEqual(text, "Resposta de qwen")
+        self.assertEqual(tried, 6)
+
+    def test_local_only_deployment(self):
+        from collector import agent
+        from collector.query_log import QueryTrace
+        from collector.title_generator import title_generator
+        env = {k: v for k, v in os.environ.items() if k != "OPENROUTER_API_KEY"}
+        with override_settings(LOCAL_LLM_URL=self.url, LOCAL_LLM_MODEL="qwen", LOCAL_LLM_API_KEY="local"), \
+                mock.patch.dict(os.environ, env, clear=True), \
+                mock.patch.dict(llm_backends._backends, clear=True):
+            self.assertIsNone(get_backend("openrouter"))
+            text, tried = agent._complete(agent.tier_plan("Quando é a prova?", 100), "s", "u",
+                                          QueryTrace("q", 5), None, {})
+            self.assertEqual(title_generator("Quando é a prova?"), "Resposta de qwen")
+        self.assertEqual((text, tried), ("Resposta de qwen", 1))
+
+    def test_modules_import_without_openrouter_key(self):
+        env = {k: v for k, v in os.environ.items() if k != "OPENROUTER_API_KEY"}
+        code = "import django; django.setup(); import collector.agent, collector.title_generator"
+        result = subprocess.run([sys.executable, "-c", code], env=env, cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    @override_settings(LOCAL_LLM_URL="")
+    def test_local_backend_is_optional(self):
+        with mock.patch.dict(llm_backends._backends, clear=True):
+            self.assertIsNone(get_backend("local"))
+            self.assertIsNotNone(get_backend("openrouter"))
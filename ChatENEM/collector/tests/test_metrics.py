@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from collector import metrics
+from collector.metrics import MetricsRegistry
+
+DEAD_PID = 4000000  # acima de pid_max: nunca é um processo vivo
+
+
+def write_process_file(directory, name, requests=0.0, latencies=()):
+    buckets = [sum(1 for v in latencies if v <= b) for b in metrics.LATENCY_BUCKETS]
+    data = {
+        "test_requests_total": {"values": {'["ok"]': requests}},
+        "test_latency_seconds": {"values": {"[]": {"buckets": buckets, "sum": sum(latencies),
+                                                   "count": len(latencies)}}},
+    }
+    with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.registry = MetricsRegistry(self.dir)
+        self.requests = self.registry.counter("test_requests_total", "Requisições", ["status"])
+        self.latency = self.registry.histogram("test_latency_seconds", "Latência")
+
+    def total(self):
+        return self.registry.collect()["test_requests_total"]["values"]['["ok"]']
+
+    def test_render_prometheus_text(self):
+        registry = MetricsRegistry("")
+        counter = registry.counter("test_total", "Teste", ["status"])
+        histogram = registry.histogram("test_seconds", "Latência", buckets=(0.1, 1.0))
+        counter.inc(status='a"b')
+        histogram.observe(0.5)
+        text = registry.render()
+        self.assertIn('test_total{status="a\\"b"} 1', text)
+        self.assertIn('test_seconds_bucket{le="0.1"} 0', text)
+        self.assertIn('test_seconds_bucket{le="1"} 1', text)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn("test_seconds_count 1", text)
+
+    def test_processes_are_summed(self):
+        self.requests.inc(2, status="ok")
+        write_process_file(self.dir, f"metrics-{os.getpid()}-outro.json", requests=3)
+        self.assertEqual(self.total(), 5)
+
+    def test_dead_process_is_retired_once(self):
+        self.requests.inc(status="ok")
+        write_process_file(self.dir, f"metrics-{DEAD_PID}-abc.json", requests=4, latencies=(0.2, 3.0))
+
+        collected = self.registry.collect()
+        self.assertEqual(collected["test_requests_total"]["values"]['["ok"]'], 5)
+        self.assertEqual(collected["test_latency_seconds"]["values"]["[]"]["count"], 2)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, f"metrics-{DEAD_PID}-abc.json")))
+        self.assertEqual(self.total(), 5)
+
+    def test_reused_pid_does_not_move_counters_backwards(self):
+        write_process_file(self.dir, "metrics-1234-antigo.json", requests=10)
+        with mock.patch.object(metrics, "_pid_alive", return_value=True):
+            self.assertEqual(self.total(), 10)
+            # O processo terminou e o pid 1234 foi para um processo novo, com
+            # arquivo próprio: os dois continuam somados
+            write_process_file(self.dir, "metrics-1234-novo.json", requests=1)
+            self.assertEqual(self.total(), 11)
+            write_process_file(self.dir, "metrics-1234-novo.json", requests=2)
+            self.assertEqual(self.total(), 12)
+
+        with mock.patch.object(metrics, "_pid_alive", side_effect=lambda pid: pid != 1234):
+            self.assertEqual(self.total(), 12)
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         sorted([f"metrics-{os.getpid()}-{self.registry._token}.json",
+                                 metrics.RETIRED_FILE, "metrics.lock"]))
+
+    def test_interrupted_retirement_is_not_counted_twice(self):
+        name = f"metrics-{DEAD_PID}-abc.json"
+        write_process_file(self.dir, name, requests=4)
+        with open(os.path.join(self.dir, metrics.RETIRED_FILE), "w", encoding="utf-8") as f:
+            json.dump({"files": [name], "metrics": {
+                "test_requests_total": {"values": {'["ok"]': 4.0}}}}, f)
+
+        self.assertEqual(self.total(), 4)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, name)))
+        self.assertEqual(self.total(), 4)
+
+
+class MetricsEndpointTests(SimpleTestCase):
+    def test_prometheus_text(self):
+        metrics.ROUTES.inc(route="greeting")
+        response = self.client.get("/collector/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode("utf-8")
+        self.assertIn("# TYPE chatenem_routes_total counter", body)
+        self.assertIn('chatenem_routes_total{route="greeting"}', body)
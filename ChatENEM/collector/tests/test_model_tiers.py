@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from collector import agent
+from collector.model_tiers import (
+    MEDIUM_MAX_PROMPT_TOKENS,
+    MODEL_TIERS,
+    SMALL_MAX_PROMPT_TOKENS,
+    choose_tier,
+    estimate_tokens,
+    question_complexity,
+    tier_plan,
+)
+from collector.query_log import QueryTrace
+
+SHORT = "Qual a data da prova?"
+
+
+class ChooseTierTests(SimpleTestCase):
+    def test_complexity(self):
+        self.assertEqual(question_complexity(SHORT), 0)
+        self.assertEqual(question_complexity(
+            "Se eu fizer a inscrição no último dia do prazo ainda consigo pagar o boleto depois"), 1)
+        self.assertEqual(question_complexity("Qual a diferença entre SISU e PROUNI?"), 2)
+        self.assertEqual(question_complexity("Quando é a prova? E o resultado?"), 2)
+        self.assertEqual(question_complexity("Além disso, há isenção?"), 2)
+
+    def test_prompt_size_raises_tier(self):
+        self.assertEqual(choose_tier(SHORT, SMALL_MAX_PROMPT_TOKENS), 0)
+        self.assertEqual(choose_tier(SHORT, SMALL_MAX_PROMPT_TOKENS + 1), 1)
+        self.assertEqual(choose_tier(SHORT, MEDIUM_MAX_PROMPT_TOKENS + 1), 2)
+        self.assertEqual(choose_tier("Explique como funciona a TRI", 100), 2)
+        self.assertEqual(estimate_tokens("a" * 40, "b" * 40), 21)
+
+    @override_settings(LOCAL_LLM_URL="")
+    def test_plan_escalates_to_larger_tiers(self):
+        self.assertEqual([t.name for t in tier_plan(SHORT, 100)], ["small", "medium", "large"])
+        self.assertEqual([t.name for t in tier_plan(SHORT, 2000)], ["medium", "large"])
+
+    @override_settings(LOCAL_LLM_URL="http://127.0.0.1:8080/v1", LOCAL_LLM_MODEL="qwen2.5-7b-instruct",
+                       LOCAL_LLM_MAX_TOKENS=256, LOCAL_LLM_TIMEOUT=5.0)
+    def test_local_tier_is_last_resort(self):
+        local = tier_plan(SHORT, 5000)[-1]
+        self.assertEqual((local.name, local.backend, local.models, local.max_tokens),
+                         ("local", "local", ["qwen2.5-7b-instruct"], 256))
+
+
+class CompleteTests(SimpleTestCase):
+    def test_failures_escalate_with_each_tier_budget(self):
+        backend = mock.Mock()
+        calls = []
+
+        def create(model, max_tokens, **kwargs):
+            calls.append((model, max_tokens))
+            if len(calls) < 4:
+                raise RuntimeError("429")
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Resposta"))])
+
+        backend.create.side_effect = create
+        with mock.patch.object(agent, "get_backend", return_value=backend):
+            text, tried = agent._complete(MODEL_TIERS, "sistema", "pergunta", QueryTrace(SHORT, 5), None, {})
+
+        self.assertEqual((text, tried), ("Resposta", 4))
+        # Modelo repetido entre tiers (gemma) não é tentado de novo
+        self.assertEqual(calls, [
+            ("meta-llama/llama-3.2-3b-instruct:free", 512),
+            ("google/gemma-3-27b-it:free", 512),
+            ("openai/gpt-oss-20b:free", 1024),
+            ("openai/gpt-oss-120b:free", 2048),
+        ])
+
+    def test_all_models_failing_returns_none(self):
+        backend = mock.Mock()
+        backend.create.side_effect = RuntimeError("fora do ar")
+        with mock.patch.object(agent, "get_backend", return_value=backend):
+            text, tried = agent._complete(MODEL_TIERS[2:], "s", "u", QueryTrace(SHORT, 5), None, {})
+        self.assertEqual((text, tried), (None, 2))
@@ -0,0 +1,304 @@
+import hashlib
+import unittest
+from unittest import mock
+
+import numpy as np
+from django.db import connection
+from django.db.migrations.exceptions import IrreversibleError
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from collector.chunk_selector import parse_embedding
+from collector.database_layer import DatabaseLayer
+
+EMBEDDING_DIM = 1024
+
+
+def fake_embedding(text: str):
+    """Vetor unitário determinístico por texto (mesmo texto → mesmo vetor)"""
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+    vector = np.random.RandomState(seed).standard_normal(EMBEDDING_DIM)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def fake_embed_batch(texts, mode="passage"):
+    return [fake_embedding(t) for t in texts]
+
+
+def postgres_dsn() -> str:
+    from psycopg.conninfo import make_conninfo
+    s = connection.settings_dict
+    return make_conninfo(dbname=s["NAME"], user=s["USER"], password=s["PASSWORD"] or None,
+                         host=s["HOST"] or None, port=s["PORT"] or None)
+
+
+def chunk(text: str, **metadata):
+    return {"hash": hashlib.sha256(text.encode("utf-8")).hexdigest(), "text": text, "metadata": metadata}
+
+
+class VectorFormatTests(SimpleTestCase):
+    def test_binary_vector_layout_and_round_trip(self):
+        from collector.pg_backend import dump_vector, load_vector, load_vector_text
+        data = dump_vector([1.0, -2.0])
+        self.assertEqual(data, b"\x00\x02\x00\x00" b"\x3f\x80\x00\x00" b"\xc0\x00\x00\x00")
+        self.assertEqual(load_vector(memoryview(data)), [1.0, -2.0])
+        vector = fake_embedding("Taxa de inscrição.")
+        np.testing.assert_allclose(load_vector(dump_vector(np.asarray(vector))), vector, atol=1e-7)
+        self.assertEqual(load_vector_text(b"[0.5,-1e-09,2]"), [0.5, -1e-09, 2.0])
+
+    def test_copy_statements_share_column_order(self):
+        from collector import pg_backend
+        columns = ", ".join(pg_backend.CHUNK_LOAD_COLUMNS)
+        self.assertIn("embedding vector, embedding_model text, metadata jsonb", pg_backend.CHUNK_LOAD_TABLE_SQL)
+        self.assertEqual(pg_backend.CHUNK_COPY_SQL, f"COPY _chunk_load ({columns}) FROM STDIN (FORMAT BINARY)")
+        self.assertIn(f"INSERT INTO document_chunks ({columns}, created_at) SELECT {columns}, now()",
+                      pg_backend.CHUNK_INSERT_SQL)
+        self.assertIn("ON CONFLICT (chunk_hash) DO NOTHING RETURNING chunk_hash, id", pg_backend.CHUNK_INSERT_SQL)
+
+
+class UnreachableDatabaseTests(SimpleTestCase):
+    def setUp(self):
+        from collector.pg_backend import PostgresBackend
+        # Porta 1: conexão recusada na hora, sem servidor Postgres
+        self.backend = PostgresBackend("host=127.0.0.1 port=1 dbname=x user=x", connect_timeout=1,
+                                       pool_timeout=0.5, backoff=30, max_backoff=60)
+        self.addCleanup(self.backend.close)
+
+    def test_fails_fast_and_backs_off(self):
+        import time
+        from collector.pg_backend import PostgresUnavailable
+        started = time.time()
+        with self.assertRaises(PostgresUnavailable):
+            self.backend.search_chunks(fake_embedding("x"), 1)
+        self.assertLess(time.time() - started, 3)
+
+        with mock.patch.object(self.backend.pool, "connection") as connection:
+            with self.assertRaises(PostgresUnavailable):
+                self.backend.search_chunks(fake_embedding("x"), 1)
+            connection.assert_not_called()
+
+        # Segunda falha depois da espera dobra o intervalo, até max_backoff
+        with mock.patch("collector.pg_backend.time.time", return_value=started + 31):
+            with self.assertRaises(PostgresUnavailable):
+                self.backend.ping()
+        self.assertAlmostEqual(self.backend._unavailable_until, started + 31 + 60)
+
+    def test_agent_falls_back_to_postgrest(self):
+        from collector import agent
+        response = mock.Mock(status_code=200)
+        response.json.return_value = [{"id": 1, "chunk_text": "via PostgREST", "similarity": 0.9}]
+        with mock.patch.object(agent, "get_postgres_backend", return_value=self.backend), \
+                mock.patch.object(agent, "SupabaseClient") as client, \
+                override_settings(LOCAL_INDEX_DIR=""):
+            client.return_value.session.post.return_value = response
+            chunks, scores = agent._search_by_embedding(fake_embedding("x"), 1)
+        self.assertEqual((chunks[0]["chunk_text"], scores), ("via PostgREST", [0.9]))
+
+
+class SearchPayloadTests(SimpleTestCase):
+    def test_embeddings_and_filter_do_not_depend_on_ef_search(self):
+        from collector.supabase_client import SupabaseClient
+        with override_settings(SEARCH_EF_SEARCH=0):
+            payload = SupabaseClient().search_payload([0.1], 3, include_embedding=True)
+        self.assertEqual(payload, {"query_embedding": [0.1], "match_count": 3,
+                                   "include_embedding": True, "filter": {}})
+        with override_settings(SEARCH_EF_SEARCH=80):
+            payload = SupabaseClient().search_payload([0.1], 3, filter={"ano": 2025})
+        self.assertEqual((payload["ef_search"], payload["filter"]), (80, {"ano": 2025}))
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "requer Postgres com pgvector (defina POSTGRES_DB)")
+class BackendContract:
+    """
+    Mesmo conjunto de testes para os dois backends do DatabaseLayer
+    (PostgREST e conexão direta), sobre as tabelas e a função search_chunks
+    criadas pelas migrações no banco de teste.
+    """
+
+    def make_layer(self) -> DatabaseLayer:
+        raise NotImplementedError
+
+    def setUp(self):
+        overrides = override_settings(CHANGE_JOURNAL_PATH="", SEARCH_EF_SEARCH=40)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        patcher = mock.patch("collector.database_layer.embed_batch", side_effect=fake_embed_batch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.layer = self.make_layer()
+
+    def test_insert_document_returns_id(self):
+        doc_id = self.layer.insert_document("https://www.inep.gov.br/enem/", "ENEM 2025", "enem_oficial")
+        self.assertIsNotNone(doc_id)
+        with connection.cursor() as cur:
+            cur.execute("SELECT url_norm, title FROM documents WHERE id = %s", [doc_id])
+            self.assertEqual(cur.fetchone(), ("https://inep.gov.br/enem", "ENEM 2025"))
+
+    def test_insert_chunks_is_idempotent(self):
+        doc_id = self.layer.insert_document("https://inep.gov.br/a", "A")
+        chunks = [chunk("Inscrições de 27 de maio a 7 de junho."), chunk("A prova tem 180 questões.")]
+
+        first = self.layer.insert_chunks(chunks, doc_id)
+        self.assertEqual((first["inserted"], first["skipped"], first["errors"]), (2, 0, 0))
+        self.assertEqual(set(first["ids"]), {c["hash"] for c in chunks})
+
+        second = self.layer.insert_chunks(chunks, doc_id)
+        self.assertEqual((second["inserted"], second["skipped"], second["errors"]), (0, 2, 0))
+
+        with connection.cursor() as cur:
+            cur.execute("SELECT count(*), count(embedding) FROM document_chunks WHERE document_id = %s", [doc_id])
+            self.assertEqual(cur.fetchone(), (2, 2))
+
+    def test_insert_chunks_invalidates_cached_answers(self):
+        from collector.answer_cache import TaggedCache, tags_for_chunks
+        doc_id = self.layer.insert_document("https://inep.gov.br/c", "C")
+        cache = TaggedCache()
+        with mock.patch("collector.answer_cache.answer_cache", cache):
+            cache.set("sobre c", "resposta", tags_for_chunks([{"id": -1, "document_id": doc_id}]))
+            cache.set("outro", "resposta", tags_for_chunks([{"id": -2, "document_id": -2}]))
+            self.layer.insert_chunks([chunk("Resultado em janeiro.")], doc_id)
+            self.assertEqual(set(cache._entries), {"outro"})
+
+            # Nada inserido (chunk repetido): nada invalidado
+            cache.set("sobre c", "resposta", tags_for_chunks([{"id": -1, "document_id": doc_id}]))
+            self.layer.insert_chunks([chunk("Resultado em janeiro.")], doc_id)
+            self.assertEqual(set(cache._entries), {"outro", "sobre c"})
+
+    def test_chunk_metadata_is_stored(self):
+        doc_id = self.layer.insert_document("https://inep.gov.br/b", "B")
+        self.layer.insert_chunks([chunk("Competência 3 da redação.", type="text", context="Redação")], doc_id)
+        with connection.cursor() as cur:
+            cur.execute("SELECT metadata FROM document_chunks WHERE document_id = %s", [doc_id])
+            metadata = cur.fetchone()[0]
+        if isinstance(metadata, str):
+            import json
+            metadata = json.loads(metadata)
+        self.assertEqual(metadata["context"], "Redação")
+        self.assertEqual(metadata["domain"], "ENEM")
+
+    def test_search_returns_nearest_first(self):
+        doc_id = self.layer.insert_document("https://inep.gov.br/c", "Edital ENEM")
+        texts = ["Data da prova do ENEM.", "Taxa de inscrição.", "Documentos aceitos no dia da prova."]
+        self.layer.insert_chunks([chunk(t) for t in texts], doc_id)
+
+        results = self.layer.search_similar_chunks("Taxa de inscrição.", limit=2)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]["chunk_text"], "Taxa de inscrição.")
+        self.assertAlmostEqual(float(results[0]["similarity"]), 1.0, places=4)
+        self.assertGreater(float(results[0]["similarity"]), float(results[1]["similarity"]))
+        self.assertEqual(results[0]["document_id"], doc_id)
+
+    def test_search_returns_document_metadata(self):
+        doc_id = self.layer.insert_document("https://inep.gov.br/e", "Cronograma ENEM", "enem_oficial")
+        self.layer.insert_chunks([chunk("Aplicação em 9 e 16 de novembro.")], doc_id)
+        result = self.layer.search_similar_chunks("Aplicação em 9 e 16 de novembro.", limit=1)[0]
+        self.assertEqual(result["documents"]["title"], "Cronograma ENEM")
+        self.assertEqual(result["documents"]["source"], "enem_oficial")
+        self.assertEqual(result["documents"]["url"], "https://inep.gov.br/e")
+
+
+class PostgRESTBackendTests(BackendContract, TransactionTestCase):
+    def setUp(self):
+        from collector.tests.postgrest import PostgRESTStub
+        self.stub = PostgRESTStub(postgres_dsn())
+        self.addCleanup(self.stub.close)
+        super().setUp()
+
+    def make_layer(self):
+        return DatabaseLayer(self.stub.url, "test-key")
+
+    def test_agent_search_returns_embeddings_with_default_ef_search(self):
+        from collector import agent
+        doc_id = self.layer.insert_document("https://inep.gov.br/i", "I")
+        self.layer.insert_chunks([chunk("Gabarito em novembro.")], doc_id)
+        with override_settings(SEARCH_EF_SEARCH=0, DATABASE_BACKEND="postgrest", LOCAL_INDEX_DIR="",
+                               SUPABASE_URL=self.stub.url, SUPABASE_KEY="test-key"):
+            chunks, _ = agent._search_by_embedding(fake_embedding("Gabarito em novembro."), 1)
+        # PostgREST devolve o vetor como texto; o MMR e a conversa o leem com parse_embedding
+        np.testing.assert_allclose(parse_embedding(chunks[0]["embedding"]),
+                                   fake_embedding("Gabarito em novembro."), atol=1e-5)
+        self.assertEqual(chunks[0]["documents"]["title"], "I")
+
+
+class DirectBackendTests(BackendContract, TransactionTestCase):
+    def make_layer(self):
+        from collector.pg_backend import PostgresBackend
+        backend = PostgresBackend(postgres_dsn(), max_size=2)
+        self.addCleanup(backend.close)
+        return DatabaseLayer("http://unused", "test-key", pg=backend)
+
+    def test_search_can_return_embedding(self):
+        doc_id = self.layer.insert_document("https://inep.gov.br/d", "D")
+        self.layer.insert_chunks([chunk("Cartão de confirmação.")], doc_id)
+        rows = self.layer.pg.search_chunks(fake_embedding("Cartão de confirmação."), 1, include_embedding=True)
+        np.testing.assert_allclose(rows[0]["embedding"], fake_embedding("Cartão de confirmação."), atol=1e-6)
+
+    def test_concurrent_searches_share_small_pool(self):
+        from concurrent.futures import ThreadPoolExecutor
+        doc_id = self.layer.insert_document("https://inep.gov.br/f", "F")
+        texts = [f"Questão {i} da prova." for i in range(8)]
+        self.layer.insert_chunks([chunk(t) for t in texts], doc_id)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda t: self.layer.pg.search_chunks(fake_embedding(t), 1)[0], texts))
+        self.assertEqual([r["chunk_text"] for r in results], texts)
+
+    def test_copy_race_inserts_each_hash_once(self):
+        from collector.pg_backend import PostgresBackend
+        other = PostgresBackend(postgres_dsn(), max_size=1)
+        self.addCleanup(other.close)
+        doc_id = self.layer.insert_document("https://inep.gov.br/g", "G")
+        rows = [{"document_id": doc_id, "chunk_hash": "h-corrida", "chunk_text": "Gabarito oficial.",
+                 "embedding": fake_embedding("Gabarito oficial."), "embedding_model": "m", "metadata": {}}]
+        self.assertEqual(list(self.layer.pg.copy_chunks(rows)), ["h-corrida"])
+        self.assertEqual(other.copy_chunks(rows), {})
+        # Sem embedding também entra (NULL), como no caminho PostgREST
+        self.assertEqual(len(other.copy_chunks([{**rows[0], "chunk_hash": "h-sem", "embedding": None}])), 1)
+
+    def test_agent_search_uses_direct_backend(self):
+        from collector import agent, pg_backend
+        doc_id = self.layer.insert_document("https://inep.gov.br/h", "H")
+        self.layer.insert_chunks([chunk("Resultado em janeiro.")], doc_id)
+        with override_settings(DATABASE_BACKEND="postgres", POSTGRES_DSN=postgres_dsn(), POSTGRES_POOL_MAX=2,
+                               LOCAL_INDEX_DIR=""), \
+                mock.patch.object(pg_backend, "_backend", None), \
+                mock.patch.object(agent, "SupabaseClient", side_effect=AssertionError("usou PostgREST")):
+            try:
+                chunks, scores = agent._search_by_embedding(fake_embedding("Resultado em janeiro."), 1)
+            finally:
+                if pg_backend._backend is not None:
+                    pg_backend._backend.close()
+        self.assertEqual(chunks[0]["chunk_text"], "Resultado em janeiro.")
+        self.assertAlmostEqual(scores[0], 1.0, places=4)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "requer Postgres com pgvector (defina POSTGRES_DB)")
+class SearchFunctionMigrationTests(TransactionTestCase):
+    """search_chunks criada pela migração 0002"""
+
+    def migrate(self, target):
+        from django.db.migrations.executor import MigrationExecutor
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([("collector", target)])
+
+    def search_signatures(self):
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT pg_get_function_identity_arguments(p.oid), pg_get_function_result(p.oid) "
+                "FROM pg_proc p WHERE p.proname = 'search_chunks'"
+            )
+            return cur.fetchall()
+
+    def tearDown(self):
+        # Desfazer até a 0001 remove as migrações posteriores antes de falhar na 0002
+        from django.db.migrations.loader import MigrationLoader
+        [leaf] = MigrationLoader(connection).graph.leaf_nodes("collector")
+        self.migrate(leaf[1])
+
+    def test_search_function_and_irreversible_reverse(self):
+        [(arguments, result)] = self.search_signatures()
+        self.assertIn("include_embedding boolean", arguments)
+        self.assertIn("documents jsonb", result)
+        # A search_chunks anterior à 0002 não está versionada: desfazer falha sem mexer no banco
+        with self.assertRaises(IrreversibleError):
+            self.migrate("0001_initial")
+        self.assertEqual(self.search_signatures(), [(arguments, result)])
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from collector import agent, query_log
+from collector.query_log import QueryLogWriter, QueryTrace, iter_query_log, trace_stage, tracing
+
+
+class QueryLogWriterTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+
+    def test_records_are_readable_after_close(self):
+        writer = QueryLogWriter(self.dir)
+        for i in range(3):
+            writer.log({"question": f"pergunta {i}", "cache_hit": False})
+        writer.close()
+        self.assertEqual([r["question"] for r in iter_query_log(self.dir)],
+                         ["pergunta 0", "pergunta 1", "pergunta 2"])
+        self.assertFalse(any(name.endswith(".open") for name in os.listdir(self.dir)))
+
+    def test_rotates_by_size(self):
+        writer = QueryLogWriter(self.dir, max_bytes=200)
+        for i in range(10):
+            writer.log({"question": "x" * 100, "i": i})
+        writer.close()
+        self.assertGreaterEqual(len(os.listdir(self.dir)), 5)
+        self.assertEqual([r["i"] for r in iter_query_log(self.dir)], list(range(10)))
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        started, release = threading.Event(), threading.Event()
+        with mock.patch.object(query_log, "QUEUE_SIZE", 2):
+            writer = QueryLogWriter(self.dir)
+        original_write = writer._write
+        with mock.patch.object(writer, "_write", side_effect=lambda r: (started.set(), release.wait(5), original_write(r))):
+            writer.log({"i": 0})
+            self.assertTrue(started.wait(5))
+            for i in range(1, 10):
+                writer.log({"i": i})
+            # A thread de escrita travou no primeiro registro; a fila guarda
+            # mais dois e o resto é descartado sem bloquear
+            self.assertEqual(writer.dropped, 7)
+            release.set()
+            writer.close()
+        self.assertEqual([r["i"] for r in iter_query_log(self.dir)], [0, 1, 2])
+
+    def test_open_file_is_read_on_request(self):
+        writer = QueryLogWriter(self.dir)
+        self.addCleanup(writer.close)
+        written = threading.Event()
+        original_write = writer._write
+        with mock.patch.object(writer, "_write", side_effect=lambda r: (original_write(r), written.set())):
+            writer.log({"question": "em andamento"})
+            self.assertTrue(written.wait(5))
+        writer._file.flush()
+        self.assertEqual(list(iter_query_log(self.dir)), [])
+        self.assertEqual([r["question"] for r in iter_query_log(self.dir, include_open=True)], ["em andamento"])
+
+
+class QueryTraceTests(SimpleTestCase):
+    def test_stages_accumulate_only_inside_tracing(self):
+        trace = QueryTrace("Quando é a prova?", 5)
+        with trace_stage("embedding"):
+            pass
+        with tracing(trace):
+            for _ in range(2):
+                with trace_stage("search"):
+                    pass
+        record = trace.finish({"answer": "Em novembro.", "found_context": True})
+        self.assertEqual(list(record["timings_ms"]), ["search"])
+        self.assertEqual((record["answer_chars"], record["found_context"]), (12, True))
+        self.assertIn("total_ms", record)
+
+    def test_answer_question_logs_route_and_errors(self):
+        writer = mock.Mock()
+        with mock.patch.object(agent, "get_query_log", return_value=writer):
+            agent.answer_question("Obrigado!")
+            with mock.patch.object(agent, "route_question", side_effect=RuntimeError("falhou")), \
+                    self.assertRaises(RuntimeError):
+                agent.answer_question("Quando é a prova?")
+        ok, failed = (call.args[0] for call in writer.log.call_args_list)
+        self.assertEqual((ok["route"], ok["question"]), ("thanks", "Obrigado!"))
+        self.assertIn("route", ok["timings_ms"])
+        self.assertEqual(failed["error"], "falhou")
@@ -0,0 +1,93 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from collector import agent
+from collector.query_router import (
+    BROAD_K,
+    FACTUAL_K,
+    GREETING_REPLY,
+    META_REPLY,
+    THANKS_REPLY,
+    OFF_TOPIC_REPLY,
+    route_question,
+)
+
+
+class RouteQuestionTests(SimpleTestCase):
+    def assertRoute(self, question, name, k=0):
+        route = route_question(question)
+        self.assertEqual((route.name, route.k), (name, k), question)
+        return route
+
+    def test_canned_replies(self):
+        self.assertEqual(self.assertRoute("Olá, tudo bem?", "greeting").reply, GREETING_REPLY)
+        self.assertRoute("   ", "greeting")
+        self.assertRoute("Muito obrigada!", "thanks")
+        self.assertRoute("Valeu pela ajuda", "thanks")
+        self.assertRoute("obrigado!! 🙏", "thanks")
+        self.assertRoute("tchau, até mais", "thanks")
+        self.assertRoute("Quem é você?", "meta")
+        self.assertRoute("E para que você serve?", "meta")
+
+    def test_questions_never_get_canned_replies(self):
+        for question in ("obrigado, mas quando é a prova?", "valeu! e a taxa de inscrição?",
+                         "para que serve o cartão de confirmação?", "o que você sabe sobre a redação?"):
+            route = route_question(question)
+            self.assertNotIn(route.reply, (THANKS_REPLY, META_REPLY), question)
+            self.assertGreater(route.k, 0, question)
+
+    def test_off_topic_without_enem_terms(self):
+        route = self.assertRoute("Me passa uma receita de bolo de chocolate", "off_topic")
+        self.assertEqual(route.reply, OFF_TOPIC_REPLY)
+        self.assertGreaterEqual(route.confidence, 0.95)
+
+    def test_enem_questions_are_not_refused(self):
+        for question in ("onde vejo meu resultado?", "quando sai o resultado?", "quando começa o sisu?",
+                         "como recupero minha senha do gov.br?", "qual o horário dos portões?",
+                         "posso fazer sendo treineiro?", "perdi a prova, e agora?", "tem reaplicação?",
+                         "onde fica meu local?", "quanto custa?", "o que levar no dia?"):
+            self.assertNotEqual(route_question(question).name, "off_topic", question)
+
+    def test_enem_terms_are_never_off_topic(self):
+        self.assertRoute("Posso levar bolo de chocolate no dia da prova?", "extractive", FACTUAL_K)
+        self.assertRoute("Como pedir isenção da taxa?", "rag", FACTUAL_K)
+
+    def test_retrieval_depth(self):
+        # A rota extrativa leva o k do RAG para quando o índice de entidades não responde
+        self.assertRoute("Quando é a prova do ENEM?", "extractive", FACTUAL_K)
+        self.assertRoute("Qual a nota de corte para medicina?", "extractive", FACTUAL_K)
+        self.assertRoute("Explique quando e como funciona a inscrição no prazo", "extractive", BROAD_K)
+        self.assertRoute("O que zera a redação?", "rag", FACTUAL_K)
+        self.assertRoute("Explique como funciona a correção da redação", "rag", BROAD_K)
+
+
+class AnswerRoutingTests(SimpleTestCase):
+    def test_canned_route_skips_retrieval_and_llm(self):
+        with mock.patch.object(agent, "_retrieve") as retrieve, \
+                mock.patch.object(agent, "get_backend") as backend, \
+                mock.patch.object(agent, "get_query_log", return_value=None):
+            result = agent.answer_question("Bom dia")
+        self.assertEqual(result, {"answer": GREETING_REPLY, "citations": [], "found_context": False})
+        retrieve.assert_not_called()
+        backend.assert_not_called()
+
+    def test_route_caps_retrieval_depth(self):
+        with mock.patch.object(agent, "_retrieve", return_value=([], [])) as retrieve, \
+                mock.patch.object(agent, "poll_changes"), \
+                mock.patch.object(agent, "answer_cache") as cache, \
+                mock.patch.object(agent, "get_query_log", return_value=None):
+            cache.get.return_value = None
+            agent.answer_question("O que zera a redação?", k=10)
+        self.assertEqual(retrieve.call_args.args[1], FACTUAL_K * agent.CANDIDATE_MULTIPLIER)
+
+    def test_extractive_miss_keeps_rag_depth(self):
+        with mock.patch.object(agent, "_extractive_answer", return_value=None) as extractive, \
+                mock.patch.object(agent, "_retrieve", return_value=([], [])) as retrieve, \
+                mock.patch.object(agent, "poll_changes"), \
+                mock.patch.object(agent, "answer_cache") as cache, \
+                mock.patch.object(agent, "get_query_log", return_value=None):
+            cache.get.return_value = None
+            agent.answer_question("Quando sai o resultado?", k=10)
+        extractive.assert_called_once()
+        self.assertEqual(retrieve.call_args.args[1], FACTUAL_K * agent.CANDIDATE_MULTIPLIER)
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from collector import signals
+
+OTHER_PID = 999999
+
+
+class ChangeJournalTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, True)
+        self.path = os.path.join(tmp, "corpus_changes.jsonl")
+        overrides = override_settings(CHANGE_JOURNAL_PATH=self.path)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        for name, value in (("_journal_offset", None), ("_journal_generation", None),
+                            ("_journal_stat", None), ("_polled_at", 0.0)):
+            patcher = mock.patch.object(signals, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.received = []
+        signals.corpus_changed.connect(self.receiver)
+        self.addCleanup(signals.corpus_changed.disconnect, self.receiver)
+
+    def receiver(self, sender, reason="", document_ids=(), **kwargs):
+        if sender == "journal":
+            self.received.append((reason, list(document_ids)))
+
+    def publish_from_other_worker(self, document_id, max_bytes=signals.JOURNAL_MAX_BYTES):
+        with mock.patch("os.getpid", return_value=OTHER_PID), \
+                mock.patch.object(signals, "JOURNAL_MAX_BYTES", max_bytes):
+            signals.publish_change(document_ids=[document_id], reason="ingest")
+
+    def test_events_from_other_workers_are_applied(self):
+        self.publish_from_other_worker(1)
+        signals.poll_changes(force=True)  # marca a posição inicial
+        self.publish_from_other_worker(2)
+        signals.poll_changes(force=True)
+        self.assertEqual(self.received, [("ingest", [2])])
+
+    def test_own_events_are_not_applied_twice(self):
+        self.publish_from_other_worker(1)
+        signals.poll_changes(force=True)
+        signals.publish_change(document_ids=[3], reason="ingest")
+        signals.poll_changes(force=True)
+        self.assertEqual(self.received, [])
+
+    def test_rotation_keeps_unread_events(self):
+        self.publish_from_other_worker(1)
+        signals.poll_changes(force=True)
+        self.publish_from_other_worker(2)
+        self.publish_from_other_worker(3, max_bytes=0)  # rotaciona antes de gravar
+
+        self.assertTrue(os.path.exists(self.path + ".1"))
+        signals.poll_changes(force=True)
+        self.assertEqual(self.received, [("ingest", [2]), ("ingest", [3])])
+
+        self.publish_from_other_worker(4)
+        signals.poll_changes(force=True)
+        self.assertEqual(self.received[-1], ("ingest", [4]))
+
+    def test_double_rotation_flushes_everything(self):
+        self.publish_from_other_worker(1)
+        signals.poll_changes(force=True)
+        self.publish_from_other_worker(2, max_bytes=0)
+        self.publish_from_other_worker(3, max_bytes=0)
+        signals.poll_changes(force=True)
+        self.assertEqual(self.received, [("flush_all", []), ("ingest", [3])])
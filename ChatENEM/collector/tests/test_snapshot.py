@@ -0,0 +1,203 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from collector.snapshot import TABLES, SnapshotManifest, read_shard, write_shard
+from collector.tests.test_pg_backend import fake_embedding, postgres_dsn
+
+
+def document(doc_id, url, title):
+    return {"id": doc_id, "title": title, "source": "inep", "url": url, "url_norm": url,
+            "created_at": "2025-05-01T00:00:00+00:00"}
+
+
+def chunk_row(chunk_id, document_id, text):
+    return {"id": chunk_id, "document_id": document_id, "chunk_text": text, "chunk_hash": f"hash-{chunk_id}",
+            "embedding_model": "bge-m3", "metadata": {"type": "text"}, "embedding": fake_embedding(text),
+            "created_at": "2025-05-01T00:00:00+00:00"}
+
+
+def build_snapshot(directory, documents, chunks):
+    manifest = SnapshotManifest(directory)
+    manifest.add_shard("documents", write_shard(directory, "documents", 1, documents))
+    manifest.mark_complete("documents")
+    manifest.add_shard("document_chunks", write_shard(directory, "document_chunks", 1, chunks))
+    manifest.mark_complete("document_chunks")
+    return manifest
+
+
+class TempDirMixin:
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+
+class SnapshotFilesTests(TempDirMixin, SimpleTestCase):
+    def test_shards_round_trip_with_embeddings(self):
+        rows = [chunk_row(1, 10, "Inscrições"), {**chunk_row(2, 10, "Sem vetor"), "embedding": None}]
+        shard = write_shard(self.tmp, "document_chunks", 1, rows)
+        self.assertEqual((shard["rows"], shard["last_id"], shard["dim"]), (2, 2, 1024))
+
+        restored = read_shard(self.tmp, shard)
+        self.assertEqual(restored[0]["chunk_text"], "Inscrições")
+        self.assertAlmostEqual(restored[0]["embedding"][0], fake_embedding("Inscrições")[0], places=6)
+        self.assertIsNone(restored[1]["embedding"])
+
+    def test_manifest_detects_corruption(self):
+        manifest = build_snapshot(self.tmp, [document(1, "https://inep.gov.br/a", "A")],
+                                  [chunk_row(1, 1, "texto")])
+        self.assertTrue(SnapshotManifest.load(self.tmp).complete)
+        self.assertEqual(manifest.verify(), [])
+
+        with open(os.path.join(self.tmp, "documents-00001.jsonl.gz"), "ab") as f:
+            f.write(b"lixo")
+        os.remove(os.path.join(self.tmp, "document_chunks-00001.npz"))
+        self.assertEqual(sorted(manifest.verify()), [
+            "document_chunks-00001.npz: ausente",
+            "documents-00001.jsonl.gz: checksum divergente",
+        ])
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "requer Postgres com pgvector (defina POSTGRES_DB)")
+class RestoreSnapshotTests(TempDirMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        from collector.tests.postgrest import PostgRESTStub
+        self.stub = PostgRESTStub(postgres_dsn())
+        self.addCleanup(self.stub.close)
+        overrides = override_settings(SUPABASE_URL=self.stub.url, SUPABASE_KEY="test-key", CHANGE_JOURNAL_PATH="")
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        build_snapshot(
+            self.tmp,
+            [document(1, "https://inep.gov.br/edital", "Edital"),
+             document(2, "https://inep.gov.br/cronograma", "Cronograma")],
+            [chunk_row(1, 1, "Taxa de inscrição."), chunk_row(2, 2, "Provas em novembro.")],
+        )
+
+    def restore(self, *args):
+        call_command("restore_snapshot", self.tmp, "--workers", "2", *args, stdout=open(os.devnull, "w"))
+
+    def rows(self, sql):
+        with connection.cursor() as cur:
+            cur.execute(sql)
+            return cur.fetchall()
+
+    def insert_local_document(self):
+        with connection.cursor() as cur:
+            cur.execute("INSERT INTO documents (id, title, url, url_norm, created_at) "
+                        "VALUES (1, 'Documento local', 'https://outro.gov.br', 'https://outro.gov.br', now())")
+
+    def test_restore_into_empty_database(self):
+        self.restore()
+        self.assertEqual(self.rows("SELECT id, title FROM documents ORDER BY id"),
+                         [(1, "Edital"), (2, "Cronograma")])
+        self.assertEqual(self.rows("SELECT document_id, count(embedding) FROM document_chunks "
+                                   "GROUP BY document_id ORDER BY 1"), [(1, 1), (2, 1)])
+
+    def test_insert_after_restore_gets_a_fresh_id(self):
+        self.restore("--keep-chunk-ids")
+        from collector.database_layer import DatabaseLayer
+        layer = DatabaseLayer(self.stub.url, "test-key")
+        self.assertEqual(layer.insert_document("https://inep.gov.br/novo", "Novo"), 3)
+        with connection.cursor() as cur:
+            cur.execute("INSERT INTO document_chunks (document_id, chunk_text, chunk_hash, embedding_model, "
+                        "created_at) VALUES (3, 'novo', 'h-novo', 'm', now()) RETURNING id")
+            self.assertEqual(cur.fetchone()[0], 3)
+
+    def test_refuses_non_empty_target(self):
+        self.insert_local_document()
+        with self.assertRaisesRegex(CommandError, "--merge"):
+            self.restore()
+        self.assertEqual(self.rows("SELECT count(*) FROM document_chunks"), [(0,)])
+
+    def test_merge_never_overwrites_unrelated_documents(self):
+        self.insert_local_document()
+        self.restore("--merge")
+        self.assertEqual(self.rows("SELECT id, title FROM documents ORDER BY id"),
+                         [(1, "Documento local"), (2, "Cronograma")])
+        # Os chunks do documento 1 do snapshot iriam parar no documento local
+        self.assertEqual(self.rows("SELECT document_id, chunk_text FROM document_chunks"),
+                         [(2, "Provas em novembro.")])
+
+    def test_merge_is_idempotent(self):
+        self.restore()
+        self.restore("--merge")
+        self.assertEqual(self.rows("SELECT count(*) FROM documents"), [(2,)])
+        self.assertEqual(self.rows("SELECT count(*) FROM document_chunks"), [(2,)])
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "requer Postgres com pgvector (defina POSTGRES_DB)")
+class ExportSnapshotTests(TempDirMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        from collector.tests.postgrest import PostgRESTStub
+        self.stub = PostgRESTStub(postgres_dsn())
+        self.addCleanup(self.stub.close)
+        overrides = override_settings(SUPABASE_URL=self.stub.url, SUPABASE_KEY="test-key", CHANGE_JOURNAL_PATH="")
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        with connection.cursor() as cur:
+            for doc_id in (1, 2, 3):
+                cur.execute("INSERT INTO documents (id, title, url, url_norm, created_at) "
+                            "VALUES (%s, %s, %s, %s, now())",
+                            [doc_id, f"Documento {doc_id}", f"https://inep.gov.br/{doc_id}",
+                             f"https://inep.gov.br/{doc_id}"])
+                cur.execute("INSERT INTO document_chunks (document_id, chunk_text, chunk_hash, embedding_model, metadata, "
+                            "embedding, created_at) VALUES (%s, %s, %s, 'bge-m3', '{}', %s::vector, now())",
+                            [doc_id, f"Trecho {doc_id}", f"hash-{doc_id}",
+                             str(fake_embedding(f"Trecho {doc_id}"))])
+
+    def export(self, *args):
+        call_command("export_snapshot", self.tmp, "--page-size", "2", *args, stdout=open(os.devnull, "w"))
+
+    def test_export_writes_verified_shards(self):
+        self.export()
+        manifest = SnapshotManifest.load(self.tmp)
+        self.assertTrue(manifest.complete)
+        self.assertEqual(manifest.verify(), [])
+        self.assertEqual([len(manifest.table(t)["shards"]) for t in ("documents", "document_chunks")], [2, 2])
+        self.assertEqual(manifest.data["embedding_dim"], 1024)
+        chunks = [row for shard in manifest.table("document_chunks")["shards"]
+                  for row in read_shard(self.tmp, shard)]
+        self.assertEqual([c["chunk_text"] for c in chunks], ["Trecho 1", "Trecho 2", "Trecho 3"])
+        self.assertAlmostEqual(chunks[2]["embedding"][0], fake_embedding("Trecho 3")[0], places=6)
+
+    def test_interrupted_export_resumes_without_duplicates(self):
+        def failing_write(directory, table, index, rows):
+            if table == "document_chunks" and index == 2:
+                raise OSError("disco cheio")
+            return write_shard(directory, table, index, rows)
+
+        with mock.patch("collector.management.commands.export_snapshot.write_shard", side_effect=failing_write):
+            with self.assertRaises(OSError):
+                self.export()
+        self.assertFalse(SnapshotManifest.load(self.tmp).complete)
+
+        self.export()
+        manifest = SnapshotManifest.load(self.tmp)
+        self.assertTrue(manifest.complete)
+        self.assertEqual([manifest.table(t)["rows"] for t in TABLES], [3, 3])
+        self.assertEqual(sorted(os.listdir(self.tmp)), sorted([
+            "manifest.json", "documents-00001.jsonl.gz", "documents-00002.jsonl.gz",
+            "document_chunks-00001.jsonl.gz", "document_chunks-00001.npz",
+            "document_chunks-00002.jsonl.gz", "document_chunks-00002.npz",
+        ]))
+
+    def test_corrupt_shard_blocks_resume(self):
+        self.export()
+        manifest = SnapshotManifest.load(self.tmp)
+        manifest.data["tables"]["document_chunks"]["complete"] = False
+        manifest.data["completed_at"] = None
+        manifest.save()
+        with open(os.path.join(self.tmp, "documents-00001.jsonl.gz"), "ab") as f:
+            f.write(b"lixo")
+        with self.assertRaisesRegex(CommandError, "checksum divergente"):
+            self.export()
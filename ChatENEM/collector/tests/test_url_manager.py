@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from collector.url_manager import URLManager
+
+URL = "https://inep.gov.br/enem"
+
+
+class URLManagerTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.path = os.path.join(self.tmp, "frontier.sqlite3")
+
+    def make_manager(self, **kwargs):
+        manager = URLManager(self.path, **kwargs)
+        self.addCleanup(manager.close)
+        return manager
+
+    def state(self, manager, url=URL):
+        return manager._conn.execute(
+            "SELECT state, attempts FROM frontier WHERE url = ?", (url,)).fetchone()
+
+    def test_seeds_are_normalized_and_deduplicated(self):
+        manager = self.make_manager()
+        manager.add_seed_urls(["http://www.inep.gov.br/enem/", URL, "https://inep.gov.br/pagina.html"])
+        self.assertEqual(manager.get_stats()["pending_count"], 1)
+        self.assertEqual(manager.get_next_pending(), URL)
+        self.assertIsNone(manager.get_next_pending())
+
+    def test_visited_url_is_not_queued_again(self):
+        manager = self.make_manager()
+        manager.add_pending_url(URL)
+        manager.mark_visited(manager.get_next_pending())
+        manager.add_pending_url(URL)
+        self.assertIsNone(manager.get_next_pending())
+        self.assertEqual(manager.get_stats()["visited_count"], 1)
+
+    def test_requeue_visited_for_recrawl(self):
+        manager = self.make_manager(max_attempts=1)
+        manager.add_seed_urls([URL, URL + "/edital.pdf", URL + "/cronograma"])
+        for _ in range(2):
+            manager.mark_visited(manager.get_next_pending())
+        manager.mark_failed(manager.get_next_pending(), "HTTP 500")
+
+        self.assertEqual(manager.requeue_visited(), 2)
+        self.assertEqual([manager.get_next_pending() for _ in range(3)], [URL, URL + "/edital.pdf", None])
+        self.assertEqual(self.state(manager), ("leased", 1))
+
+    def test_state_survives_reopen(self):
+        manager = URLManager(self.path)
+        manager.add_seed_urls([URL, URL + "/edital.pdf"])
+        manager.mark_visited(manager.get_next_pending())
+        manager.close()
+
+        reopened = self.make_manager()
+        self.assertEqual(reopened.get_next_pending(), URL + "/edital.pdf")
+
+    def test_failures_are_retried_until_max_attempts(self):
+        manager = self.make_manager(max_attempts=2)
+        manager.add_pending_url(URL)
+        for expected in ("pending", "failed"):
+            manager.mark_failed(manager.get_next_pending(), "timeout")
+            self.assertEqual(self.state(manager)[0], expected)
+        self.assertIsNone(manager.get_next_pending())
+
+    def test_permanent_failure_is_not_retried(self):
+        manager = self.make_manager()
+        manager.add_pending_url(URL)
+        manager.mark_failed(manager.get_next_pending(), "404", permanent=True)
+        self.assertEqual(self.state(manager), ("failed", 1))
+
+    def test_expired_lease_is_reissued(self):
+        manager = self.make_manager(lease_seconds=10)
+        manager.add_pending_url(URL)
+        with mock.patch("collector.url_manager.time.time", return_value=1000.0):
+            self.assertEqual(manager.get_next_pending(), URL)
+            self.assertIsNone(manager.get_next_pending())
+        with mock.patch("collector.url_manager.time.time", return_value=1011.0):
+            self.assertEqual(manager.get_next_pending(), URL)
+        self.assertEqual(self.state(manager), ("leased", 2))
+
+    def test_expired_lease_gives_up_after_max_attempts(self):
+        manager = self.make_manager(lease_seconds=10, max_attempts=2)
+        manager.add_pending_url(URL)
+        for now in (1000.0, 1011.0):
+            with mock.patch("collector.url_manager.time.time", return_value=now):
+                self.assertEqual(manager.get_next_pending(), URL)
+        with mock.patch("collector.url_manager.time.time", return_value=1022.0):
+            self.assertIsNone(manager.get_next_pending())
+        self.assertEqual(self.state(manager), ("failed", 2))
+        self.assertEqual(manager.get_stats()["failed_count"], 1)
+
+    def test_renewed_lease_is_not_reissued(self):
+        manager = self.make_manager(lease_seconds=10)
+        manager.add_pending_url(URL)
+        with mock.patch("collector.url_manager.time.time", return_value=1000.0):
+            manager.get_next_pending()
+        with mock.patch("collector.url_manager.time.time", return_value=1008.0):
+            manager.renew_lease([URL])
+        with mock.patch("collector.url_manager.time.time", return_value=1015.0):
+            self.assertIsNone(manager.get_next_pending())
+        with mock.patch("collector.url_manager.time.time", return_value=1019.0):
+            self.assertEqual(manager.get_next_pending(), URL)
+
+    def test_legacy_json_checkpoint_is_imported(self):
+        legacy = os.path.join(self.tmp, "checkpoint.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump({"visited_urls": [URL], "pending_urls": [URL + "/inscricao"]}, f)
+        manager = URLManager(legacy)
+        self.addCleanup(manager.close)
+        self.assertTrue(manager.checkpoint_file.endswith("checkpoint.sqlite3"))
+        self.assertEqual(manager.get_stats()["visited_count"], 1)
+        self.assertEqual(manager.get_next_pending(), URL + "/inscricao")
@@ -0,0 +1,85 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from collector.vector_codecs import (
+    BinaryCodec,
+    CompressedIndex,
+    Int8Codec,
+    PCACodec,
+    format_vector,
+    l2_normalize,
+)
+
+
+def random_vectors(n, dim=64, seed=7):
+    return l2_normalize(np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32))
+
+
+class CodecTests(SimpleTestCase):
+    def test_int8_round_trip_error_is_bounded(self):
+        matrix = random_vectors(200)
+        codec = Int8Codec().fit(matrix)
+        codes = codec.encode(matrix)
+        self.assertEqual(codes.dtype, np.int8)
+        self.assertLessEqual(np.abs(codec.decode(codes) - matrix).max(), codec.scale.max() / 2 + 1e-6)
+        exact = matrix @ matrix[0]
+        self.assertEqual(int(np.argmax(codec.scores(matrix[0], codes))), int(np.argmax(exact)))
+
+    def test_binary_hamming(self):
+        codec = BinaryCodec()
+        codes = codec.encode(np.array([[1.0, -1.0, 1.0, -1.0], [-1.0, 1.0, -1.0, 1.0]]))
+        self.assertEqual(codes.shape, (2, 1))
+        query = codec.encode(np.array([1.0, -1.0, 1.0, 1.0]))
+        self.assertEqual(codec.hamming(query, codes).tolist(), [1, 3])
+
+    def test_pca_preserves_rank_of_low_rank_data(self):
+        rng = np.random.default_rng(3)
+        matrix = (rng.standard_normal((300, 8)) @ rng.standard_normal((8, 64))).astype(np.float32)
+        codec = PCACodec(dim=8).fit(matrix)
+        self.assertEqual(codec.encode(matrix).shape, (300, 8))
+        centered = matrix - codec.mean
+        exact = centered @ centered[5]
+        reduced = codec.scores(matrix[5], codec.encode(matrix))
+        self.assertTrue(np.allclose(reduced, exact, rtol=1e-3, atol=1e-2))
+
+    def test_truncate_keeps_leading_dimensions(self):
+        codec = PCACodec(dim=2, truncate=True).fit(np.zeros((1, 4)))
+        self.assertTrue(np.allclose(codec.encode(np.array([[3.0, 4.0, 9.0, 9.0]])), [[0.6, 0.8]]))
+
+    def test_format_vector_limits_precision(self):
+        self.assertEqual(format_vector([0.123456789, -1e-9, 2]), "[0.123457,-1e-09,2]")
+
+
+class CompressedIndexTests(SimpleTestCase):
+    def test_exact_rescoring_recovers_true_neighbours(self):
+        vectors = random_vectors(2000, dim=128)
+        index = CompressedIndex.build(vectors)
+        self.assertLess(index.nbytes(), vectors.nbytes / 3)
+
+        recalled = 0
+        for query in random_vectors(20, dim=128, seed=11):
+            truth = set(np.argsort(-(vectors @ query))[:5].tolist())
+            results = index.search(query, k=5)
+            self.assertEqual([s for _, s in results], sorted((s for _, s in results), reverse=True))
+            self.assertAlmostEqual(results[0][1], float(vectors[results[0][0]] @ query), places=5)
+            recalled += len(truth & {i for i, _ in results})
+        # Vetores aleatórios são o pior caso para o corte binário
+        self.assertGreaterEqual(recalled / 100, 0.75)
+
+    def test_full_rescore_is_exact(self):
+        vectors = random_vectors(500)
+        index = CompressedIndex.build(vectors)
+        query = random_vectors(1, seed=5)[0]
+        results = index.search(query, k=5, rescore_k=len(vectors))
+        self.assertEqual([i for i, _ in results], np.argsort(-(vectors @ query))[:5].tolist())
+
+    def test_search_without_full_vectors_and_with_pca(self):
+        vectors = random_vectors(300)
+        for index in (CompressedIndex.build(vectors, keep_full=False),
+                      CompressedIndex.build(vectors, pca_dim=32)):
+            position, _ = index.search(vectors[42], k=3)[0]
+            self.assertEqual(position, 42)
+
+    def test_empty_index(self):
+        index = CompressedIndex(np.zeros((0, 1), np.uint8), np.zeros((0, 4), np.int8), Int8Codec(np.ones(4)))
+        self.assertEqual(index.search([1.0, 0.0, 0.0, 0.0]), [])
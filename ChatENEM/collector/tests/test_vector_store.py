@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from collector.vector_store import KEEP_SNAPSHOTS, SNAPSHOTS_DIR, MmapVectorStore, VectorStoreWriter
+
+DIM = 16
+
+
+def rows(n, seed=1, prefix="Trecho"):
+    vectors = np.random.default_rng(seed).standard_normal((n, DIM))
+    return [{"id": i + 1, "document_id": 100 + i, "chunk_text": f"{prefix} {i} – inscrição",
+             "metadata": {"page": i}, "embedding": vectors[i].tolist()} for i in range(n)]
+
+
+class MmapVectorStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+
+    def publish(self, data):
+        writer = VectorStoreWriter(self.root, dim=DIM)
+        writer.add(data)
+        return writer.commit(batch_size=7)
+
+    def test_search_returns_rows_like_search_chunks(self):
+        data = rows(50)
+        self.publish(data + [{"id": 99, "chunk_text": "dimensão errada", "embedding": [1.0, 2.0]}])
+        store = MmapVectorStore(self.root)
+        self.assertEqual(len(store), 50)
+        # Lido do page cache, não copiado para a memória do worker
+        self.assertIsInstance(store._snapshot.vectors, np.memmap)
+
+        results = store.search(data[17]["embedding"], k=3)
+        best = results[0]
+        self.assertEqual((best["id"], best["document_id"], best["metadata"]), (18, 117, {"page": 17}))
+        self.assertEqual(best["chunk_text"], "Trecho 17 – inscrição")
+        self.assertAlmostEqual(best["similarity"], 1.0, places=5)
+        expected = np.asarray(data[17]["embedding"]) / np.linalg.norm(data[17]["embedding"])
+        self.assertTrue(np.allclose(best["embedding"], expected, atol=1e-6))
+        self.assertNotIn("embedding", store.search(data[0]["embedding"], k=1, with_embedding=False)[0])
+
+    def test_readers_switch_to_new_snapshot(self):
+        self.publish(rows(10))
+        store = MmapVectorStore(self.root, refresh_interval=0.0)
+        first = store._target
+        new_data = rows(20, seed=2, prefix="Novo")
+        self.publish(new_data)
+
+        self.assertEqual(store.search(new_data[3]["embedding"], k=1)[0]["chunk_text"], "Novo 3 – inscrição")
+        self.assertEqual(len(store), 20)
+        self.assertNotEqual(store._target, first)
+
+    def test_old_snapshots_are_cleaned_up(self):
+        paths = [self.publish(rows(5, seed=i)) for i in range(KEEP_SNAPSHOTS + 2)]
+        self.assertEqual(len(set(paths)), len(paths))
+        remaining = sorted(os.listdir(os.path.join(self.root, SNAPSHOTS_DIR)))
+        self.assertEqual(remaining, sorted(os.path.basename(p) for p in paths[-KEEP_SNAPSHOTS:]))
+
+    def test_empty_and_missing_snapshot(self):
+        self.assertFalse(MmapVectorStore(self.root).available)
+        self.publish([])
+        store = MmapVectorStore(self.root)
+        self.assertTrue(store.available)
+        self.assertEqual(store.search([1.0] * DIM), [])
+        store.prefetch()
@@ -0,0 +1,97 @@
+import os
+import unittest
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from collector import warmup
+
+
+class ShouldWarmupTests(SimpleTestCase):
+    def check(self, argv, env=None):
+        env = {"CHATENEM_WARMUP": "", "RUN_MAIN": "", **(env or {})}
+        with mock.patch.object(warmup.sys, "argv", argv), mock.patch.dict(os.environ, env):
+            return warmup.should_warmup()
+
+    def test_servers_warm_up(self):
+        self.assertTrue(self.check(["/venv/bin/gunicorn", "ChatENEM.asgi:application"]))
+        self.assertTrue(self.check(["/venv/lib/python3.12/site-packages/gunicorn/__main__.py"]))
+        self.assertTrue(self.check(["uvicorn", "ChatENEM.asgi:application"]))
+        self.assertTrue(self.check(["manage.py", "runserver"], {"RUN_MAIN": "true"}))
+        self.assertTrue(self.check(["manage.py", "runserver", "--noreload"]))
+
+    def test_other_entrypoints_do_not(self):
+        self.assertFalse(self.check(["/venv/bin/pytest", "-q"]))
+        self.assertFalse(self.check(["manage.py", "test"]))
+        self.assertFalse(self.check(["manage.py", "runserver"]))  # processo do autoreloader
+        self.assertFalse(self.check(["debug_agent.py"]))
+        self.assertFalse(self.check(["-c"]))
+
+    def test_environment_overrides(self):
+        self.assertTrue(self.check(["debug_agent.py"], {"CHATENEM_WARMUP": "1"}))
+        self.assertFalse(self.check(["gunicorn"], {"CHATENEM_WARMUP": "0"}))
+
+
+class StartOnRequestTests(SimpleTestCase):
+    def setUp(self):
+        for name, value in (("_started", False), ("_enabled", None)):
+            patcher = mock.patch.object(warmup, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_first_request_starts_warmup(self):
+        with mock.patch.object(warmup, "should_warmup", return_value=True), \
+                mock.patch.object(warmup, "start_warmup") as start:
+            self.client.get("/collector/ready/")
+        start.assert_called_once_with()
+
+    def test_disabled_outside_server(self):
+        with mock.patch.object(warmup, "start_warmup") as start:
+            self.client.get("/collector/ready/")
+            self.client.get("/collector/ready/")
+        start.assert_not_called()
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requer fork")
+    def test_forked_worker_warms_up_again(self):
+        with mock.patch.object(warmup, "run_warmup"):
+            warmup.start_warmup(background=False)
+        self.assertTrue(warmup._started)
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # processo filho (como um worker do gunicorn --preload)
+            os.close(read_fd)
+            os.write(write_fd, b"1" if not warmup._started and not warmup.is_ready() else b"0")
+            os._exit(0)
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+        with os.fdopen(read_fd, "rb") as f:
+            self.assertEqual(f.read(), b"1")
+
+
+class ReadyEndpointTests(SimpleTestCase):
+    def setUp(self):
+        state = {"started_at": None, "finished_at": None, "steps": {}, "error": None}
+        patches = [mock.patch.object(warmup, "_ready", warmup.threading.Event()),
+                   mock.patch.object(warmup, "_started", True),
+                   mock.patch.dict(warmup._state, state)]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_steps(self, step):
+        with mock.patch.object(warmup, "WARMUP_STEPS", [("agent", step, True)]):
+            warmup.run_warmup()
+
+    def test_ready_only_after_warmup(self):
+        self.assertEqual(self.client.get("/collector/ready/").status_code, 503)
+
+        self.run_steps(mock.Mock(side_effect=RuntimeError("sem índice")))
+        response = self.client.get("/collector/ready/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["error"], "agent: sem índice")
+
+        self.run_steps(mock.Mock())
+        response = self.client.get("/collector/ready/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["ready"])
@@ -0,0 +1,164 @@
+import asyncio
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from collector import ws_chat
+
+API_KEY = "chave-de-teste"
+
+
+class SocketHarness:
+    """Conversa com a aplicação ASGI do chat como um cliente WebSocket"""
+
+    def __init__(self, headers=(), query_string=b""):
+        self.scope = {"type": "websocket", "path": ws_chat.WS_PATH, "query_string": query_string,
+                      "headers": [(k.encode(), v.encode()) for k, v in headers]}
+        self.incoming = asyncio.Queue()
+        self.sent = []
+        self.changed = asyncio.Event()
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send(self, message):
+        if message["type"] == "websocket.send":
+            message = json.loads(message["text"])
+        self.sent.append(message)
+        self.changed.set()
+
+    def client_send(self, message):
+        self.incoming.put_nowait({"type": "websocket.receive", "text": json.dumps(message)})
+
+    async def wait_for(self, predicate, timeout=5.0):
+        async def poll():
+            while not any(predicate(m) for m in self.sent):
+                self.changed.clear()
+                await self.changed.wait()
+        await asyncio.wait_for(poll(), timeout)
+
+    def messages(self, kind):
+        return [m for m in self.sent if m.get("type") == kind]
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class ChatSocketTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.dict("os.environ", {"API_KEY": API_KEY})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.answer = mock.patch("collector.agent.answer_question", side_effect=self.fake_answer)
+        self.answer_mock = self.answer.start()
+        self.addCleanup(self.answer.stop)
+        self.title = mock.patch("collector.title_generator.title_generator", return_value="Título separado")
+        self.title_mock = self.title.start()
+        self.addCleanup(self.title.stop)
+
+    @staticmethod
+    def fake_answer(question, k=5, conversation_id=None, with_title=False, on_delta=None):
+        if on_delta:
+            on_delta("Resposta ")
+            on_delta("em partes.")
+        result = {"answer": "Resposta em partes.", "citations": [], "found_context": True}
+        if with_title:
+            result["title"] = "Título combinado"
+        return result
+
+    async def converse(self, harness, messages, expected_done=0):
+        task = asyncio.create_task(ws_chat.chat_socket(harness.scope, harness.receive, harness.send))
+        harness.incoming.put_nowait({"type": "websocket.connect"})
+        for message in messages:
+            harness.client_send(message)
+        if expected_done:
+            await harness.wait_for(lambda m: len(harness.messages("done")) >= expected_done)
+        harness.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(task, 5.0)
+
+    def test_header_authorization(self):
+        harness = SocketHarness(headers=[("authorization", f"Bearer {API_KEY}")])
+        run(self.converse(harness, [{"type": "ask", "id": "1", "question": "Quando é a prova?"}], 1))
+        self.assertEqual(harness.messages("done")[0]["answer"], "Resposta em partes.")
+
+    def test_auth_message(self):
+        harness = SocketHarness()
+        run(self.converse(harness, [{"type": "auth", "token": API_KEY},
+                                    {"type": "ask", "id": "1", "question": "Quando é a prova?"}], 1))
+        self.assertEqual(len(harness.messages("ready")), 1)
+
+    def test_token_in_query_string_is_rejected(self):
+        harness = SocketHarness(query_string=f"token={API_KEY}".encode())
+        run(self.converse(harness, [{"type": "ask", "id": "1", "question": "Quando é a prova?"}]))
+        self.assertEqual(harness.sent[-1], {"type": "websocket.close", "code": ws_chat.CLOSE_UNAUTHORIZED})
+        self.answer_mock.assert_not_called()
+
+    def test_wrong_auth_message_is_rejected(self):
+        harness = SocketHarness()
+        run(self.converse(harness, [{"type": "auth", "token": "errada"}]))
+        self.assertEqual(harness.sent[-1]["code"], ws_chat.CLOSE_UNAUTHORIZED)
+        self.assertEqual(harness.messages("ready"), [])
+
+    def test_first_question_is_streamed_then_titled(self):
+        harness = SocketHarness(headers=[("authorization", f"Bearer {API_KEY}")])
+        run(self.converse(harness, [{"type": "ask", "id": "1", "question": "Quando é a prova?"},
+                                    {"type": "ask", "id": "2", "question": "E o resultado?"}], 2))
+
+        self.assertEqual({m["id"] for m in harness.messages("delta")}, {"1", "2"})
+        for call in self.answer_mock.call_args_list:
+            self.assertIsNotNone(call.kwargs["on_delta"])
+            self.assertFalse(call.kwargs.get("with_title", False))
+        self.assertTrue(all("title" not in m for m in harness.messages("done")))
+        self.assertEqual(harness.messages("title"), [{"type": "title", "id": "1", "title": "Título separado"}])
+        self.title_mock.assert_called_once_with("Quando é a prova?")
+        # O título chega depois da resposta completa
+        kinds = [m["type"] for m in harness.sent if m.get("id") == "1"]
+        self.assertLess(kinds.index("done"), kinds.index("title"))
+
+    def test_title_failure_keeps_the_answer(self):
+        self.title_mock.side_effect = RuntimeError("sem modelos")
+        harness = SocketHarness(headers=[("authorization", f"Bearer {API_KEY}")])
+        run(self.converse(harness, [{"type": "ask", "id": "1", "question": "Quando é a prova?"}], 1))
+        self.assertEqual(harness.messages("done")[0]["answer"], "Resposta em partes.")
+        self.assertEqual(harness.messages("title"), [])
+        self.assertEqual(harness.messages("error"), [])
+
+
+class OutboxTests(SimpleTestCase):
+    def test_close_goes_after_queued_messages_and_stops_sending(self):
+        async def scenario():
+            sent = []
+
+            async def send(message):
+                await asyncio.sleep(0)
+                sent.append(message)
+
+            outbox = ws_chat.Outbox()
+            outbox.put({"type": "delta", "id": "1", "text": "parte "})
+            outbox.put({"type": "delta", "id": "1", "text": "final"})
+            outbox.close(ws_chat.CLOSE_IDLE)
+            outbox.put({"type": "delta", "id": "1", "text": "depois do close"})
+            await asyncio.wait_for(outbox.drain(send), 5.0)
+            return sent
+
+        sent = run(scenario())
+        self.assertEqual(json.loads(sent[0]["text"]), {"type": "delta", "id": "1", "text": "parte final"})
+        self.assertEqual(sent[1:], [{"type": "websocket.close", "code": ws_chat.CLOSE_IDLE}])
+
+    def test_idle_connection_is_closed_through_the_outbox(self):
+        harness = SocketHarness(headers=[("authorization", f"Bearer {API_KEY}")])
+
+        async def scenario():
+            task = asyncio.create_task(ws_chat.chat_socket(harness.scope, harness.receive, harness.send))
+            harness.incoming.put_nowait({"type": "websocket.connect"})
+            await harness.wait_for(lambda m: m.get("type") == "websocket.close")
+            harness.incoming.put_nowait({"type": "websocket.disconnect", "code": ws_chat.CLOSE_IDLE})
+            await asyncio.wait_for(task, 5.0)
+
+        with mock.patch.dict("os.environ", {"API_KEY": API_KEY}), \
+                mock.patch.object(ws_chat, "HEARTBEAT_INTERVAL", 0.01), mock.patch.object(ws_chat, "IDLE_TIMEOUT", 0):
+            run(scenario())
+        self.assertEqual(harness.sent[-1], {"type": "websocket.close", "code": ws_chat.CLOSE_IDLE})
+        self.assertEqual(len(harness.messages("ready")), 1)
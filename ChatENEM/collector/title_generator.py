@@ -1,10 +1,8 @@
-import os
-from openai import OpenAI
+import re
+from typing import Optional
 
-try:
-    OPENROUTER_API_KEY = os.environ["OPENROUTER_API_KEY"]
-except KeyError:
-    raise ValueError("Missing required environment variable: OPENROUTER_API_KEY")
+from .llm_backends import get_backend
+from .model_tiers import local_tier
 
 
 system = """
@@ -18,10 +16,7 @@ Não explique o título.
 Retorne apenas o título.
 """
 
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=OPENROUTER_API_KEY,
-)
+TITLE_MAX_WORDS = 8
 
 def title_generator(question: str) -> str:
     free_models = [
@@ -32,20 +27,32 @@ def title_generator(question: str) -> str:
         "google/gemma-3-27b-it:free"
     ]
     
+    # Por último, o servidor local (se configurado)
+    attempts = [("openrouter", model, 30) for model in free_models]
+    local = local_tier()
+    if local:
+        attempts += [("local", model, local.timeout) for model in local.models]
+
     answer_text = None
-    for model in free_models:
+    for backend_name, model, timeout in attempts:
+        backend = get_backend(backend_name)
+        if backend is None:
+            continue
         try:
-            completion = client.chat.completions.create(
+            completion = backend.create(
                 model=model,
                 messages=[
                     {"role": "system", "content": system},
                     {"role": "user", "content": question}
                 ],
                 max_tokens=2048,
-                timeout=30
+                timeout=timeout
             )
-            answer_text = completion.choices[0].message.content
-            break  # Sucesso, sair do loop
+            # Mesmas regras do título do modo combinado; fora delas, tenta o próximo
+            answer_text = validate_title(completion.choices[0].message.content)
+            if answer_text:
+                break  # Sucesso, sair do loop
+            print(f"Título inválido do modelo {model}")
         except Exception as e:
             print(f"Erro com modelo {model}: {e}")
             continue
@@ -53,4 +60,19 @@ def title_generator(question: str) -> str:
     if not answer_text:
         return ""
     
-    return answer_text
\ No newline at end of file
+    return answer_text
+
+
+def validate_title(title) -> Optional[str]:
+    """
+    Confere as regras do título (máx. 8 palavras, sem pontuação final).
+    Remove aspas e pontuação final; retorna None se o título não servir.
+    """
+    if not isinstance(title, str):
+        return None
+    title = title.strip().splitlines()[0].strip() if title.strip() else ""
+    title = re.sub(r"^(t[ií]tulo\s*:\s*)", "", title, flags=re.IGNORECASE)
+    title = title.strip("\"'“”‘’*` ").rstrip(".!?;:, ").strip()
+    if not title or len(title.split()) > TITLE_MAX_WORDS:
+        return None
+    return title
\ No newline at end of file
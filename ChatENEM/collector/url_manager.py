@@ -1,20 +1,58 @@
 import json
 import os
-from typing import Set, List
-from urllib.parse import urlparse, urljoin
-import hashlib
+import sqlite3
+import threading
+import time
+from typing import List
+from urllib.parse import urlparse
+
+FRONTIER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    url         TEXT PRIMARY KEY,
+    state       TEXT NOT NULL,            -- pending | leased | visited | failed
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    last_error  TEXT,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS frontier_state ON frontier (state, lease_until);
+"""
 
 class URLManager:
     """
     Gerencia URLs visitadas e pendentes com checkpoint persistente
     (Scraping oficial do ENEM – INEP / MEC)
+
+    A fronteira fica em SQLite (WAL): cada mudança de estado é um UPSERT de
+    uma linha, sem regravar o conjunto inteiro. get_next_pending empresta a
+    URL por lease_seconds em vez de removê-la; se o processo cair antes de
+    mark_visited/mark_failed, a URL volta para a fila quando o empréstimo
+    vence. Falhas (e empréstimos vencidos) voltam para a fila até
+    max_attempts tentativas; depois disso a URL fica como 'failed'.
     """
 
-    def __init__(self, checkpoint_file: str = "ChatENEM\data\enem_scraping_checkpoint.json", domain_filter: str = None):
-        self.checkpoint_file = checkpoint_file
+    def __init__(self, checkpoint_file: str = os.path.join("ChatENEM", "data", "enem_scraping_checkpoint.sqlite3"),
+                 domain_filter: str = None, lease_seconds: float = 300.0, max_attempts: int = 3,
+                 compact_every: int = 1000):
+        # Caminho antigo (.json): a fronteira vai para o .sqlite3 ao lado e o
+        # JSON é importado uma única vez
+        base, ext = os.path.splitext(checkpoint_file)
+        self.legacy_file = checkpoint_file if ext == ".json" else f"{base}.json"
+        self.checkpoint_file = f"{base}.sqlite3" if ext == ".json" else checkpoint_file
         self.domain_filter = domain_filter
-        self.visited_urls: Set[str] = set()
-        self.pending_urls: Set[str] = set()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.compact_every = compact_every
+        self._updates = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.checkpoint_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.checkpoint_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(FRONTIER_SCHEMA)
         self.load_checkpoint()
 
     def normalize_url(self, url: str) -> str:
@@ -80,58 +118,158 @@ class URLManager:
         except:
             return False
 
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._updates += 1
+            if self.compact_every and self._updates % self.compact_every == 0:
+                self._compact()
+            return cursor
+
     def add_pending_url(self, url: str):
-        """Adiciona URL à fila pendente se válida e não visitada"""
+        """Adiciona URL à fila pendente se válida e ainda desconhecida"""
         normalized = self.normalize_url(url)
-        if self.is_valid_url(normalized) and normalized not in self.visited_urls:
-            self.pending_urls.add(normalized)
+        if self.is_valid_url(normalized):
+            self._execute(
+                "INSERT OR IGNORE INTO frontier (url, state, updated_at) VALUES (?, 'pending', ?)",
+                (normalized, time.time()),
+            )
 
     def mark_visited(self, url: str):
         """Marca URL como visitada"""
         normalized = self.normalize_url(url)
-        self.visited_urls.add(normalized)
-        self.pending_urls.discard(normalized)
-        self.save_checkpoint()
+        self._execute(
+            "INSERT INTO frontier (url, state, updated_at) VALUES (?, 'visited', ?) "
+            "ON CONFLICT(url) DO UPDATE SET state = 'visited', lease_until = NULL, last_error = NULL, "
+            "updated_at = excluded.updated_at",
+            (normalized, time.time()),
+        )
+
+    def mark_failed(self, url: str, error: str = "", permanent: bool = False):
+        """
+        Devolve a URL à fila; depois de max_attempts tentativas (ou se a
+        falha for permanente, como um 404), desiste dela
+        """
+        normalized = self.normalize_url(url)
+        self._execute(
+            "UPDATE frontier SET state = CASE WHEN ? OR attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "lease_until = NULL, last_error = ?, updated_at = ? WHERE url = ?",
+            (permanent, self.max_attempts, error, time.time(), normalized),
+        )
 
     def get_next_pending(self) -> str:
-        """Retorna próxima URL pendente"""
-        if self.pending_urls:
-            return self.pending_urls.pop()
-        return None
+        """
+        Empresta a próxima URL pendente (a mais antiga na fila), ou uma
+        emprestada cujo prazo venceu
+        """
+        now = time.time()
+        with self._lock:
+            # Empréstimo vencido já na última tentativa: o processo caiu (ou
+            # travou) com a URL max_attempts vezes, então ela desiste
+            self._conn.execute(
+                "UPDATE frontier SET state = 'failed', lease_until = NULL, "
+                "last_error = COALESCE(last_error, 'empréstimo expirado'), updated_at = ? "
+                "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            # Duas buscas pelo índice (state, lease_until): nenhuma percorre
+            # as URLs já visitadas
+            row = self._conn.execute(
+                "SELECT url FROM frontier WHERE state = 'leased' AND lease_until < ? LIMIT 1", (now,)
+            ).fetchone() or self._conn.execute(
+                "SELECT url FROM frontier WHERE state = 'pending' AND lease_until IS NULL ORDER BY rowid LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE frontier SET state = 'leased', lease_until = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE url = ?",
+                (now + self.lease_seconds, now, row[0]),
+            )
+            return row[0]
+
+    def renew_lease(self, urls: List[str]):
+        """
+        Estende o empréstimo das URLs por mais lease_seconds. O pipeline
+        chama ao começar a processar uma página, para que OCR e embeddings
+        demorados não deixem o prazo vencer e a URL ser buscada de novo
+        """
+        urls = [self.normalize_url(url) for url in urls]
+        if not urls:
+            return
+        now = time.time()
+        placeholders = ", ".join("?" * len(urls))
+        self._execute(
+            f"UPDATE frontier SET lease_until = ?, updated_at = ? "
+            f"WHERE state = 'leased' AND url IN ({placeholders})",
+            (now + self.lease_seconds, now, *urls),
+        )
+
+    def requeue_visited(self) -> int:
+        """
+        Devolve todas as URLs visitadas à fila (na ordem em que entraram na
+        fronteira), para uma nova coleta que revalida as páginas já
+        processadas. Retorna quantas URLs voltaram para a fila
+        """
+        cursor = self._execute(
+            "UPDATE frontier SET state = 'pending', attempts = 0, lease_until = NULL, "
+            "last_error = NULL, updated_at = ? WHERE state = 'visited'",
+            (time.time(),),
+        )
+        return cursor.rowcount
 
     def add_seed_urls(self, urls: List[str]):
         """Adiciona URLs iniciais"""
         for url in urls:
             self.add_pending_url(url)
 
+    def _compact(self):
+        # Aplica o WAL no arquivo principal e trunca o WAL
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
     def save_checkpoint(self):
-        """Salva estado atual em arquivo"""
-        data = {
-            "visited_urls": list(self.visited_urls),
-            "pending_urls": list(self.pending_urls)
-        }
+        """Compacta a fronteira (cada atualização já é gravada na hora)"""
+        with self._lock:
+            self._compact()
+            self._conn.execute("VACUUM")
+
+    def load_checkpoint(self):
+        """Importa o checkpoint JSON antigo, se a fronteira ainda estiver vazia"""
+        with self._lock:
+            empty = self._conn.execute("SELECT 1 FROM frontier LIMIT 1").fetchone() is None
+        if not empty or not os.path.exists(self.legacy_file):
+            return
         try:
-            with open(self.checkpoint_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
         except Exception as e:
-            print(f"Erro salvando checkpoint: {e}")
+            print(f"Erro carregando checkpoint: {e}")
+            return
 
-    def load_checkpoint(self):
-        """Carrega estado do arquivo"""
-        if os.path.exists(self.checkpoint_file):
-            try:
-                with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.visited_urls = set(data.get('visited_urls', []))
-                    self.pending_urls = set(data.get('pending_urls', []))
-                print(f"Checkpoint carregado: {len(self.visited_urls)} visitadas, {len(self.pending_urls)} pendentes")
-            except Exception as e:
-                print(f"Erro carregando checkpoint: {e}")
+        now = time.time()
+        rows = [(url, 'visited', now) for url in data.get('visited_urls', [])]
+        rows += [(url, 'pending', now) for url in data.get('pending_urls', [])]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO frontier (url, state, updated_at) VALUES (?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+        print(f"Checkpoint JSON importado: {len(data.get('visited_urls', []))} visitadas, "
+              f"{len(data.get('pending_urls', []))} pendentes")
 
     def get_stats(self) -> dict:
         """Retorna estatísticas"""
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state").fetchall())
         return {
-            "visited_count": len(self.visited_urls),
-            "pending_count": len(self.pending_urls),
-            "total_count": len(self.visited_urls) + len(self.pending_urls)
+            "visited_count": counts.get("visited", 0),
+            "pending_count": counts.get("pending", 0),
+            "in_flight_count": counts.get("leased", 0),
+            "failed_count": counts.get("failed", 0),
+            "total_count": sum(counts.values())
         }
+
+    def close(self):
+        with self._lock:
+            self._compact()
+            self._conn.close()
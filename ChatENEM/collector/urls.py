@@ -5,4 +5,6 @@ app_name = "collector"
 
 urlpatterns = [
     path("ask/", views.ask, name="ask"),
+    path("ready/", views.ready, name="ready"),
+    path("metrics/", views.metrics, name="metrics"),
 ]
\ No newline at end of file
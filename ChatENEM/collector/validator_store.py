@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+def content_hash(content) -> str:
+    if isinstance(content, str):
+        content = content.encode("utf-8", "replace")
+    return hashlib.sha256(content or b"").hexdigest()
+
+
+class ValidatorStore:
+    """
+    Validadores HTTP por URL (ETag, Last-Modified e hash do conteúdo) da
+    última versão processada com sucesso, mais os links daquela versão.
+
+    O HTTPClient lê os validadores para montar o GET condicional; a
+    gravação (commit) é feita pelo pipeline só depois que a página foi
+    extraída, dividida em chunks e inserida. Assim uma falha no meio do
+    processamento nunca faz a próxima coleta receber 304 de uma página
+    que não chegou ao banco.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS validators ("
+            " url TEXT PRIMARY KEY,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " content_hash TEXT,"
+            " links TEXT,"
+            " updated_at REAL)"
+        )
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, links FROM validators WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "content_hash": row[2],
+            "links": json.loads(row[3]) if row[3] else [],
+        }
+
+    def commit(self, url: str, etag: Optional[str], last_modified: Optional[str],
+               content_hash: Optional[str], links: Optional[List[str]] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO validators (url, etag, last_modified, content_hash, links, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, content_hash, json.dumps(links or [], ensure_ascii=False), time.time()),
+            )
+
+    def forget(self, url: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM validators WHERE url = ?", (url,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,189 @@
+"""
+Codecs de compressão de embeddings e índice local com busca em dois estágios.
+
+Vetores e5 de 1024 dimensões em float32 ocupam 4 KB por chunk. Os codecs
+abaixo reduzem isso para:
+  - int8 escalar:         1 KB   (quantização simétrica por dimensão)
+  - PCA / truncamento:    d' * 4 bytes (ou d' bytes combinado com int8)
+  - binário (sinal):      128 bytes (1 bit por dimensão, distância de Hamming)
+
+A busca usa os códigos binários para uma primeira passada grosseira, reordena
+a lista curta com int8 e, quando os vetores completos estão disponíveis
+(por exemplo via memória mapeada), faz o rescoring exato em float32.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Quantos bits ligados há em cada byte (popcount por tabela)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def as_matrix(vectors) -> np.ndarray:
+    """Converte lista de vetores em matriz float32 contígua"""
+    return np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def format_vector(embedding: Sequence[float], precision: int = 6) -> str:
+    """
+    Serializa um embedding no formato texto do pgvector ("[0.1,0.2,...]")
+    com precisão limitada. Floats completos em JSON gastam ~20 caracteres por
+    dimensão; com 6 dígitos significativos o payload cai para menos da metade
+    sem perda relevante para similaridade de cosseno.
+    """
+    return "[" + ",".join(f"{float(x):.{precision}g}" for x in embedding) + "]"
+
+
+class Int8Codec:
+    """Quantização escalar simétrica por dimensão: x ≈ code * scale"""
+
+    name = "int8"
+
+    def __init__(self, scale: Optional[np.ndarray] = None):
+        self.scale = scale
+
+    def fit(self, matrix: np.ndarray) -> "Int8Codec":
+        max_abs = np.abs(matrix).max(axis=0)
+        max_abs[max_abs == 0] = 1.0
+        self.scale = (max_abs / 127.0).astype(np.float32)
+        return self
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        codes = np.rint(matrix / self.scale)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * self.scale
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Produto interno aproximado entre a consulta e os códigos"""
+        return codes.astype(np.float32) @ (query * self.scale)
+
+
+class PCACodec:
+    """
+    Redução de dimensionalidade por PCA. Com truncate=True apenas mantém as
+    primeiras dimensões (estilo Matryoshka); o e5 não foi treinado para isso,
+    então PCA costuma preservar melhor a ordenação.
+    """
+
+    name = "pca"
+
+    def __init__(self, dim: int = 256, truncate: bool = False,
+                 mean: Optional[np.ndarray] = None, components: Optional[np.ndarray] = None):
+        self.dim = dim
+        self.truncate = truncate
+        self.mean = mean
+        self.components = components
+
+    def fit(self, matrix: np.ndarray) -> "PCACodec":
+        if self.truncate:
+            return self
+        self.mean = matrix.mean(axis=0).astype(np.float32)
+        # SVD da amostra centralizada: linhas de vt são as direções principais
+        _, _, vt = np.linalg.svd(matrix - self.mean, full_matrices=False)
+        self.components = np.ascontiguousarray(vt[:self.dim].astype(np.float32))
+        return self
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        if self.truncate:
+            return l2_normalize(np.ascontiguousarray(matrix[..., :self.dim]))
+        return ((matrix - self.mean) @ self.components.T).astype(np.float32)
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return codes @ self.encode(query)
+
+
+class BinaryCodec:
+    """Código de sinal (1 bit por dimensão) comparado por distância de Hamming"""
+
+    name = "binary"
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        return np.packbits(matrix > 0, axis=-1)
+
+    def hamming(self, query_code: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return _POPCOUNT[np.bitwise_xor(codes, query_code)].sum(axis=-1, dtype=np.int32)
+
+
+class CompressedIndex:
+    """
+    Índice local sobre embeddings comprimidos.
+
+    Estágios da busca:
+      1. Hamming sobre códigos binários → coarse_k candidatos
+      2. produto interno int8 (opcionalmente sobre a projeção PCA) → rescore_k candidatos
+      3. cosseno exato com os vetores float32 (se disponíveis) → k resultados
+    """
+
+    def __init__(self, binary_codes: np.ndarray, int8_codes: np.ndarray, int8_codec: Int8Codec,
+                 full_vectors: Optional[np.ndarray] = None, projector: Optional[PCACodec] = None):
+        self.binary = BinaryCodec()
+        self.binary_codes = binary_codes
+        self.int8_codes = int8_codes
+        self.int8_codec = int8_codec
+        self.full_vectors = full_vectors
+        self.projector = projector
+
+    @classmethod
+    def build(cls, vectors, keep_full: bool = True, pca_dim: Optional[int] = None,
+              truncate: bool = False) -> "CompressedIndex":
+        matrix = l2_normalize(as_matrix(vectors))
+        projector = PCACodec(pca_dim, truncate=truncate).fit(matrix) if pca_dim else None
+        reduced = projector.encode(matrix) if projector else matrix
+        int8_codec = Int8Codec().fit(reduced)
+        return cls(
+            binary_codes=BinaryCodec().encode(matrix),
+            int8_codes=int8_codec.encode(reduced),
+            int8_codec=int8_codec,
+            full_vectors=matrix if keep_full else None,
+            projector=projector,
+        )
+
+    def __len__(self):
+        return len(self.int8_codes)
+
+    def nbytes(self) -> int:
+        return self.binary_codes.nbytes + self.int8_codes.nbytes
+
+    def search(self, query, k: int = 5, coarse_k: Optional[int] = None,
+               rescore_k: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Retorna [(posição, similaridade)] em ordem decrescente.
+        A similaridade é o cosseno exato quando há vetores completos.
+        """
+        n = len(self)
+        if n == 0:
+            return []
+        q = l2_normalize(as_matrix(query).reshape(1, -1))[0]
+        rescore_k = min(n, rescore_k or max(k * 4, 32))
+        coarse_k = min(n, max(coarse_k or rescore_k * 8, rescore_k))
+
+        # 1. Hamming
+        if coarse_k < n:
+            dist = self.binary.hamming(self.binary.encode(q), self.binary_codes)
+            candidates = np.argpartition(dist, coarse_k - 1)[:coarse_k]
+        else:
+            candidates = np.arange(n)
+
+        # 2. int8
+        q_reduced = self.projector.encode(q) if self.projector else q
+        approx = self.int8_codec.scores(q_reduced, self.int8_codes[candidates])
+        if rescore_k < len(candidates):
+            top = np.argpartition(-approx, rescore_k - 1)[:rescore_k]
+            candidates, approx = candidates[top], approx[top]
+
+        # 3. rescoring exato
+        if self.full_vectors is not None:
+            rows = np.sort(candidates)  # leitura sequencial em vetores mapeados
+            exact = l2_normalize(np.asarray(self.full_vectors[rows], dtype=np.float32)) @ q
+            candidates, approx = rows, exact
+
+        order = np.argsort(-approx)[:k]
+        return [(int(candidates[i]), float(approx[i])) for i in order]
@@ -0,0 +1,290 @@
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+from typing import List, Dict, Any, Optional, Iterable
+
+import numpy as np
+
+from .vector_codecs import BinaryCodec, CompressedIndex, Int8Codec
+
+# Arquivos de um snapshot
+VECTORS_FILE = "vectors.f32"      # matriz N x D float32 contígua (normalizada)
+BINARY_FILE = "binary.u8"         # códigos de sinal N x D/8
+INT8_FILE = "int8.i8"             # códigos int8 N x D
+INT8_SCALE_FILE = "int8_scale.f32"
+OFFSETS_FILE = "offsets.u64"      # N x 4: início/fim do texto, início/fim dos metadados
+TEXTS_FILE = "texts.bin"          # textos dos chunks em UTF-8, concatenados
+META_FILE = "meta.bin"            # JSON UTF-8 por chunk (id, document_id, metadata...)
+MANIFEST_FILE = "manifest.json"
+
+CURRENT_LINK = "current"
+SNAPSHOTS_DIR = "snapshots"
+KEEP_SNAPSHOTS = 2
+
+
+class VectorStoreWriter:
+    """
+    Constrói um snapshot somente leitura do índice local em disco.
+
+    As linhas são gravadas em streaming (sem carregar o corpus em memória).
+    commit() calcula os códigos comprimidos, grava o manifesto e troca o link
+    "current" de forma atômica; workers abertos passam a ver o novo snapshot
+    no próximo refresh, sem reinício.
+    """
+
+    def __init__(self, root: str, dim: int = 1024):
+        self.root = root
+        self.dim = dim
+        # Nomes em ordem cronológica (a limpeza ordena por nome) e distintos
+        # mesmo para dois builds no mesmo segundo: o segundo não pode
+        # sobrescrever o snapshot que os workers estão lendo
+        now = time.time_ns()
+        self.name = (time.strftime("%Y%m%d-%H%M%S", time.localtime(now // 10 ** 9))
+                     + f"-{now % 10 ** 9:09d}-{os.getpid()}")
+        self.path = os.path.join(root, SNAPSHOTS_DIR, self.name)
+        os.makedirs(self.path, exist_ok=True)
+
+        self.count = 0
+        self._vectors = open(os.path.join(self.path, VECTORS_FILE), "wb")
+        self._texts = open(os.path.join(self.path, TEXTS_FILE), "wb")
+        self._meta = open(os.path.join(self.path, META_FILE), "wb")
+        self._offsets = open(os.path.join(self.path, OFFSETS_FILE), "wb")
+        self._text_pos = 0
+        self._meta_pos = 0
+
+    def add(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Adiciona chunks ao snapshot. Cada linha precisa de "embedding" (lista de
+        floats) e "chunk_text"; as demais chaves vão para os metadados.
+        """
+        added = 0
+        for row in rows:
+            vector = np.asarray(row["embedding"], dtype=np.float32)
+            if vector.shape != (self.dim,):
+                print(f"Embedding ignorado (dimensão {vector.shape}) no chunk {row.get('id')}")
+                continue
+            norm = np.linalg.norm(vector) or 1.0
+            self._vectors.write((vector / norm).astype(np.float32).tobytes())
+
+            text = (row.get("chunk_text") or "").encode("utf-8")
+            meta = {k: v for k, v in row.items() if k not in ("embedding", "chunk_text")}
+            meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+
+            self._texts.write(text)
+            self._meta.write(meta_bytes)
+            offsets = np.array([
+                self._text_pos, self._text_pos + len(text),
+                self._meta_pos, self._meta_pos + len(meta_bytes),
+            ], dtype=np.uint64)
+            self._offsets.write(offsets.tobytes())
+            self._text_pos += len(text)
+            self._meta_pos += len(meta_bytes)
+
+            self.count += 1
+            added += 1
+        return added
+
+    def commit(self, batch_size: int = 8192) -> str:
+        """Finaliza o snapshot e o publica como "current". Retorna o caminho"""
+        for f in (self._vectors, self._texts, self._meta, self._offsets):
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+
+        self._write_codes(batch_size)
+
+        manifest = {
+            "name": self.name,
+            "count": self.count,
+            "dim": self.dim,
+            "created_at": time.time(),
+        }
+        with open(os.path.join(self.path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        self._swap_current()
+        self._cleanup_old()
+        return self.path
+
+    def _write_codes(self, batch_size: int):
+        if self.count == 0:
+            for name in (BINARY_FILE, INT8_FILE):
+                open(os.path.join(self.path, name), "wb").close()
+            np.ones(self.dim, dtype=np.float32).tofile(os.path.join(self.path, INT8_SCALE_FILE))
+            return
+
+        vectors = np.memmap(os.path.join(self.path, VECTORS_FILE), dtype=np.float32,
+                            mode="r", shape=(self.count, self.dim))
+
+        # Escala int8 precisa do máximo por dimensão em todo o corpus
+        max_abs = np.zeros(self.dim, dtype=np.float32)
+        for start in range(0, self.count, batch_size):
+            np.maximum(max_abs, np.abs(vectors[start:start + batch_size]).max(axis=0), out=max_abs)
+        max_abs[max_abs == 0] = 1.0
+        int8_codec = Int8Codec((max_abs / 127.0).astype(np.float32))
+        int8_codec.scale.tofile(os.path.join(self.path, INT8_SCALE_FILE))
+
+        binary = BinaryCodec()
+        with open(os.path.join(self.path, BINARY_FILE), "wb") as fb, \
+                open(os.path.join(self.path, INT8_FILE), "wb") as fi:
+            for start in range(0, self.count, batch_size):
+                batch = np.asarray(vectors[start:start + batch_size])
+                fb.write(binary.encode(batch).tobytes())
+                fi.write(int8_codec.encode(batch).tobytes())
+        del vectors
+
+    def _swap_current(self):
+        link = os.path.join(self.root, CURRENT_LINK)
+        tmp_link = f"{link}.{os.getpid()}.tmp"
+        target = os.path.join(SNAPSHOTS_DIR, self.name)
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(target, tmp_link)
+        os.replace(tmp_link, link)  # rename atômico no mesmo diretório
+
+    def _cleanup_old(self):
+        # Workers que ainda mapeiam um snapshot antigo continuam lendo os
+        # arquivos removidos até reabrirem (o kernel mantém as páginas).
+        snapshots_dir = os.path.join(self.root, SNAPSHOTS_DIR)
+        names = sorted(os.listdir(snapshots_dir))
+        for name in names[:-KEEP_SNAPSHOTS]:
+            if name != self.name:
+                shutil.rmtree(os.path.join(snapshots_dir, name), ignore_errors=True)
+
+
+class _Snapshot:
+    """Arquivos de um snapshot abertos via mmap"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        n, dim = self.manifest["count"], self.manifest["dim"]
+
+        def _memmap(name, dtype, shape):
+            if n == 0:
+                return np.zeros(shape, dtype=dtype)
+            return np.memmap(os.path.join(path, name), dtype=dtype, mode="r", shape=shape)
+
+        self.vectors = _memmap(VECTORS_FILE, np.float32, (n, dim))
+        self.offsets = _memmap(OFFSETS_FILE, np.uint64, (n, 4))
+        self.index = CompressedIndex(
+            binary_codes=_memmap(BINARY_FILE, np.uint8, (n, dim // 8)),
+            int8_codes=_memmap(INT8_FILE, np.int8, (n, dim)),
+            int8_codec=Int8Codec(np.fromfile(os.path.join(path, INT8_SCALE_FILE), dtype=np.float32)),
+            full_vectors=self.vectors,
+        )
+        self.texts = self._map_blob(TEXTS_FILE)
+        self.meta = self._map_blob(META_FILE)
+
+    def _map_blob(self, name: str):
+        with open(os.path.join(self.path, name), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def row(self, i: int, with_embedding: bool = False) -> Dict[str, Any]:
+        t0, t1, m0, m1 = (int(x) for x in self.offsets[i])
+        row = json.loads(self.meta[m0:m1].decode("utf-8"))
+        row["chunk_text"] = self.texts[t0:t1].decode("utf-8")
+        if with_embedding:
+            row["embedding"] = self.vectors[i].tolist()
+        return row
+
+
+class MmapVectorStore:
+    """
+    Leitor do índice local compartilhado entre workers.
+
+    Vetores, códigos e textos são mapeados em memória somente leitura, então
+    todos os workers do gunicorn compartilham as mesmas páginas pelo page cache
+    do sistema operacional. O link "current" é verificado periodicamente e,
+    quando aponta para um novo snapshot, o store é reaberto.
+    """
+
+    def __init__(self, root: str, refresh_interval: float = 30.0):
+        self.root = root
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[_Snapshot] = None
+        self._target: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reabre o store se o link "current" mudou. Retorna True se há snapshot"""
+        now = time.time()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return self._snapshot is not None
+        self._checked_at = now
+
+        link = os.path.join(self.root, CURRENT_LINK)
+        try:
+            target = os.path.realpath(link) if os.path.lexists(link) else None
+        except OSError:
+            target = None
+        if target is None or target == self._target:
+            return self._snapshot is not None
+
+        with self._lock:
+            try:
+                self._snapshot = _Snapshot(target)
+                self._target = target
+                print(f"Índice local carregado: {target} ({self._snapshot.manifest['count']} chunks)")
+            except Exception as e:
+                print(f"Erro abrindo índice local {target}: {e}")
+        return self._snapshot is not None
+
+    @property
+    def available(self) -> bool:
+        return self._snapshot is not None
+
+    def __len__(self):
+        return self._snapshot.manifest["count"] if self._snapshot else 0
+
+    def search(self, query_embedding: List[float], k: int = 5, with_embedding: bool = True) -> List[Dict[str, Any]]:
+        """
+        Busca os k chunks mais similares. Retorna linhas no mesmo formato do
+        RPC search_chunks (com "similarity").
+        """
+        self.refresh()
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+        results = []
+        for i, score in snapshot.index.search(query_embedding, k):
+            row = snapshot.row(i, with_embedding=with_embedding)
+            row["similarity"] = score
+            results.append(row)
+        return results
+
+    def prefetch(self):
+        """Toca nos códigos comprimidos para trazê-los ao page cache (warm-up)"""
+        snapshot = self._snapshot
+        if snapshot is not None and len(snapshot.index):
+            int(np.asarray(snapshot.index.binary_codes).sum(dtype=np.int64))
+            int(np.asarray(snapshot.index.int8_codes).sum(dtype=np.int64))
+
+
+_store: Optional[MmapVectorStore] = None
+_store_lock = threading.Lock()
+
+
+def get_local_store() -> Optional[MmapVectorStore]:
+    """
+    Store local configurado em settings.LOCAL_INDEX_DIR, aberto uma vez por
+    processo. Retorna None se não configurado ou sem snapshot publicado.
+    """
+    global _store
+    from django.conf import settings
+    root = getattr(settings, "LOCAL_INDEX_DIR", None)
+    if not root:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = MmapVectorStore(root)
+    return _store if _store.refresh() else None
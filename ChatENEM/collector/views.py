@@ -1,13 +1,19 @@
 import os
+import time
+from django.http import HttpResponse
 from django.shortcuts import render
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 
+from .metrics import ASK_LATENCY, ASK_REQUESTS, registry
+
 @api_view(["POST"])
 def ask(request):
     """
-    Endpoint /collector/ask/ aceita JSON { "question": "...", "k": 5(optional), first_question(bool) }.
+    Endpoint /collector/ask/ aceita JSON { "question": "...", "k": 5(optional), first_question(bool),
+    conversation_id(optional) }.
+    Com conversation_id, perguntas de continuação reaproveitam o contexto recuperado antes.
     Retorna JSON com { answer, citations, found_context, title }.
     """
     # Verificar API Key
@@ -18,32 +24,45 @@ def ask(request):
     # print("HEADERS COMPLETOS:", dict(request.headers))
 
     if api_key != expected_key:
+        ASK_REQUESTS.inc(status="unauthorized")
         return Response({"error": "Unauthorized - Invalid API Key"}, status=status.HTTP_401_UNAUTHORIZED)
     
     question = request.data.get("question") or request.data.get("q")
     if not question:
+        ASK_REQUESTS.inc(status="bad_request")
         return Response({"detail": "campo 'question' obrigatório"}, status=status.HTTP_400_BAD_REQUEST)
     
     try:
         k = int(request.data.get("k", 5))
         if k <= 0 or k >= 100:
+            ASK_REQUESTS.inc(status="bad_request")
             return Response({"detail": "Parameter 'k' must be positive and less than 100"}, status=status.HTTP_400_BAD_REQUEST)
     except (ValueError, TypeError):
         k = 5
+
+    conversation_id = request.data.get("conversation_id")
+    if conversation_id is not None:
+        conversation_id = str(conversation_id).strip()[:128] or None
     
+    started = time.perf_counter()
     try:
         from .agent import answer_question
         from .title_generator import title_generator
-        result = answer_question(question, k=k)
-        first_question = request.data.get("first_question")
-        if first_question:
+        first_question = bool(request.data.get("first_question"))
+        result = answer_question(question, k=k, conversation_id=conversation_id, with_title=first_question)
+        # Título separado só quando a chamada combinada não o trouxe
+        if first_question and not result.get("title"):
             result["title"] = title_generator(question)
+        ASK_REQUESTS.inc(status="ok")
+        ASK_LATENCY.observe(time.perf_counter() - started)
         return Response(
                 result,
                 content_type="application/json; charset=utf-8"
             )
 
     except Exception as e:
+        ASK_REQUESTS.inc(status="error")
+        ASK_LATENCY.observe(time.perf_counter() - started)
         return Response({
             "answer": "Erro interno. Pergunta: " + question,
             "citations": [],
@@ -51,3 +70,24 @@ def ask(request):
             "error": str(e)
         })
 
+
+
+@api_view(["GET"])
+def ready(request):
+    """
+    Endpoint /collector/ready/ para o balanceador de carga.
+    Retorna 200 somente depois que o warm-up do worker terminou; antes disso, 503.
+    """
+    from .warmup import status as warmup_status
+    state = warmup_status()
+    code = status.HTTP_200_OK if state["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE
+    return Response(state, status=code)
+
+
+
+def metrics(request):
+    """
+    Endpoint /collector/metrics/ no formato de texto do Prometheus, somando
+    os contadores de todos os processos que gravam em settings.METRICS_DIR.
+    """
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,196 @@
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Tuple, Any
+
+WARMUP_TEXT = "ENEM"
+
+# Processos de servidor reconhecidos pelo argv[0] (gunicorn, uvicorn etc.)
+SERVER_COMMANDS = ("gunicorn", "uvicorn", "daphne", "hypercorn", "uwsgi")
+
+_ready = threading.Event()
+_started = False
+_enabled = None
+_lock = threading.Lock()
+_state: Dict[str, Any] = {
+    "started_at": None,
+    "finished_at": None,
+    "steps": {},
+    "error": None,
+}
+
+
+def _reset_after_fork():
+    # Threads não sobrevivem ao fork (gunicorn --preload): o filho aquece de novo
+    global _ready, _started, _lock
+    _ready = threading.Event()
+    _started = False
+    _lock = threading.Lock()
+    _state.update(started_at=None, finished_at=None, steps={}, error=None)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _import_agent():
+    """Importa módulos pesados (openai, clientes) fora do caminho da requisição"""
+    from . import agent  # noqa: F401
+    from . import title_generator  # noqa: F401
+
+
+def _open_local_index():
+    # Abre o índice local (se configurado) e traz os códigos ao page cache
+    from .vector_store import get_local_store
+    store = get_local_store()
+    if store is not None:
+        store.prefetch()
+
+
+def _load_documents():
+    from .document_cache import document_cache
+    document_cache.load_all()
+
+
+def _load_entity_index():
+    from .entity_index import get_entity_index
+    get_entity_index()
+
+
+def _prime_supabase():
+    from .supabase_client import SupabaseClient
+    if not SupabaseClient().ping():
+        raise RuntimeError("Supabase não respondeu 200")
+
+
+def _open_postgres():
+    # Abre o pool da conexão direta (se configurada) e registra o tipo vector
+    from .pg_backend import get_postgres_backend
+    pg = get_postgres_backend()
+    if pg is not None:
+        pg.ping()
+
+
+def _prime_embedding():
+    # Uma chamada real: abre a conexão TLS e espera o modelo carregar no HF
+    # (o 503 "model loading" acontece aqui e não na primeira pergunta).
+    from .embedding import embed_batch
+    embed_batch([WARMUP_TEXT], mode="query")
+
+
+def _prime_llm():
+    from .llm_backends import get_backend
+    for name in ("openrouter", "local"):
+        backend = get_backend(name)
+        if backend is not None:
+            backend.client.models.list()
+
+
+# Etapas executadas em ordem. Etapas "obrigatórias" impedem o worker de ficar
+# pronto se falharem; as demais só registram o erro.
+WARMUP_STEPS: List[Tuple[str, Callable[[], None], bool]] = [
+    ("import_agent", _import_agent, True),
+    ("local_index", _open_local_index, False),
+    ("supabase", _prime_supabase, False),
+    ("postgres", _open_postgres, False),
+    ("documents", _load_documents, False),
+    ("entity_index", _load_entity_index, False),
+    ("embedding", _prime_embedding, False),
+    ("llm", _prime_llm, False),
+]
+
+
+def run_warmup():
+    """Executa todas as etapas de warm-up e marca o worker como pronto"""
+    _state["started_at"] = time.time()
+    failed_required = False
+
+    for name, step, required in WARMUP_STEPS:
+        t0 = time.time()
+        try:
+            step()
+            _state["steps"][name] = {"ok": True, "seconds": round(time.time() - t0, 3)}
+            print(f"[warm-up] {name} ok ({time.time() - t0:.2f}s)")
+        except Exception as e:
+            _state["steps"][name] = {"ok": False, "seconds": round(time.time() - t0, 3), "error": str(e)}
+            print(f"[warm-up] {name} falhou: {e}")
+            traceback.print_exc()
+            if required:
+                failed_required = True
+                _state["error"] = f"{name}: {e}"
+                break
+
+    _state["finished_at"] = time.time()
+    if not failed_required:
+        _ready.set()
+
+
+def start_warmup(background: bool = True):
+    """Dispara o warm-up uma única vez por processo"""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+
+    if background:
+        threading.Thread(target=run_warmup, name="chatenem-warmup", daemon=True).start()
+    else:
+        run_warmup()
+
+
+def start_warmup_on_request(sender=None, **kwargs):
+    """
+    Receptor de request_started (e chamado pelo WebSocket): aquece no
+    primeiro request do processo. Assim o warm-up sempre roda no worker que
+    vai atender, depois de qualquer fork do servidor; o /collector/ready/ da
+    sonda de prontidão já dispara o aquecimento.
+
+    Com gunicorn, um hook post_fork que chame start_warmup() aquece antes
+    mesmo do primeiro request.
+    """
+    global _enabled
+    if _started:
+        return
+    if _enabled is None:
+        _enabled = should_warmup()
+    if _enabled:
+        start_warmup()
+
+
+def should_warmup() -> bool:
+    """
+    Só aquece processos que vão atender requisições: gunicorn/uvicorn (e
+    afins) ou o processo filho do runserver. Qualquer outro ponto de entrada
+    (pytest, manage.py test/migrate/shell, scripts) fica sem warm-up.
+    CHATENEM_WARMUP=1 força o warm-up (outros servidores), =0 desliga.
+    """
+    forced = os.environ.get("CHATENEM_WARMUP")
+    if forced in ("0", "1"):
+        return forced == "1"
+
+    argv = sys.argv
+    if not argv:
+        return False
+    if argv[0].endswith("manage.py"):
+        if len(argv) < 2 or argv[1] != "runserver":
+            return False
+        # O autoreloader do runserver executa o app em um processo filho
+        return os.environ.get("RUN_MAIN") == "true" or "--noreload" in argv
+    # "gunicorn ..." ou "python -m gunicorn ..." (argv[0] = .../gunicorn/__main__.py)
+    parts = os.path.normpath(argv[0]).split(os.sep)
+    return any(part in SERVER_COMMANDS for part in parts)
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def status() -> Dict[str, Any]:
+    return {
+        "ready": is_ready(),
+        "started": _started,
+        **_state,
+    }
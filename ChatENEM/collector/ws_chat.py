@@ -0,0 +1,275 @@
+import asyncio
+import hmac
+import json
+import os
+import time
+import uuid
+from collections import deque
+from functools import partial
+from typing import Any, Deque, Dict, Optional
+from urllib.parse import parse_qs
+
+from .metrics import ASK_LATENCY, ASK_REQUESTS
+
+WS_PATH = "/collector/ws/chat"
+
+HEARTBEAT_INTERVAL = 20.0   # ping do servidor
+IDLE_TIMEOUT = 60.0         # sem nenhuma mensagem do cliente (nem pong) → fecha
+MAX_PENDING = 4             # perguntas na fila de uma conexão
+MAX_MESSAGE_BYTES = 16 * 1024
+MAX_QUESTION_CHARS = 2000
+AUTH_TIMEOUT = 10.0         # prazo para a mensagem "auth" sem header Authorization
+
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+CLOSE_IDLE = 4408
+
+# =============================
+# PROTOCOLO
+# =============================
+#
+# Autenticação: header "Authorization: Bearer <API_KEY>" no handshake ou,
+# para navegadores (que não enviam headers no WebSocket), a primeira mensagem
+# {"type": "auth", "token": "<API_KEY>"} em até AUTH_TIMEOUT segundos. A chave
+# nunca vai na URL, que acaba em logs de proxies e servidores.
+#
+# Cliente → servidor:
+#   {"type": "auth", "token": "..."}                 (só se não houver header)
+#   {"type": "ask", "id": "1", "question": "...", "k": 5}
+#   {"type": "ping"} / {"type": "pong"}
+#
+# Servidor → cliente:
+#   {"type": "ready", "conversation_id": "..."}
+#   {"type": "start", "id": "1"}
+#   {"type": "delta", "id": "1", "text": "..."}     (partes da resposta)
+#   {"type": "reset", "id": "1"}                     (descartar parcial; outro modelo recomeça)
+#   {"type": "done", "id": "1", "answer": ..., "citations": [...], "found_context": ...}
+#   {"type": "title", "id": "1", "title": "..."}     (só na primeira pergunta, depois do "done")
+#   {"type": "error", "id": "1", "detail": "..."}
+#   {"type": "ping"} / {"type": "pong"}
+
+
+def _api_key() -> str:
+    return os.environ.get("API_KEY", "default-secret-key")
+
+
+def _authorized(scope: Dict[str, Any]) -> bool:
+    """Mesma chave do /collector/ask, no header Authorization do handshake"""
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+    return hmac.compare_digest(headers.get("authorization", ""), f"Bearer {_api_key()}")
+
+
+async def _authenticate(receive) -> bool:
+    """Sem header: a primeira mensagem precisa ser {"type": "auth", "token": ...}"""
+    try:
+        event = await asyncio.wait_for(receive(), AUTH_TIMEOUT)
+    except asyncio.TimeoutError:
+        return False
+    if event["type"] != "websocket.receive":
+        return False
+    try:
+        message = json.loads(event.get("text") or (event.get("bytes") or b"").decode("utf-8", "replace"))
+    except ValueError:
+        return False
+    if not isinstance(message, dict) or message.get("type") != "auth":
+        return False
+    return hmac.compare_digest(str(message.get("token") or ""), _api_key())
+
+
+class Outbox:
+    """
+    Fila de saída de uma conexão. Enquanto o envio está lento (cliente ou
+    rede), deltas consecutivos da mesma pergunta são concatenados em uma
+    única mensagem: a geração nunca espera pelo socket e a memória fica
+    limitada ao tamanho da resposta.
+
+    close() também passa pela fila: o fechamento sai depois das mensagens
+    já enfileiradas e nada é enviado depois dele.
+    """
+
+    def __init__(self):
+        self._messages: Deque[Dict[str, Any]] = deque()
+        self._event = asyncio.Event()
+        self._closing = False
+
+    def put(self, message: Dict[str, Any]):
+        if self._closing:
+            return
+        last = self._messages[-1] if self._messages else None
+        if (message["type"] == "delta" and last is not None
+                and last["type"] == "delta" and last["id"] == message["id"]):
+            last["text"] += message["text"]
+        else:
+            self._messages.append(message)
+        self._event.set()
+
+    def close(self, code: int):
+        if self._closing:
+            return
+        self._messages.append({"type": "websocket.close", "code": code})
+        self._closing = True
+        self._event.set()
+
+    async def drain(self, send):
+        while True:
+            await self._event.wait()
+            self._event.clear()
+            while self._messages:
+                message = self._messages.popleft()
+                if message["type"] == "websocket.close":
+                    await send(message)
+                    return
+                await send({"type": "websocket.send", "text": json.dumps(message, ensure_ascii=False)})
+
+
+class ChatSession:
+    """
+    Uma conexão WebSocket autenticada = uma conversa. O contexto de
+    recuperação fica no servidor (conversation_store, pela conversation_id
+    da conexão); as perguntas são respondidas em ordem, uma de cada vez,
+    com a resposta do LLM transmitida em partes.
+    """
+
+    def __init__(self, scope: Dict[str, Any], send):
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        requested = (query.get("conversation_id", [""])[0] or "").strip()[:128]
+        self.conversation_id = requested or uuid.uuid4().hex
+        self.send = send
+        self.outbox = Outbox()
+        self.pending: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=MAX_PENDING)
+        self.last_seen = time.monotonic()
+        self.first_question = not requested
+        self.closed = False
+
+    async def run(self, receive):
+        tasks = [
+            asyncio.create_task(self.outbox.drain(self.send)),
+            asyncio.create_task(self._heartbeat()),
+            asyncio.create_task(self._answer_loop()),
+        ]
+        self.outbox.put({"type": "ready", "conversation_id": self.conversation_id})
+        try:
+            while True:
+                event = await receive()
+                if event["type"] == "websocket.disconnect":
+                    break
+                if event["type"] == "websocket.receive":
+                    self.last_seen = time.monotonic()
+                    self._handle(event.get("text") or (event.get("bytes") or b"").decode("utf-8", "replace"))
+        finally:
+            self.closed = True
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _handle(self, raw: str):
+        if len(raw) > MAX_MESSAGE_BYTES:
+            self.outbox.put({"type": "error", "id": None, "detail": "mensagem muito grande"})
+            return
+        try:
+            message = json.loads(raw)
+            kind = message.get("type")
+        except (ValueError, AttributeError):
+            self.outbox.put({"type": "error", "id": None, "detail": "JSON inválido"})
+            return
+
+        if kind == "ping":
+            self.outbox.put({"type": "pong"})
+        elif kind == "pong":
+            pass
+        elif kind == "ask":
+            question = str(message.get("question") or "").strip()
+            if not question:
+                self.outbox.put({"type": "error", "id": message.get("id"), "detail": "campo 'question' obrigatório"})
+                return
+            try:
+                self.pending.put_nowait({
+                    "id": message.get("id"),
+                    "question": question[:MAX_QUESTION_CHARS],
+                    "k": message.get("k", 5),
+                })
+            except asyncio.QueueFull:
+                self.outbox.put({"type": "error", "id": message.get("id"), "detail": "muitas perguntas pendentes"})
+        else:
+            self.outbox.put({"type": "error", "id": message.get("id"), "detail": f"tipo desconhecido: {kind}"})
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            if time.monotonic() - self.last_seen > IDLE_TIMEOUT:
+                self.outbox.close(CLOSE_IDLE)
+                return
+            self.outbox.put({"type": "ping"})
+
+    async def _answer_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            ask = await self.pending.get()
+            await self._answer(loop, ask)
+
+    async def _answer(self, loop, ask: Dict[str, Any]):
+        from .agent import answer_question
+        from .title_generator import title_generator
+
+        ask_id = ask["id"]
+        try:
+            k = int(ask["k"])
+            if k <= 0 or k >= 100:
+                raise ValueError
+        except (TypeError, ValueError):
+            k = 5
+
+        def on_delta(text: Optional[str]):
+            # Chamado na thread do LLM: entrega ao event loop sem bloquear
+            message = {"type": "reset", "id": ask_id} if text is None else {"type": "delta", "id": ask_id, "text": text}
+            loop.call_soon_threadsafe(self.outbox.put, message)
+
+        self.outbox.put({"type": "start", "id": ask_id})
+        started = time.perf_counter()
+        try:
+            first_question, self.first_question = self.first_question, False
+            result = await loop.run_in_executor(None, partial(
+                answer_question, ask["question"], k=k,
+                conversation_id=self.conversation_id, on_delta=on_delta,
+            ))
+            ASK_REQUESTS.inc(status="ok")
+            self.outbox.put({"type": "done", "id": ask_id, **result})
+        except Exception as e:
+            ASK_REQUESTS.inc(status="error")
+            self.outbox.put({"type": "error", "id": ask_id, "detail": str(e)})
+            return
+        finally:
+            ASK_LATENCY.observe(time.perf_counter() - started)
+
+        # Primeira pergunta: a resposta já foi transmitida; o título vem depois,
+        # em mensagem própria (JSON combinado não é legível em partes)
+        if first_question:
+            try:
+                title = await loop.run_in_executor(None, title_generator, ask["question"])
+            except Exception as e:
+                print(f"Erro gerando título: {e}")
+                title = ""
+            if title:
+                self.outbox.put({"type": "title", "id": ask_id, "title": title})
+
+
+async def chat_socket(scope, receive, send):
+    """Aplicação ASGI do canal de chat (ws[s]://.../collector/ws/chat)"""
+    event = await receive()
+    if event["type"] != "websocket.connect":
+        return
+    # WebSocket não passa por request_started: dispara o warm-up aqui
+    from .warmup import start_warmup_on_request
+    start_warmup_on_request()
+    await send({"type": "websocket.accept"})
+    if not _authorized(scope) and not await _authenticate(receive):
+        await send({"type": "websocket.close", "code": CLOSE_UNAUTHORIZED})
+        return
+    await ChatSession(scope, send).run(receive)
+
+
+async def reject_socket(scope, receive, send):
+    """WebSocket em rota desconhecida: o Django só atende HTTP"""
+    event = await receive()
+    if event["type"] == "websocket.connect":
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})